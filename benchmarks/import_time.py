@@ -0,0 +1,93 @@
+"""Import-time benchmark for the dashboard's cold start.
+
+Runs a fresh interpreter with ``-X importtime`` for the modules every page
+imports at the top, prints the slowest top-level packages, and fails when
+
+* the total exceeds the startup budget, or
+* a plotting library that ``healthcare.charts`` is meant to load lazily
+  was imported eagerly.
+
+Usage::
+
+    python benchmarks/import_time.py [--budget-ms 1500] [--top 15]
+"""
+
+import argparse
+import os
+import re
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# What a page pulls in before it draws anything.
+STARTUP_MODULES = [
+    "pandas",
+    "streamlit",
+    "healthcare",
+    "healthcare.charts",
+    "healthcare.cube",
+    "healthcare.adjacency",
+    "healthcare.occupancy",
+    "healthcare.widgets",
+]
+
+# Must only be imported on first use, through healthcare.charts.
+LAZY_MODULES = ["plotly.express", "matplotlib", "seaborn", "altair", "wordcloud"]
+
+STARTUP_BUDGET_MS = 1500
+
+LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def measure(modules):
+    """Return ``[(module, self_us, cumulative_us, depth)]`` for a cold import."""
+    code = "; ".join(f"import {module}" for module in modules)
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        match = LINE.match(line)
+        if match:
+            own, cumulative, indent, module = match.groups()
+            rows.append((module, int(own), int(cumulative), len(indent) // 2))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--budget-ms", type=float, default=STARTUP_BUDGET_MS)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    rows = measure(STARTUP_MODULES)
+    top_level = [row for row in rows if row[3] == 0]
+    total_ms = sum(cumulative for _, _, cumulative, _ in top_level) / 1000
+
+    print(f"{'module':<40} {'cumulative ms':>14}")
+    for module, _, cumulative, _ in sorted(top_level, key=lambda row: -row[2])[: args.top]:
+        print(f"{module:<40} {cumulative / 1000:>14.1f}")
+    print(f"{'total':<40} {total_ms:>14.1f}   (budget {args.budget_ms:.0f})")
+
+    imported = {module for module, _, _, _ in rows}
+    eager = [
+        lazy for lazy in LAZY_MODULES
+        if any(module == lazy or module.startswith(lazy + ".") for module in imported)
+    ]
+    failed = False
+    if eager:
+        print(f"FAIL: imported at startup but should be lazy: {', '.join(eager)}")
+        failed = True
+    if total_ms > args.budget_ms:
+        print(f"FAIL: startup imports took {total_ms:.0f} ms, over the {args.budget_ms:.0f} ms budget")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,22 +1,14 @@
-import sqlite3
 import pandas as pd
 import streamlit as st
-import numpy as np
-import plotly.express as px
-import matplotlib.pyplot as plt
 from datetime import datetime
-from wordcloud import WordCloud
+from healthcare import Query, charts, read_many, read_query
+from healthcare import aggregates, drivers, filters, forecast, snapshot
+from healthcare.governor import GovernorError
+from healthcare.schema import DIMENSIONS, FACT_TABLE
+from healthcare.widgets import export_widget, hospital_picker
 
 st.set_page_config(layout='wide')
 
-# Database Connection
-database_path = 'healthcare_database.db'
-connection = sqlite3.connect(database_path)
-
-# Query to Load Full Dataset
-query = """SELECT * FROM "Healthcare_Dataset";"""
-data = pd.read_sql_query(query, connection)
-
 st.header('Summary of Healthcare Data in 2014-2019')
 
 # Tabs for Different Charts
@@ -32,26 +24,24 @@ hospital admission logistics, and medical conditions.
 **Navigate to the above pages for in-depth analysis**
 """)
 
+# Global admission-date range, shared with every page
+filters.date_range_filter()
+
 # Home Summary & Statistics --------------------------------------------------------------------------------------------------------
 with tab1:
     # Interactive Search Section
     st.subheader('Search the Dataset')
     search_query = st.text_input("Search by Name, Hospital, Doctor, or Medical Condition").lower()
 
-    # Modify Query if Search Query is Provided
-    if search_query:
-        query = f"""
-        SELECT * 
-        FROM "Healthcare_Dataset" 
-        WHERE 
-            Name LIKE '%{search_query}%' OR 
-            Hospital LIKE '%{search_query}%' OR
-            Doctor LIKE '%(search_query)%' OR 
-            Medical_Condition LIKE '%{search_query}%';
-        """
-
-    # Fetch Data Using Updated Query
-    data = pd.read_sql_query(query, connection)
+    # Filter the Query if Search Query is Provided
+    search = filters.apply(Query().where_any_like(["Name", "Hospital", "Doctor", "Medical_Condition"], search_query))
+
+    # Fetch Data Using Updated Query; a newer search from this session cancels an older one
+    try:
+        data = read_query(search, slot="dashboard.search", heavy=True)
+    except GovernorError as error:
+        st.warning(str(error))
+        data = pd.DataFrame(columns=["id"])
 
     # Drop first column
     data = data.iloc[:, 1:]
@@ -59,25 +49,37 @@ with tab1:
     # Display Data
     st.write(f"Showing results for search: **'{search_query}'**" if search_query else "Showing all data:")
     st.dataframe(data, use_container_width=True)
+    export_widget(search, key="search_export", file_name="healthcare_search")
 
 
     # Summary Statistics Section
+    # The metric queries are independent, so fetch them as one concurrent batch
+    # Hospitals and conditions are the distinct keys admitted in the selected range
+    # (key lists rather than COUNT(DISTINCT), which cannot be merged across shards)
+    stats = read_many({
+        "total_records": filters.apply(Query(FACT_TABLE).count("total_records")),
+        "unique_hospitals": filters.apply(Query(FACT_TABLE).select(DIMENSIONS["Hospital"][1]).distinct()),
+        "unique_conditions": filters.apply(Query(FACT_TABLE).select(DIMENSIONS["Medical_Condition"][1]).distinct()),
+        "billing_stats": filters.apply(
+            Query(FACT_TABLE).avg("Billing_Amount", "avg_billing")
+            .max("Billing_Amount", "max_billing").min("Billing_Amount", "min_billing")
+        ),
+        "avg_length_of_stay": filters.apply(Query(FACT_TABLE).avg("Total_Days_of_Stay", "avg_length_of_stay")),
+    })
+
     st.subheader('Summary Statistics')
     col1, col2, col3 = st.columns(3)
 
     # Total Records
-    query_total_records = """SELECT COUNT(*) AS total_records FROM "Healthcare_Dataset";"""
-    total_records = pd.read_sql_query(query_total_records, connection)['total_records'][0]
+    total_records = stats["total_records"]['total_records'][0]
     col1.metric("Total Records", total_records)
 
     # Unique Hospitals
-    query_unique_hospitals = """SELECT COUNT(DISTINCT Hospital) AS unique_hospitals FROM "Healthcare_Dataset";"""
-    unique_hospitals = pd.read_sql_query(query_unique_hospitals, connection)['unique_hospitals'][0]
+    unique_hospitals = len(stats["unique_hospitals"])
     col2.metric("Unique Hospitals", unique_hospitals)
 
     # Unique Medical Conditions
-    query_unique_conditions = """SELECT COUNT(DISTINCT Medical_Condition) AS unique_conditions FROM "Healthcare_Dataset";"""
-    unique_conditions = pd.read_sql_query(query_unique_conditions, connection)['unique_conditions'][0]
+    unique_conditions = len(stats["unique_conditions"])
     col3.metric("Unique Medical Conditions", unique_conditions)
 
     # Additional Summary Statistics
@@ -85,14 +87,7 @@ with tab1:
     col4, col5, col6 = st.columns(3)
 
     # Billing Amount Statistics
-    query_billing_stats = """
-    SELECT 
-        AVG(Billing_Amount) AS avg_billing, 
-        MAX(Billing_Amount) AS max_billing, 
-        MIN(Billing_Amount) AS min_billing 
-    FROM "Healthcare_Dataset";
-    """
-    billing_stats = pd.read_sql_query(query_billing_stats, connection)
+    billing_stats = stats["billing_stats"]
     avg_billing = billing_stats['avg_billing'][0]
     max_billing = billing_stats['max_billing'][0]
     min_billing = billing_stats['min_billing'][0]
@@ -102,8 +97,7 @@ with tab1:
     col6.metric("Min Billing Amount", f"${min_billing:,.0f}")
 
     # Average Length of Stay
-    query_avg_length_of_stay = """SELECT AVG(Total_Days_of_Stay) AS avg_length_of_stay FROM "Healthcare_Dataset";"""
-    avg_length_of_stay = pd.read_sql_query(query_avg_length_of_stay, connection)['avg_length_of_stay'][0]
+    avg_length_of_stay = stats["avg_length_of_stay"]['avg_length_of_stay'][0]
     col4.metric("Avg Length of Stay", f"{avg_length_of_stay:.1f} days")
     
     #Description in container
@@ -125,42 +119,29 @@ with tab2:
     st.subheader("Monthly Revenue Trends")
 
     # SQL Query to Aggregate Monthly Revenue
-    query_revenue = """
-    SELECT 
-        strftime('%Y-%m', Date_of_Admission) AS Month, 
-        SUM(Billing_Amount) AS Total_Revenue
-    FROM Healthcare_Dataset
-    WHERE Billing_Amount >= 0
-    GROUP BY Month
-    ORDER BY Month;
-    """
-    revenue_data = pd.read_sql_query(query_revenue, connection)
-
-    # Plot Line Chart
-    fig_revenue = px.line(
-        revenue_data, 
-        x="Month", 
-        y="Total_Revenue", 
+    revenue_data = read_query(filters.apply(aggregates.monthly_revenue()))
+
+    # Plot Line Chart (downsampled and reused until the data changes)
+    fig_revenue = charts.cached(
+        "revenue_trend",
+        charts.line,
+        revenue_data,
+        x="Month",
+        y="Total_Revenue",
         title="Revenue by Year",
         labels={"Month": "Year", "Total_Revenue": "Total Revenue"}
     )
     st.plotly_chart(fig_revenue, use_container_width=True)
 
     # Query data for bar graph
-    query_monthlyrev = """
-    SELECT 
-        strftime('%Y', Date_of_Admission) AS Year, 
-        strftime('%m', Date_of_Admission) AS Month, 
-        SUM(Billing_Amount) AS Total_Revenue
-    FROM Healthcare_Dataset
-    WHERE Billing_Amount >= 0
-    GROUP BY Year, Month
-    ORDER BY Year, Month;
-    """
-    monthly_revenue_data = pd.read_sql_query(query_monthlyrev, connection)
-
-    # Add a column to convert Month to full name
-    monthly_revenue_data["Month_Full"] = monthly_revenue_data["Month"].apply(lambda x: datetime.strptime(x, "%m").strftime("%B"))
+    query_monthlyrev = filters.apply(
+        Query(FACT_TABLE)
+        .select("Admission_Year AS Year", "Admission_Month AS Month", "Admission_Month_Name AS Month_Full")
+        .sum("Billing_Amount", "Total_Revenue")
+        .group_by("Admission_Year", "Admission_Month")
+        .order_by("Admission_Year", "Admission_Month")
+    )
+    monthly_revenue_data = read_query(query_monthlyrev)
 
     # Selectbox for filtering by month
     selected_month = st.selectbox(
@@ -172,7 +153,7 @@ with tab2:
     filtered_data = monthly_revenue_data[monthly_revenue_data["Month_Full"] == selected_month]
 
     # Bar graph
-    fig_monthlyrev = px.bar(
+    fig_monthlyrev = charts.px.bar(
         filtered_data,
         x="Year",
         y="Total_Revenue",
@@ -181,6 +162,7 @@ with tab2:
         labels={"Total_Revenue": "Total Revenue", "Year": selected_month}
     )
     fig_monthlyrev.update_traces(texttemplate='%{text:.2s}', textposition='outside')  # Format bar labels
+    fig_monthlyrev.update_xaxes(type='category')  # Years are integers now; keep one bar per year
     st.plotly_chart(fig_monthlyrev, use_container_width=True)
 
     # Summary statistics for revenue trends
@@ -205,6 +187,51 @@ with tab2:
     st.write(f"**Highest Monthly Revenue:** ${max_revenue:,.2f} ({max_revenue_month_formatted})")
     st.write(f"**Lowest Monthly Revenue:** ${min_revenue:,.2f} ({min_revenue_month_formatted})")
 
+    # Anomalies and forecasts, computed for every series of a level at once per data version
+    st.subheader("Revenue Anomalies and Forecast")
+    series_levels = {"All Revenue": "total", "By Insurance Provider": "insurer", "By Hospital": "hospital"}
+    series_level = series_levels[st.radio("Series:", list(series_levels), horizontal=True)]
+    group_column = forecast.LEVELS[series_level] or "Group"
+    revenue_history = forecast.history(series_level)
+    revenue_forecast = forecast.forecast(series_level)
+
+    if series_level == "total":
+        selected_group = "All"
+    else:
+        # Strongest deviations across every group of the level
+        with st.expander("Largest Revenue Anomalies"):
+            st.dataframe(forecast.anomalies(series_level, limit=20), use_container_width=True, hide_index=True)
+        if series_level == "hospital":
+            selected_group = hospital_picker("Forecast for Hospital:", key="forecast_hospital")
+        else:
+            selected_group = st.selectbox("Insurance Provider:", revenue_history[group_column].unique().tolist())
+
+    group_history = revenue_history[revenue_history[group_column] == selected_group]
+    group_forecast = revenue_forecast[revenue_forecast[group_column] == selected_group]
+    if group_history.empty:
+        st.warning("No complete months of revenue for the selected series.")
+    else:
+        flagged = group_history[group_history["Anomaly"]]
+        fig_forecast = charts.go.Figure([
+            charts.go.Scatter(x=group_forecast["Month"], y=group_forecast["Upper"], mode="lines",
+                              line={"width": 0}, showlegend=False, hoverinfo="skip"),
+            charts.go.Scatter(x=group_forecast["Month"], y=group_forecast["Lower"], mode="lines",
+                              line={"width": 0}, fill="tonexty", name="95% Band"),
+            charts.go.Scatter(x=group_history["Month"], y=group_history["Revenue"], mode="lines", name="Revenue"),
+            charts.go.Scatter(x=group_history["Month"], y=group_history["Expected"], mode="lines",
+                              line={"dash": "dot"}, name="Expected (rolling median)"),
+            charts.go.Scatter(x=flagged["Month"], y=flagged["Revenue"], mode="markers",
+                              marker={"color": "red", "size": 10}, name="Anomaly"),
+            charts.go.Scatter(x=group_forecast["Month"], y=group_forecast["Forecast"], mode="lines",
+                              line={"dash": "dash"}, name="Forecast"),
+        ])
+        fig_forecast.update_layout(title=f"Monthly Revenue: {selected_group}", yaxis_title="Total Revenue")
+        st.plotly_chart(fig_forecast, use_container_width=True)
+        st.caption(
+            f"Months more than {forecast.THRESHOLD} robust deviations from the previous {forecast.WINDOW} months are "
+            "flagged. Months the data only partly covers are left out. Computed on all admissions."
+        )
+
     con = st.container(border=True)
     con.write("""The revenue summary provides key insights into hospital billing trends over time, 
               highlighting consistent revenue generation with notable fluctuations. The line chart 
@@ -221,16 +248,10 @@ with tab2:
               
 # Which factors (e.g., age group, admission type, or length of stay) have the strongest relationship with billing amounts?
 with tab3:
-    # Query for demographics data
-    query_demosum = """
-    SELECT 
-        Age, 
-        Gender, 
-        Blood_Type, 
-        Insurance_Provider
-    FROM Healthcare_Dataset;
-    """
-    demographics_data = pd.read_sql_query(query_demosum, connection)
+    # Demographics columns from the shared memory-mapped snapshot
+    demographics_data = filters.filter_frame(
+        snapshot.load_columns(["Age", "Gender", "Blood_Type", "Insurance_Provider", "Date_of_Admission"])
+    )
 
     # Demographics Summary Statistics
     st.subheader("Demographics Summary")
@@ -244,7 +265,7 @@ with tab3:
 
     # Horizontal Bar Chart for Top Insurance Providers
     insurance_provider_counts = demographics_data["Insurance_Provider"].value_counts()
-    insurance_fig = px.bar(
+    insurance_fig = charts.px.bar(
     insurance_provider_counts,
     x=insurance_provider_counts.values,
     y=insurance_provider_counts.index,
@@ -261,7 +282,7 @@ with tab3:
     st.plotly_chart(insurance_fig, use_container_width=True)
 
     # Histogram for Age Distribution
-    age_fig = px.histogram(
+    age_fig = charts.px.histogram(
     demographics_data,
     x="Age",
     nbins=5,
@@ -294,8 +315,43 @@ with tab3:
                     provide a comprehensive understanding of the patient demographics and their financial 
                     implications within the healthcare system. """)
 
-
-# close the database connection
-connection.close()
+    # Billing drivers, ranked by the share of billing variance each factor explains
+    st.subheader("What Drives Billing Amounts?")
+    with_importance = st.checkbox(
+        "Include gradient-boosted importance (slower)", value=False,
+        help="Needs scikit-learn; the Importance column stays empty without it."
+    )
+    driver_ranking = drivers.ranked(date_range=filters.current_range(), with_importance=with_importance)
+    st.dataframe(driver_ranking, use_container_width=True, hide_index=True)
+
+    drivers_fig = charts.cached(
+        "billing_drivers",
+        charts.px.bar,
+        driver_ranking,
+        x="Effect",
+        y="Factor",
+        color="Kind",
+        orientation="h",
+        category_orders={"Factor": driver_ranking["Factor"].tolist()[::-1]},  # strongest on top
+        title="Share of Billing Variance Explained",
+        labels={"Effect": "Eta-squared / r-squared", "Factor": ""}
+    )
+    st.plotly_chart(drivers_fig, use_container_width=True)
+
+    # Average billing per level of one categorical factor
+    categorical_factors = driver_ranking.loc[driver_ranking["Kind"] == "categorical", "Factor"].tolist()
+    driver = st.selectbox("Average Billing by:", categorical_factors)
+    driver_levels = drivers.groups(driver, date_range=filters.current_range())
+    levels_fig = charts.cached(
+        "billing_driver_levels",
+        charts.px.bar,
+        driver_levels,
+        x="Level",
+        y="Mean",
+        hover_data=["Count", "Variance"],
+        title=f"Average Billing Amount by {driver}",
+        labels={"Mean": "Average Billing Amount", "Level": driver}
+    )
+    st.plotly_chart(levels_fig, use_container_width=True)
 
 # What are the most common medical conditions, and which generate the most revenue?
\ No newline at end of file
@@ -0,0 +1,6 @@
+"""Shared data layer for the healthcare dashboard pages."""
+
+from healthcare.db import DATABASE_PATH, read_many, read_query
+from healthcare.query import Query
+
+__all__ = ["DATABASE_PATH", "Query", "read_many", "read_query"]
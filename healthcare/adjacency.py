@@ -0,0 +1,386 @@
+"""Sparse doctor, hospital, condition and medication co-occurrence matrices.
+
+Each graph in ``GRAPHS`` is a compressed sparse row (CSR) matrix with one
+row per label of its row column and one stored entry per label pair that
+occurs together: the admission count plus the sum of every measure. The
+row slice ``indptr[i]:indptr[i + 1]`` lists everything row ``i`` co-occurs
+with, so a doctor's hospitals, a condition's medications or the top doctors
+by load are lookups and short array reductions, not GROUP BYs over the
+fact table. Unlike the dense cube, the matrices only store the pairs that
+exist, which keeps tens of thousands of doctors affordable.
+
+``doctor_doctor`` is the shared-patient network: entry ``(a, b)`` counts
+the patients (see ``PATIENT_KEY``) seen by both doctors ``a`` and ``b``.
+It is the doctor x patient incidence matrix times its transpose, computed
+with SciPy, without the diagonal. The other graphs only need NumPy; without
+SciPy the shared-patient network is skipped with a warning and
+:func:`available` reports it missing.
+
+All graphs are built together from one read of the columnar snapshot when
+a data version is published, each stored as a snapshot rollup, so every
+server process maps the same copy. A graph that is missing (for example
+because publishing skipped it) is built on first use. Graphs for an
+admission-date range are built on demand from the matching rows; the last
+few ranges are kept.
+"""
+
+import importlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from healthcare import snapshot as snapshots
+
+MEASURES = ("Billing_Amount", "Total_Days_of_Stay")
+
+# name -> (row column, column column) of every co-occurrence graph.
+GRAPHS = {
+    "doctor_hospital": ("Doctor", "Hospital"),
+    "doctor_condition": ("Doctor", "Medical_Condition"),
+    "condition_medication": ("Medical_Condition", "Medication"),
+}
+SHARED_PATIENTS = "doctor_doctor"
+
+# Columns that together identify a patient across admissions.
+PATIENT_KEY = ("Name", "Gender", "Blood_Type")
+
+# Graph ``name`` is stored as the snapshot rollup ``adjacency.<name>``.
+ROLLUP = "adjacency"
+
+# Date-range graph sets kept in memory per process.
+RANGED_GRAPHS = 8
+
+
+def _sparse():
+    try:
+        return importlib.import_module("scipy.sparse")
+    except ImportError:
+        return None
+
+
+def available(name):
+    """Whether graph ``name`` can be built here (the shared-patient network needs SciPy)."""
+    return name != SHARED_PATIENTS or _sparse() is not None
+
+
+def _codes(values):
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        return values.cat.codes.to_numpy().astype(np.int64), list(values.cat.categories)
+    codes, labels = pd.factorize(values, sort=True)
+    return codes.astype(np.int64), pd.Index(labels).tolist()
+
+
+class Adjacency:
+    """CSR matrix of admission counts and measure sums between two columns.
+
+    ``count_name`` names what the counts count (admissions, or shared
+    patients for the shared-patient network) in the tables returned.
+    """
+
+    def __init__(self, rows, columns, labels, indptr, indices, counts, sums, count_name="Admissions"):
+        self.rows, self.columns = rows, columns
+        self.count_name = count_name
+        self.labels = {rows: list(labels[0]), columns: list(labels[1])}
+        self.indptr = indptr
+        self.indices = indices
+        self.counts = counts
+        self.sums = sums
+        self._positions = None
+
+    @classmethod
+    def from_codes(cls, rows, columns, labels, row_codes, column_codes, weights):
+        """Build from parallel code arrays; ``-1`` codes (missing values) are skipped.
+
+        ``weights`` maps each measure to one value per code pair.
+        """
+        shape = (len(labels[0]), len(labels[1]))
+        valid = (row_codes >= 0) & (column_codes >= 0)
+        # Row-major keys: sorting them puts the pairs in CSR order.
+        keys, inverse = np.unique(row_codes[valid] * shape[1] + column_codes[valid], return_inverse=True)
+        pair_rows, indices = np.divmod(keys, shape[1])
+        indptr = np.searchsorted(pair_rows, np.arange(shape[0] + 1)).astype(np.int64)
+        counts = np.bincount(inverse, minlength=len(keys)).astype(np.int64)
+        sums = {
+            measure: np.bincount(inverse, weights=np.asarray(values, dtype=np.float64)[valid], minlength=len(keys))
+            for measure, values in weights.items()
+        }
+        return cls(rows, columns, labels, indptr, indices.astype(np.int32), counts, sums)
+
+    @classmethod
+    def from_frame(cls, df, rows, columns, measures=MEASURES):
+        row_codes, row_labels = _codes(df[rows])
+        column_codes, column_labels = _codes(df[columns])
+        weights = {measure: df[measure].to_numpy(dtype=np.float64) for measure in measures}
+        return cls.from_codes(rows, columns, (row_labels, column_labels), row_codes, column_codes, weights)
+
+    # Persistence -----------------------------------------------------------
+    def save(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        np.save(os.path.join(directory, "indptr.npy"), self.indptr)
+        np.save(os.path.join(directory, "indices.npy"), self.indices)
+        np.save(os.path.join(directory, "counts.npy"), self.counts)
+        for measure, values in self.sums.items():
+            np.save(os.path.join(directory, f"sum.{measure}.npy"), values)
+        with open(os.path.join(directory, "labels.json"), "w") as f:
+            json.dump({"rows": self.rows, "columns": self.columns, "labels": self.labels,
+                       "measures": list(self.sums), "count_name": self.count_name}, f)
+
+    @classmethod
+    def load(cls, directory):
+        with open(os.path.join(directory, "labels.json")) as f:
+            meta = json.load(f)
+
+        def array(name):
+            return np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r")
+
+        labels = (meta["labels"][meta["rows"]], meta["labels"][meta["columns"]])
+        sums = {measure: array(f"sum.{measure}") for measure in meta["measures"]}
+        return cls(meta["rows"], meta["columns"], labels, array("indptr"), array("indices"),
+                   array("counts"), sums, meta["count_name"])
+
+    # Queries ---------------------------------------------------------------
+    @property
+    def shape(self):
+        return len(self.labels[self.rows]), len(self.labels[self.columns])
+
+    def values(self, measure=None):
+        """Stored entries: counts, or the sums of ``measure``."""
+        return self.counts if measure is None else self.sums[measure]
+
+    def position(self, label):
+        """Row number of ``label``, or None when it does not occur."""
+        if self._positions is None:
+            self._positions = {name: i for i, name in enumerate(self.labels[self.rows])}
+        return self._positions.get(label)
+
+    def _row_ids(self):
+        return np.repeat(np.arange(self.shape[0]), np.diff(self.indptr))
+
+    def row_totals(self, measure=None):
+        """Admissions (or ``measure``) per row label."""
+        return np.bincount(self._row_ids(), weights=self.values(measure), minlength=self.shape[0])
+
+    def column_totals(self, measure=None):
+        """Admissions (or ``measure``) per column label."""
+        return np.bincount(self.indices, weights=self.values(measure), minlength=self.shape[1])
+
+    def degree(self):
+        """Distinct column labels each row label co-occurs with."""
+        return np.diff(self.indptr)
+
+    def top(self, k=10, measure=None):
+        """The ``k`` row labels with the largest total, as a DataFrame.
+
+        Columns: the row column, the count (``count_name``), the sum of every
+        measure and ``Distinct_<columns>``; ordered by ``measure`` (or the count).
+        """
+        totals = self.row_totals(measure)
+        k = min(k, len(totals))
+        if k == 0:
+            return self._table(np.array([], dtype=np.intp))
+        picked = np.argpartition(-totals, k - 1)[:k]
+        picked = picked[np.argsort(-totals[picked], kind="stable")]
+        return self._table(picked)
+
+    def _table(self, positions):
+        table = pd.DataFrame({self.rows: [self.labels[self.rows][i] for i in positions]})
+        table[self.count_name] = self.row_totals()[positions].astype(np.int64)
+        for measure in self.sums:
+            table[measure] = self.row_totals(measure)[positions]
+        table[f"Distinct_{self.columns}"] = self.degree()[positions]
+        return table
+
+    def row(self, label):
+        """What ``label`` co-occurs with: one row per column label, highest count first."""
+        column = self._other_name()
+        columns = [column, self.count_name, *self.sums]
+        i = self.position(label)
+        if i is None:
+            return pd.DataFrame(columns=columns)
+        start, stop = self.indptr[i], self.indptr[i + 1]
+        names = self.labels[self.columns]
+        table = pd.DataFrame({
+            column: [names[j] for j in self.indices[start:stop]],
+            self.count_name: np.asarray(self.counts[start:stop]),
+            **{measure: np.asarray(values[start:stop]) for measure, values in self.sums.items()},
+        }, columns=columns)
+        return table.sort_values(self.count_name, ascending=False, kind="stable").reset_index(drop=True)
+
+    def _other_name(self):
+        # Column heading for the column labels; "Doctor_2" in the doctor x doctor graph.
+        return f"{self.columns}_2" if self.columns == self.rows else self.columns
+
+    def strongest(self, k=10, measure=None):
+        """The ``k`` largest entries, one row per label pair, largest first.
+
+        Symmetric graphs list each pair once.
+        """
+        values = np.asarray(self.values(measure))
+        candidates = np.arange(len(values))
+        if self.rows == self.columns:
+            candidates = candidates[self.indices > self._row_ids()]
+        k = min(k, len(candidates))
+        if k:
+            candidates = candidates[np.argpartition(-values[candidates], k - 1)[:k]]
+        picked = candidates[np.argsort(-values[candidates], kind="stable")][:k]
+        rows, columns = self.labels[self.rows], self.labels[self.columns]
+        row_ids = np.searchsorted(self.indptr, picked, side="right") - 1
+        return pd.DataFrame({
+            self.rows: [rows[i] for i in row_ids],
+            self._other_name(): [columns[j] for j in self.indices[picked]],
+            measure or self.count_name: values[picked],
+        })
+
+    def dense(self, measure=None):
+        """The full matrix as a DataFrame; only for small graphs."""
+        matrix = np.zeros(self.shape)
+        matrix[self._row_ids(), self.indices] = self.values(measure)
+        frame = pd.DataFrame(matrix, index=self.labels[self.rows], columns=self.labels[self.columns])
+        frame.index.name, frame.columns.name = self.rows, self.columns
+        return frame
+
+    def matrix(self, measure=None):
+        """The graph as a ``scipy.sparse.csr_array``."""
+        from scipy import sparse
+
+        return sparse.csr_array((self.values(measure), self.indices, self.indptr), shape=self.shape)
+
+
+def shared_patients(df, doctor="Doctor", patient_key=PATIENT_KEY):
+    """Doctor x doctor graph counting the patients two doctors have in common."""
+    from scipy import sparse
+
+    doctor_codes, doctors = _codes(df[doctor])
+    patient_codes = np.zeros(len(df), dtype=np.int64)
+    missing = doctor_codes < 0
+    for column in patient_key:
+        codes, labels = _codes(df[column])
+        missing |= codes < 0
+        patient_codes = patient_codes * (len(labels) + 1) + codes + 1
+    patient_codes, _ = pd.factorize(patient_codes[~missing])
+    doctor_codes = doctor_codes[~missing]
+
+    # Binary doctor x patient incidence; its product with its transpose counts shared patients.
+    incidence = sparse.csr_array(
+        (np.ones(len(doctor_codes)), (doctor_codes, patient_codes)),
+        shape=(len(doctors), int(patient_codes.max(initial=-1)) + 1),
+    )
+    incidence.data[:] = 1
+    shared = (incidence @ incidence.T).tocoo()
+    off_diagonal = shared.row != shared.col
+    shared = sparse.csr_array(
+        (shared.data[off_diagonal], (shared.row[off_diagonal], shared.col[off_diagonal])), shape=shared.shape
+    )
+    shared.sort_indices()
+    return Adjacency(
+        doctor, doctor, (doctors, doctors), shared.indptr.astype(np.int64), shared.indices.astype(np.int32),
+        shared.data.astype(np.int64), {}, count_name="Shared_Patients",
+    )
+
+
+NAMES = (*GRAPHS, SHARED_PATIENTS)
+
+
+def build(rows, names=NAMES):
+    """The graphs ``names`` (default: all that are available) from one frame."""
+    graphs = {name: Adjacency.from_frame(rows, *GRAPHS[name]) for name in names if name in GRAPHS}
+    if SHARED_PATIENTS in names:
+        if available(SHARED_PATIENTS):
+            graphs[SHARED_PATIENTS] = shared_patients(rows)
+        else:
+            warnings.warn("SciPy is not installed; skipping the shared-patient network", RuntimeWarning)
+    return graphs
+
+
+def _columns(snap):
+    wanted = {column for pair in GRAPHS.values() for column in pair}
+    wanted.update(MEASURES, PATIENT_KEY, ["Doctor"])
+    return [column for column in snap.columns if column in wanted]
+
+
+def _path(snap, name):
+    return snap.rollup_path(f"{ROLLUP}.{name}")
+
+
+def _store(snap, name, graph):
+    target = _path(snap, name)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    staging = tempfile.mkdtemp(prefix=f".{ROLLUP}.{name}-", dir=os.path.dirname(target))
+    try:
+        graph.save(staging)
+        try:
+            os.rename(staging, target)
+        except OSError:
+            if not os.path.exists(target):
+                raise
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+
+def publish(snap, names=NAMES):
+    """Build the missing graphs of ``names`` from the snapshot rows and store them beside them."""
+    missing = [name for name in names if not os.path.exists(_path(snap, name))]
+    if not missing:
+        return
+    for name, graph in build(snap.frame(_columns(snap)), missing).items():
+        _store(snap, name, graph)
+
+
+_loaded = {}
+_load_lock = threading.Lock()
+
+
+def current(name, database_path=None, date_range=None):
+    """Graph ``name`` (see ``GRAPHS``, or ``SHARED_PATIENTS``) for the current data version.
+
+    With a ``(start, end)`` admission ``date_range`` the graphs are built
+    from the matching snapshot rows instead; the last few ranges are kept.
+    """
+    if not available(name):
+        raise ImportError(f"the {name} graph needs SciPy")
+    snap = snapshots.current(database_path)
+    if date_range is not None:
+        return _for_range(snap, tuple(date_range))[name]
+    with _load_lock:
+        graph = _loaded.get((snap.version, name))
+        if graph is None:
+            publish(snap, [name])
+            # Drop graphs of older versions so their mappings can be released.
+            for key in [key for key in _loaded if key[0] != snap.version]:
+                del _loaded[key]
+            graph = _loaded[snap.version, name] = Adjacency.load(_path(snap, name))
+    return graph
+
+
+# Graphs for recent date ranges: (version, range) -> {name: Adjacency}
+_ranged = {}
+
+
+def _for_range(snap, date_range):
+    key = (snap.version, date_range)
+    graphs = _ranged.get(key)
+    if graphs is None:
+        rows = snap.frame(_columns(snap) + ["Date_of_Admission"])
+        dates = rows["Date_of_Admission"].to_numpy("datetime64[D]")
+        start, end = (np.datetime64(day, "D") for day in date_range)
+        # Snapshot text columns are Categoricals, so row numbers match the full-data graphs.
+        graphs = build(rows[(dates >= start) & (dates <= end)])
+        with _load_lock:
+            if len(_ranged) >= RANGED_GRAPHS:
+                del _ranged[next(iter(_ranged))]
+            _ranged[key] = graphs
+    return graphs
+
+
+if __name__ == "__main__":
+    snap = snapshots.current()
+    publish(snap)
+    for name in [name for name in NAMES if available(name)]:
+        graph = current(name)
+        print(f"{name}: {graph.shape[0]} x {graph.shape[1]}, {len(graph.counts)} pairs")
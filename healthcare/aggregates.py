@@ -0,0 +1,71 @@
+"""Aggregates shown on the dashboard pages, shared with the HTTP API.
+
+Each function returns a :class:`~healthcare.query.Query`, so callers can
+run it directly, batch it with ``read_many`` or narrow it further.
+"""
+
+from healthcare.query import Query
+from healthcare.schema import FACT_TABLE
+
+
+def monthly_revenue():
+    return (
+        Query(FACT_TABLE).select("Admission_Period AS Month")
+        .sum("Billing_Amount", "Total_Revenue")
+        .group_by("Admission_Period")
+        .order_by("Admission_Period")
+    )
+
+
+def admissions_by_hospital_condition(hospital=None, condition=None, limit=100):
+    """Admissions per hospital and condition; filters are substring matches."""
+    return (
+        Query(FACT_TABLE).group_by_dimension("Hospital", "Medical_Condition").count("Admissions")
+        .where_dimension_like("Hospital", hospital)
+        .where_dimension_like("Medical_Condition", condition)
+        .order_by("Admissions DESC")
+        .limit(limit)
+    )
+
+
+def admissions_by_condition():
+    return Query(FACT_TABLE).group_by_dimension("Medical_Condition").count("Admissions")
+
+
+def average_stay_by_admission_type():
+    return (
+        Query(FACT_TABLE).select("Admission_Type")
+        .avg("Total_Days_of_Stay", "Avg_Stay")
+        .count("Admissions")
+        .group_by("Admission_Type")
+        .order_by("Avg_Stay DESC")
+    )
+
+
+def age_groups_by_admission_type(hospital):
+    """Admissions per admission type and age group at one ``hospital``."""
+    return (
+        Query(FACT_TABLE).select("Admission_Type", "Age_Group").count("admission_count")
+        .where_dimension_eq("Hospital", hospital)
+        .group_by("Admission_Type", "Age_Group")
+        .order_by("Admission_Type", "admission_count DESC")
+    )
+
+
+def age_groups_by_hospital():
+    """:func:`age_groups_by_admission_type` for every hospital at once, with a ``Hospital`` column."""
+    return (
+        Query(FACT_TABLE).group_by_dimension("Hospital")
+        .select("Admission_Type", "Age_Group").count("admission_count")
+        .group_by("Admission_Type", "Age_Group")
+        .order_by("Admission_Type", "admission_count DESC")
+    )
+
+
+def average_stay_by_hospital():
+    """Average length of stay per hospital and admission type."""
+    return (
+        Query(FACT_TABLE).group_by_dimension("Hospital").select("Admission_Type")
+        .avg("Total_Days_of_Stay", "Avg_Stay")
+        .group_by("Admission_Type")
+    )
@@ -0,0 +1,139 @@
+"""Read-only HTTP API serving the dashboard aggregates as JSON or Arrow.
+
+Endpoints::
+
+    GET /version
+    GET /revenue/monthly
+    GET /admissions/hospital-condition?hospital=&condition=&limit=100
+    GET /stay/admission-type
+
+Add ``?format=arrow`` (or send ``Accept: application/vnd.apache.arrow.stream``)
+for an Arrow IPC stream instead of JSON; Arrow needs ``pyarrow``.
+
+Every response carries an ``ETag`` derived from the data version and the
+request, and ``If-None-Match`` is answered with ``304 Not Modified``
+without touching the database, so polling clients cost almost nothing
+until new data is published.
+
+Run with ``python -m healthcare.api [--host 127.0.0.1] [--port 8502]``.
+"""
+
+import argparse
+import hashlib
+import io
+import json
+from functools import lru_cache
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from healthcare import aggregates, db, snapshot
+from healthcare.governor import GovernorError
+
+ARROW_MIME = "application/vnd.apache.arrow.stream"
+MAX_LIMIT = 10_000
+
+
+def _limit(params):
+    """``limit`` clamped to ``MAX_LIMIT``; values below 1 are rejected (400)."""
+    limit = int(params.get("limit", 100))
+    if limit < 1:
+        # SQLite reads a negative LIMIT as "no limit".
+        raise ValueError("limit must be at least 1")
+    return min(limit, MAX_LIMIT)
+
+
+# path -> function(query parameters) -> Query
+ENDPOINTS = {
+    "/revenue/monthly": lambda params: aggregates.monthly_revenue(),
+    "/admissions/hospital-condition": lambda params: aggregates.admissions_by_hospital_condition(
+        params.get("hospital"), params.get("condition"), _limit(params)
+    ),
+    "/stay/admission-type": lambda params: aggregates.average_stay_by_admission_type(),
+}
+
+
+def etag(version, path, params, fmt):
+    key = json.dumps([version, path, sorted(params.items()), fmt])
+    return '"' + hashlib.sha1(key.encode()).hexdigest()[:20] + '"'
+
+
+def _encode(df, fmt):
+    if fmt == "arrow":
+        import pyarrow as pa
+
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        sink = io.BytesIO()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue(), ARROW_MIME
+    body = json.dumps({"data": json.loads(df.to_json(orient="records"))})
+    return body.encode("utf-8"), "application/json"
+
+
+@lru_cache(maxsize=256)
+def _render(version, path, params, fmt):
+    # ``version`` is part of the cache key so new data is never served stale.
+    df = db.read_query(ENDPOINTS[path](dict(params)), heavy=True)
+    return _encode(df, fmt)
+
+
+class AggregateHandler(BaseHTTPRequestHandler):
+    server_version = "HealthcareAPI/1.0"
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        fmt = params.pop("format", None)
+        if fmt is None:
+            fmt = "arrow" if ARROW_MIME in self.headers.get("Accept", "") else "json"
+
+        version = snapshot.data_version()
+        if url.path == "/version":
+            return self._send(HTTPStatus.OK, json.dumps({"version": version}).encode(),
+                              "application/json", etag=None)
+        if url.path not in ENDPOINTS or fmt not in ("json", "arrow"):
+            return self._send(HTTPStatus.NOT_FOUND, b'{"error": "not found"}', "application/json")
+
+        tag = etag(version, url.path, params, fmt)
+        if tag in (value.strip() for value in self.headers.get("If-None-Match", "").split(",")):
+            return self._send(HTTPStatus.NOT_MODIFIED, b"", None, etag=tag)
+        try:
+            body, content_type = _render(version, url.path, tuple(sorted(params.items())), fmt)
+        except ValueError as error:
+            return self._send(HTTPStatus.BAD_REQUEST,
+                              json.dumps({"error": str(error)}).encode(), "application/json")
+        except GovernorError as error:
+            return self._send(HTTPStatus.SERVICE_UNAVAILABLE,
+                              json.dumps({"error": str(error)}).encode(), "application/json")
+        self._send(HTTPStatus.OK, body, content_type, etag=tag)
+
+    def _send(self, status, body, content_type, etag=None):
+        self.send_response(status)
+        if content_type:
+            self.send_header("Content-Type", content_type)
+        if etag:
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", "no-cache")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def serve(host="127.0.0.1", port=8502):
+    server = ThreadingHTTPServer((host, port), AggregateHandler)
+    print(f"Serving healthcare aggregates on http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8502)
+    args = parser.parse_args()
+    serve(args.host, args.port)
@@ -0,0 +1,153 @@
+"""Disk tier of the result cache, shared by every process and kept across restarts.
+
+``st.cache_data`` only lives as long as the server process, so every deploy
+used to start with cold full-table scans. Aggregate query results are therefore
+also written to ``CACHE_DIR`` as Arrow IPC files, keyed by a fingerprint of the
+SQL, its parameters and the data version of the database it ran on. A
+restarted server (or a new pod sharing the directory) reads them back
+through a memory map instead of running the query again, and publishing
+new data changes the version, so stale results are simply never looked up.
+
+The directory is kept under ``CACHE_MAX_BYTES`` by deleting the least
+recently used files; a hit refreshes the file's modification time. Only
+statements run with ``db.execute(..., cache=True)`` are stored, which
+``db.read_query`` sets for grouped or aggregate queries: typeahead lookups
+and row listings are either cheap to rerun or too large to be worth a file.
+
+The cache needs ``pyarrow``; without it every lookup is a miss and nothing
+is written. Snapshot rollups (:mod:`healthcare.snapshot`) are already
+stored on disk per data version and are not duplicated here.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+CACHE_DIR = "cache"
+
+# Total size of the cache directory; 0 disables the disk tier.
+CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+# Results larger than this are not worth a file: the scan is the cheap part.
+MAX_ENTRY_BYTES = 4 * 1024 * 1024
+
+_written_since_evict = 0
+_evict_lock = threading.Lock()
+
+
+def _arrow():
+    try:
+        import pyarrow as pa
+    except ImportError:
+        return None
+    return pa
+
+
+def database_file(connection):
+    """Path of the main database file behind ``connection`` ('' if in-memory)."""
+    return connection.execute("PRAGMA database_list").fetchone()[2]
+
+
+def fingerprint(sql, params, version):
+    key = json.dumps([" ".join(sql.split()), list(params), version], default=str)
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def _path(key):
+    return os.path.join(CACHE_DIR, key[:2], f"{key}.arrow")
+
+
+def _key(connection, sql, params):
+    """Cache key for a statement on ``connection``, or None if uncacheable."""
+    if not CACHE_MAX_BYTES or _arrow() is None:
+        return None
+    path = database_file(connection)
+    if not path:
+        return None
+    from healthcare import snapshot
+
+    return fingerprint(sql, params, snapshot.data_version(path))
+
+
+def get(connection, sql, params):
+    """Cached DataFrame for the statement, or None on a miss."""
+    key = _key(connection, sql, params)
+    if key is None:
+        return None
+    pa = _arrow()
+    path = _path(key)
+    try:
+        with pa.memory_map(path) as source:
+            table = pa.ipc.open_file(source).read_all()
+        os.utime(path)
+    except (OSError, pa.ArrowInvalid):
+        return None
+    return table.to_pandas()
+
+
+def put(connection, sql, params, df):
+    """Store a result; results Arrow cannot represent are skipped."""
+    global _written_since_evict
+    key = _key(connection, sql, params)
+    if key is None:
+        return
+    pa = _arrow()
+    try:
+        table = pa.Table.from_pandas(df, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+        return
+    if table.nbytes > MAX_ENTRY_BYTES:
+        return
+
+    path = _path(key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, staging = tempfile.mkstemp(suffix=".tmp", dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, "wb") as f, pa.ipc.new_file(f, table.schema) as writer:
+            writer.write_table(table)
+        os.replace(staging, path)
+    except BaseException:
+        os.unlink(staging)
+        raise
+
+    with _evict_lock:
+        _written_since_evict += os.path.getsize(path)
+        due = _written_since_evict > CACHE_MAX_BYTES // 10
+        if due:
+            _written_since_evict = 0
+    if due:
+        evict()
+
+
+def evict(max_bytes=None):
+    """Delete least recently used entries until the cache fits ``max_bytes``."""
+    max_bytes = CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    entries = []
+    for directory, _, files in os.walk(CACHE_DIR):
+        for name in files:
+            path = os.path.join(directory, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+    return total
+
+
+def clear():
+    evict(0)
+
+
+if __name__ == "__main__":
+    print(f"cache holds {evict() / 1e6:.1f} MB after eviction")
@@ -0,0 +1,209 @@
+"""Chart-rendering layer: plotting libraries are imported on first use.
+
+``plotly.express``, ``matplotlib``, ``seaborn`` and ``altair`` together take
+longer to import than the rest of a page, and most pages only draw with one
+or two of them. Pages reach them through this module, e.g.
+``charts.px.bar(...)`` or ``charts.plt.subplots()``, so a library is only
+loaded when a chart actually needs it and a cold server starts faster.
+
+Matplotlib is switched to the non-interactive ``Agg`` backend before
+``pyplot`` loads; the server never opens a window.
+
+The helpers below keep Plotly payloads bounded however fine-grained the
+data gets: :func:`line` thins long series with Largest-Triangle-Three-
+Buckets (LTTB) and switches to WebGL traces above ``WEBGL_POINTS``,
+:func:`cap_categories` folds the tail of a category axis into an "Other"
+bucket, and :func:`cached` reuses built figures until the data version
+changes.
+"""
+
+import importlib
+import threading
+
+import numpy as np
+import pandas as pd
+
+# attribute -> module imported the first time the attribute is read
+LIBRARIES = {
+    "px": "plotly.express",
+    "go": "plotly.graph_objects",
+    "plt": "matplotlib.pyplot",
+    "sns": "seaborn",
+    "alt": "altair",
+}
+
+# Points a line series is thinned to before it is sent to the browser.
+MAX_LINE_POINTS = 1500
+
+# Above this many points, lines are drawn with WebGL (scattergl) traces.
+WEBGL_POINTS = 1000
+
+# Categories shown on a bar or pie before the rest are grouped as "Other".
+MAX_CATEGORIES = 25
+
+# Built figures kept per data version.
+FIGURE_CACHE_SIZE = 64
+
+_import_lock = threading.Lock()
+
+
+def _load(name):
+    with _import_lock:
+        if name not in globals():
+            if LIBRARIES[name].startswith("matplotlib"):
+                import matplotlib
+
+                matplotlib.use("Agg")
+            globals()[name] = importlib.import_module(LIBRARIES[name])
+    return globals()[name]
+
+
+def __getattr__(name):
+    # Only called for names not yet in the module namespace (PEP 562).
+    if name in LIBRARIES:
+        return _load(name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(set(globals()) | set(LIBRARIES))
+
+
+# Payload reduction -----------------------------------------------------------
+def _numeric(values):
+    """``values`` as floats for LTTB; text axes fall back to their positions."""
+    values = pd.Series(values)
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values.astype("int64").to_numpy(dtype=float)
+    if pd.api.types.is_numeric_dtype(values):
+        return values.to_numpy(dtype=float)
+    return np.arange(len(values), dtype=float)
+
+
+def lttb(x, y, threshold=MAX_LINE_POINTS):
+    """Positions of the points Largest-Triangle-Three-Buckets keeps.
+
+    The first and last points are always kept; every bucket in between
+    keeps the point forming the largest triangle with the previously kept
+    point and the average of the next bucket, so peaks and dips survive.
+    """
+    n = len(y)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x = _numeric(x)
+    y = np.nan_to_num(np.asarray(y, dtype=float))
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+    keep = np.empty(threshold, dtype=np.int64)
+    keep[0], keep[-1] = 0, n - 1
+    previous = 0
+    for bucket in range(threshold - 2):
+        start, stop = edges[bucket], edges[bucket + 1]
+        following = slice(stop, edges[bucket + 2] if bucket + 2 < len(edges) else n)
+        next_x, next_y = x[following].mean(), y[following].mean()
+        area = np.abs(
+            (x[previous] - next_x) * (y[start:stop] - y[previous])
+            - (x[previous] - x[start:stop]) * (next_y - y[previous])
+        )
+        previous = start + int(area.argmax())
+        keep[bucket + 1] = previous
+    return keep
+
+
+def downsample(df, x, y, threshold=MAX_LINE_POINTS, by=None):
+    """Rows of ``df`` thinned with LTTB, per ``by`` group, to about ``threshold``."""
+    if len(df) <= threshold:
+        return df
+    if by is None:
+        df = df.sort_values(x, kind="stable")
+        return df.iloc[lttb(df[x], df[y], threshold)]
+    groups = df.groupby(by, sort=False)
+    share = max(threshold // groups.ngroups, 3)
+    return pd.concat(downsample(group, x, y, share) for _, group in groups)
+
+
+def cap_categories(df, column, value, limit=MAX_CATEGORIES, keep=(), other="Other"):
+    """Keep the ``limit - 1`` largest ``column`` values and sum the rest as ``other``.
+
+    ``keep`` lists further columns to group by (e.g. the colour column);
+    any other column is dropped from the result.
+    """
+    totals = df.groupby(column, sort=False)[value].sum()
+    if len(totals) <= limit:
+        return df
+    top = totals.nlargest(limit - 1).index
+    # As text, so a numeric axis does not drop the "Other" label.
+    labels = df[column].where(df[column].isin(top), other).astype(str)
+    capped = df.assign(**{column: labels}).groupby([column, *keep], sort=False, as_index=False)[value].sum()
+    is_other = capped[column] == other
+    return pd.concat([capped[~is_other], capped[is_other]], ignore_index=True)
+
+
+def line(df, x, y, threshold=MAX_LINE_POINTS, **kwargs):
+    """``px.line`` over a downsampled series, drawn with WebGL when it is long."""
+    df = downsample(df, x, y, threshold, by=kwargs.get("color"))
+    render_mode = "webgl" if len(df) > WEBGL_POINTS else "svg"
+    return _load("px").line(df, x=x, y=y, render_mode=render_mode, **kwargs)
+
+
+# Shared figures --------------------------------------------------------------
+def age_group_pies(df, admission_types):
+    """Matplotlib figure with one age-group pie per admission type.
+
+    ``df`` has ``Admission_Type``, ``Age_Group`` and ``admission_count``
+    columns (see :func:`healthcare.aggregates.age_groups_by_admission_type`);
+    types without admissions get a grey "Not Applicable" pie.
+    """
+    plt = _load("plt")
+    fig, axes = plt.subplots(1, len(admission_types), figsize=(6 * len(admission_types), 6))
+    for axis, admission_type in zip(np.atleast_1d(axes), admission_types):
+        admission_df = df[df["Admission_Type"] == admission_type]
+        if admission_df.empty:
+            axis.pie([1], labels=["Not Applicable"], colors=["lightgrey"], startangle=90)
+        else:
+            axis.pie(
+                admission_df["admission_count"],
+                labels=admission_df["Age_Group"],
+                autopct="%1.1f%%",
+                startangle=90,
+                colors=plt.cm.Paired.colors,
+            )
+        axis.set_title(admission_type)
+    return fig
+
+
+# Figure cache ----------------------------------------------------------------
+_figures = {}
+_figures_version = None
+_figure_lock = threading.Lock()
+
+
+def cached(name, build, df, **kwargs):
+    """``build(df, **kwargs)``, reused while the data version, ``df`` and kwargs are unchanged.
+
+    Building a Plotly figure (validation, trace construction) costs more
+    than the query behind it on most pages; reruns that only change an
+    unrelated widget get the same figure back. Callers must not mutate
+    the returned figure.
+    """
+    global _figures_version
+    from healthcare import snapshot
+
+    version = snapshot.data_version()
+    key = (
+        name,
+        tuple(df.columns),
+        int(pd.util.hash_pandas_object(df, index=False).sum()),
+        repr(sorted(kwargs.items())),
+    )
+    with _figure_lock:
+        if version != _figures_version:
+            _figures.clear()
+            _figures_version = version
+        figure = _figures.get(key)
+    if figure is None:
+        figure = build(df, **kwargs)
+        with _figure_lock:
+            if len(_figures) >= FIGURE_CACHE_SIZE:
+                del _figures[next(iter(_figures))]
+            _figures[key] = figure
+    return figure
@@ -0,0 +1,124 @@
+"""Period-over-period comparisons from a single grouped query.
+
+:func:`split` turns a page aggregate into one query that covers both
+periods and labels every row ``current`` or ``previous`` with a ``CASE``
+on the admission date, grouped alongside the page's own keys. Both periods
+therefore come from one scan of the rows (and, when sharded, the shards of
+both periods), so a comparison costs about as much as the single-period
+view. :func:`deltas` lines the two periods up per key and computes the
+changes for all keys at once; :func:`top_movers` ranks them.
+"""
+
+import datetime
+
+import numpy as np
+import pandas as pd
+
+PERIOD = "Period"
+CURRENT = "current"
+PREVIOUS = "previous"
+DATE_COLUMN = "Date_of_Admission"
+
+# mode -> how the previous period is placed relative to the current one
+MODES = {
+    "Previous period": "previous",
+    "Same period last year": "year",
+}
+
+
+def previous_period(current, mode="previous"):
+    """The period ``current`` (a ``(start, end)`` pair of dates) is compared with.
+
+    ``"previous"`` is the equally long period ending the day before
+    ``current`` starts; ``"year"`` is the same dates one year earlier.
+    Raises ``ValueError`` when the two would overlap (a ``"year"``
+    comparison of more than a year): every row is labelled with one period
+    only, so the overlap would be missing from the earlier one.
+    """
+    start, end = (pd.Timestamp(day) for day in current)
+    if mode == "year":
+        current_start = start
+        start, end = start - pd.DateOffset(years=1), end - pd.DateOffset(years=1)
+        if end >= current_start:
+            raise ValueError("a same-period-last-year comparison needs a range of at most one year")
+    else:
+        length = end - start
+        end = start - pd.Timedelta(days=1)
+        start = end - length
+    return start.date(), end.date()
+
+
+def split(query, current, previous, column=DATE_COLUMN):
+    """Copy of ``query`` grouped by period as well, covering both periods.
+
+    The page's ORDER BY and LIMIT are dropped: a limit would apply to both
+    periods together, and :func:`top_movers` orders the result instead.
+    The periods must not overlap (see :func:`previous_period`).
+    """
+    current = tuple(str(day) for day in current)
+    previous = tuple(str(day) for day in previous)
+    if previous[0] <= current[1] and current[0] <= previous[1]:
+        raise ValueError("the compared periods overlap")
+    both = query.copy().without_order().limit(None)
+    both.select_expression(
+        f"CASE WHEN {column} BETWEEN ? AND ? THEN '{CURRENT}' ELSE '{PREVIOUS}' END",
+        PERIOD,
+        *current,
+    )
+    # The outer range lets sharded reads prune; the OR skips any gap between the periods.
+    first, last = min(previous[0], current[0]), max(previous[1], current[1])
+    both.where_date_range(first, last, column=column)
+    both.where(f"({column} BETWEEN ? AND ? OR {column} BETWEEN ? AND ?)", *current, *previous)
+    return both.group_by(PERIOD)
+
+
+def deltas(df, keys, measures, averages=()):
+    """One row per key with each measure's current and previous value and change.
+
+    For every measure ``m`` the columns are ``m_Current``, ``m_Previous``,
+    ``m_Change`` and ``m_Change_Pct`` (percent of the previous value; empty
+    when there was nothing before). Keys missing from a period count as 0
+    for additive measures such as counts and sums; measures listed in
+    ``averages`` have no value there, so they stay empty and so does their
+    change, rather than reporting a change from or to 0. A frame without
+    a period column (e.g. the empty result of a rejected query) gives an
+    empty table with the same columns.
+    """
+    keys = list(keys)
+    if PERIOD not in df.columns:
+        df = pd.DataFrame(columns=[*keys, PERIOD, *measures])
+    if not keys:
+        df, keys = df.assign(All="All"), ["All"]
+    periods = {
+        period: df[df[PERIOD] == period].set_index(keys)[list(measures)]
+        for period in (CURRENT, PREVIOUS)
+    }
+    index = periods[CURRENT].index.union(periods[PREVIOUS].index)
+    table = pd.DataFrame(index=index)
+    for measure in measures:
+        missing = np.nan if measure in averages else 0
+        now = periods[CURRENT][measure].reindex(index).fillna(missing).to_numpy(dtype=float)
+        before = periods[PREVIOUS][measure].reindex(index).fillna(missing).to_numpy(dtype=float)
+        change = now - before
+        table[f"{measure}_Current"] = now
+        table[f"{measure}_Previous"] = before
+        table[f"{measure}_Change"] = change
+        with np.errstate(divide="ignore", invalid="ignore"):
+            table[f"{measure}_Change_Pct"] = np.where(before != 0, 100 * change / np.abs(before), np.nan)
+    return table.reset_index()
+
+
+def top_movers(table, measure, n=10):
+    """The ``n`` rows of a :func:`deltas` table with the largest absolute change."""
+    change = table[f"{measure}_Change"].abs().to_numpy()
+    order = np.argsort(-change, kind="stable")[:n]
+    return table.iloc[order].reset_index(drop=True)
+
+
+def describe(current, previous):
+    """Short label such as ``Jan 01, 2024 - Mar 31, 2024 vs Oct 01, 2023 - Dec 31, 2023``."""
+    def span(period):
+        start, end = (datetime.date.fromisoformat(str(day)) for day in period)
+        return f"{start:%b %d, %Y} - {end:%b %d, %Y}"
+
+    return f"{span(current)} vs {span(previous)}"
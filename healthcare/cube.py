@@ -0,0 +1,262 @@
+"""Dense in-memory cube over the low-cardinality categorical columns.
+
+The cube holds one COUNT array and one SUM array per measure, each a dense
+NumPy ndarray with one axis per dimension, indexed by the dimension codes.
+Any pivot, slice or roll-up is then an array reduction, so a page can pivot
+on whichever two dimensions the user picks without issuing new SQL. AVG is
+derived as SUM / COUNT.
+
+The cube is built from the columnar snapshot with one ``np.bincount`` per
+measure and stored as a snapshot rollup, so every server process maps the
+same copy and a new data version gets a new cube. ``CUBES`` lists the
+cubes kept per version; each is a few thousand to a few hundred thousand
+cells.
+"""
+
+import json
+import os
+import shutil
+import tempfile
+import threading
+
+import numpy as np
+import pandas as pd
+
+from healthcare import snapshot as snapshots
+
+DIMENSIONS = (
+    "Medical_Condition",
+    "Insurance_Provider",
+    "Admission_Type",
+    "Test_Results",
+    "Medication",
+    "Gender",
+    "Blood_Type",
+    "Age_Group",
+)
+MEASURES = ("Billing_Amount", "Total_Days_of_Stay")
+AGGREGATES = ("sum", "count", "avg")
+
+# Date-range cubes kept in memory per process.
+RANGED_CUBES = 16
+
+
+class Cube:
+    """COUNT and per-measure SUM arrays with one axis per dimension."""
+
+    def __init__(self, dimensions, labels, counts, sums):
+        self.dimensions = list(dimensions)
+        self.labels = {dim: list(values) for dim, values in zip(dimensions, labels)}
+        self.counts = counts
+        self.sums = sums
+
+    @classmethod
+    def from_frame(cls, df, dimensions=DIMENSIONS, measures=MEASURES):
+        codes, labels = [], []
+        for dim in dimensions:
+            values = df[dim]
+            if isinstance(values.dtype, pd.CategoricalDtype):
+                dim_codes, dim_labels = values.cat.codes.to_numpy(), values.cat.categories
+            else:
+                dim_codes, dim_labels = pd.factorize(values, sort=True)
+            codes.append(dim_codes)
+            labels.append(pd.Index(dim_labels).tolist())
+
+        shape = tuple(len(dim_labels) for dim_labels in labels)
+        valid = np.logical_and.reduce([dim_codes >= 0 for dim_codes in codes])
+        flat = np.ravel_multi_index([dim_codes[valid] for dim_codes in codes], shape)
+        size = int(np.prod(shape))
+        counts = np.bincount(flat, minlength=size).reshape(shape)
+        sums = {
+            measure: np.bincount(
+                flat, weights=df[measure].to_numpy(dtype=np.float64)[valid], minlength=size
+            ).reshape(shape)
+            for measure in measures
+        }
+        return cls(dimensions, labels, counts, sums)
+
+    # Persistence -----------------------------------------------------------
+    def save(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        np.save(os.path.join(directory, "counts.npy"), self.counts)
+        for measure, values in self.sums.items():
+            np.save(os.path.join(directory, f"sum.{measure}.npy"), values)
+        with open(os.path.join(directory, "labels.json"), "w") as f:
+            json.dump({"dimensions": self.dimensions, "labels": self.labels,
+                       "measures": list(self.sums)}, f)
+
+    @classmethod
+    def load(cls, directory):
+        with open(os.path.join(directory, "labels.json")) as f:
+            meta = json.load(f)
+        counts = np.load(os.path.join(directory, "counts.npy"), mmap_mode="r")
+        sums = {
+            measure: np.load(os.path.join(directory, f"sum.{measure}.npy"), mmap_mode="r")
+            for measure in meta["measures"]
+        }
+        labels = [meta["labels"][dim] for dim in meta["dimensions"]]
+        return cls(meta["dimensions"], labels, counts, sums)
+
+    # Queries ---------------------------------------------------------------
+    def axis(self, dim):
+        return self.dimensions.index(dim)
+
+    def _take(self, dim, positions):
+        axis = self.axis(dim)
+        positions = np.asarray(positions, dtype=np.intp)
+        labels = [
+            [self.labels[dim][position] for position in positions] if other == dim else self.labels[other]
+            for other in self.dimensions
+        ]
+        return Cube(
+            self.dimensions,
+            labels,
+            np.take(self.counts, positions, axis=axis),
+            {measure: np.take(values, positions, axis=axis) for measure, values in self.sums.items()},
+        )
+
+    def slice(self, **selection):
+        """Keep only the given labels along each named dimension.
+
+        ``cube.slice(Medical_Condition=["Cancer"])``; an empty or ``None``
+        selection leaves that dimension whole.
+        """
+        cube = self
+        for dim, chosen in selection.items():
+            if chosen:
+                known = cube.labels[dim]
+                cube = cube._take(dim, [known.index(label) for label in chosen if label in known])
+        return cube
+
+    def where(self, dim, mask):
+        """Keep the labels of ``dim`` where the boolean ``mask`` is true."""
+        return self._take(dim, np.flatnonzero(mask))
+
+    def regroup(self, dim, keys):
+        """Merge the labels of ``dim`` into coarser groups.
+
+        ``keys[i]`` names the group of the i-th label, e.g. the age band of
+        each age; the groups become the new, sorted labels of ``dim``.
+        """
+        axis = self.axis(dim)
+        codes, groups = pd.factorize(pd.Series(list(keys)), sort=True)
+        membership = np.zeros((len(codes), len(groups)))
+        membership[np.arange(len(codes)), codes] = 1
+
+        def merge(values):
+            merged = np.tensordot(np.moveaxis(np.asarray(values), axis, -1), membership, axes=1)
+            return np.moveaxis(merged, -1, axis)
+
+        labels = [groups.tolist() if other == dim else self.labels[other] for other in self.dimensions]
+        return Cube(
+            self.dimensions,
+            labels,
+            merge(self.counts).round().astype(np.int64),
+            {measure: merge(values) for measure, values in self.sums.items()},
+        )
+
+    def rollup(self, keep, measure=None, agg="count"):
+        """Reduce every dimension not in ``keep``; axes follow ``keep``'s order."""
+        if agg not in AGGREGATES:
+            raise ValueError(f"agg must be one of {AGGREGATES}, not {agg!r}")
+        drop = tuple(axis for axis, dim in enumerate(self.dimensions) if dim not in keep)
+        counts = np.asarray(self.counts).sum(axis=drop)
+        kept = [dim for dim in self.dimensions if dim in keep]
+        order = [kept.index(dim) for dim in keep]
+        if agg == "count":
+            result = counts
+        else:
+            sums = np.asarray(self.sums[measure]).sum(axis=drop)
+            if agg == "sum":
+                result = sums
+            else:
+                with np.errstate(invalid="ignore", divide="ignore"):
+                    result = np.where(counts > 0, sums / np.maximum(counts, 1), np.nan)
+        return np.transpose(result, order)
+
+    def pivot(self, rows, columns, measure=None, agg="count"):
+        """Two-dimensional pivot as a DataFrame (rows x columns)."""
+        values = self.rollup([rows, columns], measure, agg)
+        frame = pd.DataFrame(values, index=self.labels[rows], columns=self.labels[columns])
+        frame.index.name, frame.columns.name = rows, columns
+        return frame
+
+    def frame(self, dims, measure=None, agg="count", name=None):
+        """Long-form table: one row per combination of ``dims``."""
+        values = self.rollup(list(dims), measure, agg)
+        index = pd.MultiIndex.from_product([self.labels[dim] for dim in dims], names=list(dims))
+        name = name or (agg.title() if measure is None else f"{agg.title()}_{measure}")
+        return pd.Series(values.ravel(), index=index, name=name).reset_index()
+
+
+# name -> (dimensions, measures) of every cube published per data version.
+CUBES = {
+    "cube": (DIMENSIONS, MEASURES),
+    # Small enough to keep every distinct age: serves the Test Results page.
+    "test_results": (("Age", "Medical_Condition", "Test_Results", "Admission_Type"), ()),
+}
+
+_loaded = {}
+_load_lock = threading.Lock()
+
+
+def publish(snap, name="cube"):
+    """Build cube ``name`` from the snapshot rows and store it beside them."""
+    target = snap.rollup_path(name)
+    if os.path.exists(target):
+        return
+    dimensions, measures = CUBES[name]
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    staging = tempfile.mkdtemp(prefix=f".{name}-", dir=os.path.dirname(target))
+    try:
+        rows = snap.frame(list(dimensions) + list(measures))
+        Cube.from_frame(rows, dimensions, measures).save(staging)
+        try:
+            os.rename(staging, target)
+        except OSError:
+            if not os.path.exists(target):
+                raise
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+
+def current(name="cube", database_path=None, date_range=None):
+    """Cube ``name`` (see ``CUBES``) for the current data version, publishing it if needed.
+
+    With a ``(start, end)`` admission ``date_range`` the cube is built from
+    the matching snapshot rows instead; the last few ranges are kept.
+    """
+    snap = snapshots.current(database_path)
+    if date_range is not None:
+        return _for_range(snap, name, tuple(date_range))
+    with _load_lock:
+        cube = _loaded.get((snap.version, name))
+        if cube is None:
+            publish(snap, name)
+            # Drop cubes of older versions so their mappings can be released.
+            for key in [key for key in _loaded if key[0] != snap.version]:
+                del _loaded[key]
+            cube = _loaded[snap.version, name] = Cube.load(snap.rollup_path(name))
+    return cube
+
+
+# Cubes for recent date ranges: (version, name, range) -> Cube
+_ranged = {}
+
+
+def _for_range(snap, name, date_range):
+    key = (snap.version, name, date_range)
+    cube = _ranged.get(key)
+    if cube is None:
+        dimensions, measures = CUBES[name]
+        rows = snap.frame(list(dimensions) + list(measures) + ["Date_of_Admission"])
+        dates = rows["Date_of_Admission"].to_numpy("datetime64[D]")
+        start, end = (np.datetime64(day, "D") for day in date_range)
+        # Snapshot text columns are Categoricals, so the labels (and chart
+        # axes) stay those of the full data even when a range lacks some.
+        cube = Cube.from_frame(rows[(dates >= start) & (dates <= end)], dimensions, measures)
+        with _load_lock:
+            if len(_ranged) >= RANGED_CUBES:
+                del _ranged[next(iter(_ranged))]
+            _ranged[key] = cube
+    return cube
@@ -0,0 +1,280 @@
+"""Connections and query execution for the dashboard pages."""
+
+import os
+import queue
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+
+import numpy as np
+import pandas as pd
+
+from healthcare import cache
+from healthcare.governor import current_session, governor
+
+DATABASE_PATH = 'healthcare_database.db'
+
+# Published database versions live under DATA_ROOT; CURRENT names the live
+# one (see healthcare.publish). Without it the pages read DATABASE_PATH.
+DATA_ROOT = 'data'
+POINTER_FILE = os.path.join(DATA_ROOT, 'CURRENT')
+
+# Prepared statements kept per connection. The pages issue a few dozen
+# distinct statements in total, so this comfortably holds all of them.
+STATEMENT_CACHE_SIZE = 256
+
+# Rows pulled from SQLite per fetchmany() call.
+FETCH_SIZE = 4096
+
+# Queries from one batch that may run at the same time. SQLite releases the
+# GIL while stepping a statement, so these genuinely overlap.
+MAX_CONCURRENT_QUERIES = 4
+
+
+_pointer = (None, DATABASE_PATH)
+_pointer_lock = threading.Lock()
+
+
+def current_database():
+    """Path of the live database version.
+
+    Ingest publishes by atomically replacing the pointer file, so every
+    call sees either the old version or the new one, never a half-loaded
+    file. The pointer is re-read only when its modification time changes.
+    """
+    global _pointer
+    try:
+        stamp = os.stat(POINTER_FILE).st_mtime_ns
+    except FileNotFoundError:
+        return DATABASE_PATH
+    with _pointer_lock:
+        if _pointer[0] != stamp:
+            with open(POINTER_FILE) as f:
+                _pointer = (stamp, os.path.join(DATA_ROOT, f.read().strip()))
+        return _pointer[1]
+
+
+def connect(database_path=None):
+    if database_path is None:
+        database_path = current_database()
+    return sqlite3.connect(
+        database_path,
+        cached_statements=STATEMENT_CACHE_SIZE,
+        check_same_thread=False,
+    )
+
+
+class ConnectionPool:
+    """Reusable read connections, so prepared statements survive reruns.
+
+    A connection is borrowed by one thread at a time and handed back when
+    the query finishes; up to ``max_idle`` connections are kept warm.
+    """
+
+    def __init__(self, database_path, max_idle=8):
+        self.database_path = database_path
+        self._idle = queue.LifoQueue(maxsize=max_idle)
+
+    def _open(self):
+        connection = connect(self.database_path)
+        connection.execute("PRAGMA query_only = ON")
+        return connection
+
+    @contextmanager
+    def connection(self):
+        try:
+            connection = self._idle.get_nowait()
+        except queue.Empty:
+            connection = self._open()
+        try:
+            yield connection
+        finally:
+            try:
+                self._idle.put_nowait(connection)
+            except queue.Full:
+                connection.close()
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(database_path=None):
+    """Connection pool for ``database_path`` (default: the live version).
+
+    When a new version goes live, idle connections to older versions are
+    closed; connections still running a query finish on the old file.
+    """
+    live = database_path is None
+    if live:
+        database_path = current_database()
+    pool = _pools.get(database_path)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(database_path)
+            if pool is None:
+                if live:
+                    for stale in _pools.values():
+                        stale.close()
+                    _pools.clear()
+                pool = _pools[database_path] = ConnectionPool(database_path)
+    return pool
+
+
+def _column_dtype(values):
+    """Pick a NumPy dtype for a column from its first chunk of values."""
+    if all(type(value) is int for value in values):
+        return np.int64
+    if all(type(value) in (int, float) or value is None for value in values):
+        return np.float64
+    return object
+
+
+def _store(array, start, values):
+    """Copy ``values`` into ``array[start:]``, widening the dtype if needed."""
+    try:
+        array[start:start + len(values)] = values
+        return array
+    except (TypeError, ValueError, OverflowError):
+        widened = array.astype(np.float64 if array.dtype == np.int64 else object)
+        return _store(widened, start, values)
+
+
+def fetch_frame(cursor, fetch_size=FETCH_SIZE):
+    """Stream an executed cursor into a DataFrame.
+
+    Rows are pulled ``fetch_size`` at a time and transposed straight into
+    preallocated NumPy column arrays, which are handed to pandas without a
+    further copy. Capacity doubles as needed, so the full result never
+    exists as a Python list of tuples.
+    """
+    columns = [desc[0] for desc in cursor.description]
+    arrays = None
+    size = 0
+    while True:
+        rows = cursor.fetchmany(fetch_size)
+        if not rows:
+            break
+        chunk = list(zip(*rows))
+        if arrays is None:
+            arrays = [np.empty(fetch_size, dtype=_column_dtype(values)) for values in chunk]
+        if size + len(rows) > len(arrays[0]):
+            capacity = max(2 * len(arrays[0]), size + len(rows))
+            arrays = [np.resize(array, capacity) for array in arrays]
+        arrays = [_store(array, size, values) for array, values in zip(arrays, chunk)]
+        size += len(rows)
+
+    if arrays is None:
+        return pd.DataFrame(columns=columns)
+    return pd.DataFrame(
+        {column: array[:size] for column, array in zip(columns, arrays)},
+        copy=False,
+    )
+
+
+def _run(connection, sql, params, slot, heavy, session, cached_on_disk):
+    # A result computed by any process since this data version went live is on disk.
+    if cached_on_disk:
+        cached = cache.get(connection, sql, params)
+        if cached is not None:
+            return cached
+    if slot is None and not heavy:
+        guard = nullcontext()
+    else:
+        guard = governor.govern(connection, session=session, slot=slot, heavy=heavy)
+    with guard:
+        df = fetch_frame(connection.execute(sql, params))
+    if cached_on_disk:
+        cache.put(connection, sql, params, df)
+    return df
+
+
+def execute(sql, params=(), connection=None, slot=None, heavy=False, session=None, cache=False):
+    """Run raw SQL on ``connection`` (or a pooled one) and return a DataFrame.
+
+    Passing ``slot`` and/or ``heavy`` runs the statement under the
+    :mod:`~healthcare.governor`, which may raise a ``GovernorError``.
+    ``cache=True`` also keeps the result in the disk cache
+    (:mod:`~healthcare.cache`); only worth it for small results of costly
+    scans, such as aggregates.
+    """
+    if slot is not None and session is None:
+        session = current_session()
+    if connection is not None:
+        return _run(connection, sql, params, slot, heavy, session, cache)
+    with get_pool().connection() as pooled:
+        return _run(pooled, sql, params, slot, heavy, session, cache)
+
+
+def read_query(query, connection=None, slot=None, heavy=False, session=None):
+    """Run a :class:`~healthcare.query.Query` and return a DataFrame.
+
+    Without an explicit ``connection``, a sharded deployment runs the query
+    as a scatter-gather over every shard (see :mod:`healthcare.shards`).
+    Aggregate results are kept in the disk cache; row listings are not.
+    """
+    if connection is None:
+        from healthcare import shards
+
+        if shards.configured():
+            if slot is not None and session is None:
+                session = current_session()
+            return shards.read_query(query, slot=slot, heavy=heavy, session=session)
+    sql, params = query.build()
+    return execute(
+        sql, params, connection, slot=slot, heavy=heavy, session=session, cache=query.is_aggregate()
+    )
+
+
+def as_statement(query):
+    """Accept a Query, a bare SQL string or an ``(sql, params)`` pair."""
+    if isinstance(query, str):
+        return query, ()
+    if isinstance(query, tuple):
+        return query
+    return query.build()
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=MAX_CONCURRENT_QUERIES, thread_name_prefix="healthcare-query"
+            )
+    return _executor
+
+
+def read_many(queries, slot=None, heavy=False):
+    """Run independent queries concurrently and return all their results.
+
+    ``queries`` maps a name to a Query, SQL string or ``(sql, params)``
+    pair; the result maps the same names to DataFrames. Each query runs on
+    its own pooled connection, so the batch takes about as long as its
+    slowest query rather than the sum of all of them. With a ``slot``, each
+    query is governed under ``"<slot>.<name>"``.
+    """
+    # The worker threads have no Streamlit context, so resolve it here.
+    session = current_session() if slot is not None else None
+    executor = _get_executor()
+    futures = {}
+    for name, query in queries.items():
+        options = dict(slot=None if slot is None else f"{slot}.{name}", heavy=heavy, session=session)
+        if not isinstance(query, (str, tuple)):
+            # Query objects can be planned over shards; raw SQL cannot.
+            futures[name] = executor.submit(read_query, query, **options)
+        else:
+            futures[name] = executor.submit(execute, *as_statement(query), **options)
+    return {name: future.result() for name, future in futures.items()}
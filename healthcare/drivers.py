@@ -0,0 +1,254 @@
+"""Which factors move ``Billing_Amount`` the most.
+
+Every categorical factor is scored with a one-way ANOVA: group counts,
+sums and sums of squares come from three ``np.bincount`` calls over the
+factor codes, which give the group means and variances, eta-squared (the
+share of billing variance explained by the groups) and the F statistic.
+Numeric factors are scored with their Pearson and Spearman correlation;
+their ``Effect`` is r squared, which is the same share of variance for a
+linear fit, so both kinds rank on one scale.
+
+The statistics run over the columnar snapshot, on a fixed random sample of
+at most ``SAMPLE_ROWS`` rows, and are stored as snapshot rollups: they are
+computed once per data version and shared by every server process. Results
+for an admission-date range are computed on demand and the last few are
+kept in memory.
+
+A gradient-boosted importance per factor is added on request when
+scikit-learn is installed; P-values need SciPy. Without them those columns
+are left empty.
+"""
+
+import importlib
+import threading
+
+import numpy as np
+import pandas as pd
+
+from healthcare import snapshot as snapshots
+
+TARGET = "Billing_Amount"
+
+CATEGORICAL = (
+    "Age_Group",
+    "Admission_Type",
+    "Medical_Condition",
+    "Insurance_Provider",
+    "Medication",
+    "Test_Results",
+    "Gender",
+    "Blood_Type",
+    "Admission_Month_Name",
+)
+NUMERIC = ("Age", "Total_Days_of_Stay", "Admission_Year", "Admission_Month", "Room_Number")
+
+# Rows the statistics are computed on; larger tables are sampled.
+SAMPLE_ROWS = 500_000
+
+# Rows the gradient-boosted model is fitted on.
+IMPORTANCE_ROWS = 50_000
+
+# Date-range results kept in memory per process.
+RANGED_RESULTS = 8
+
+
+def _optional(module):
+    try:
+        return importlib.import_module(module)
+    except ImportError:
+        return None
+
+
+def sample(rows, limit=SAMPLE_ROWS, seed=0):
+    """At most ``limit`` rows of ``rows``, the same ones on every call."""
+    if len(rows) <= limit:
+        return rows
+    picked = np.random.default_rng(seed).choice(len(rows), size=limit, replace=False)
+    return rows.iloc[np.sort(picked)]
+
+
+def categorical_effect(codes, y):
+    """One-way ANOVA of ``y`` over integer group ``codes`` (``-1`` is skipped)."""
+    keep = codes >= 0
+    codes, y = codes[keep], y[keep]
+    counts = np.bincount(codes)
+    present = counts > 0
+    counts = counts[present]
+    sums = np.bincount(codes, weights=y)[present]
+    squares = np.bincount(codes, weights=y * y)[present]
+
+    n, k = len(y), len(counts)
+    if k == 0:
+        return {"Levels": 0, "Eta_Squared": np.nan, "F_Statistic": np.nan, "P_Value": np.nan}
+    means = sums / counts
+    total = squares.sum() - sums.sum() ** 2 / n
+    between = (counts * (means - y.mean()) ** 2).sum()
+    within = total - between
+    f = (between / (k - 1)) / (within / (n - k)) if k > 1 and n > k and within > 0 else np.nan
+
+    stats = _optional("scipy.stats")
+    return {
+        "Levels": k,
+        "Eta_Squared": between / total if total > 0 else np.nan,
+        "F_Statistic": f,
+        "P_Value": stats.f.sf(f, k - 1, n - k) if stats is not None and np.isfinite(f) else np.nan,
+    }
+
+
+def numeric_effect(x, y):
+    """Pearson and Spearman correlation of ``x`` with ``y``, ignoring missing pairs."""
+    keep = np.isfinite(x) & np.isfinite(y)
+    x, y = x[keep], y[keep]
+    if len(x) < 3 or x.std() == 0:
+        return {"Correlation": np.nan, "Rank_Correlation": np.nan}
+    ranks = pd.DataFrame({"x": x, "y": y}).rank().to_numpy()
+    return {
+        "Correlation": np.corrcoef(x, y)[0, 1],
+        "Rank_Correlation": np.corrcoef(ranks[:, 0], ranks[:, 1])[0, 1],
+    }
+
+
+def _factors(columns):
+    present = set(columns)
+    return (
+        [column for column in CATEGORICAL if column in present],
+        [column for column in NUMERIC if column in present],
+    )
+
+
+def analyze(rows):
+    """Ranked driver table and per-group statistics for the rows given.
+
+    Returns ``(ranking, groups)``: ``ranking`` has one row per factor,
+    strongest ``Effect`` first; ``groups`` holds the count, mean and
+    variance of the target for every level of every categorical factor.
+    """
+    categorical, numeric = _factors(rows.columns)
+    y = rows[TARGET].to_numpy(dtype=float)
+    ranking, groups = [], []
+    for column in categorical:
+        codes, levels = pd.factorize(rows[column], sort=True)
+        effect = categorical_effect(codes, y)
+        ranking.append({"Factor": column, "Kind": "categorical", "Effect": effect["Eta_Squared"], **effect})
+
+        keep = codes >= 0
+        frame = pd.DataFrame({"Level": np.asarray(levels, dtype=str)[codes[keep]], TARGET: y[keep]})
+        stats = frame.groupby("Level", sort=True)[TARGET].agg(["count", "mean", "var"])
+        groups.append(stats.reset_index().rename(
+            columns={"count": "Count", "mean": "Mean", "var": "Variance"}
+        ).assign(Factor=column))
+    for column in numeric:
+        effect = numeric_effect(rows[column].to_numpy(dtype=float), y)
+        ranking.append({"Factor": column, "Kind": "numeric", "Effect": effect["Correlation"] ** 2, **effect})
+
+    ranking = pd.DataFrame(ranking, columns=[
+        "Factor", "Kind", "Effect", "Levels", "Eta_Squared", "F_Statistic", "P_Value",
+        "Correlation", "Rank_Correlation",
+    ])
+    ranking = ranking.sort_values("Effect", ascending=False, na_position="last").reset_index(drop=True)
+    groups = pd.concat(groups, ignore_index=True) if groups else pd.DataFrame(
+        columns=["Level", "Count", "Mean", "Variance", "Factor"]
+    )
+    return ranking, groups[["Factor", "Level", "Count", "Mean", "Variance"]]
+
+
+def importance(rows, limit=IMPORTANCE_ROWS):
+    """Gradient-boosted feature importance per factor, or None without scikit-learn."""
+    ensemble = _optional("sklearn.ensemble")
+    if ensemble is None:
+        return None
+    rows = sample(rows, limit)
+    categorical, numeric = _factors(rows.columns)
+    # Category codes as floats, with missing values (code -1) as NaN.
+    codes = [pd.factorize(rows[column], sort=True)[0].astype(float) for column in categorical]
+    features = np.column_stack(
+        [np.where(column < 0, np.nan, column) for column in codes]
+        + [rows[column].to_numpy(dtype=float) for column in numeric]
+    )
+    model = ensemble.HistGradientBoostingRegressor(
+        categorical_features=np.arange(features.shape[1]) < len(categorical), random_state=0
+    )
+    target = rows[TARGET].to_numpy(dtype=float)
+    model.fit(features, target)
+    inspection = _optional("sklearn.inspection")
+    scores = inspection.permutation_importance(model, features, target, n_repeats=3, random_state=0)
+    return pd.DataFrame({"Factor": categorical + numeric, "Importance": scores.importances_mean})
+
+
+def _rows(snap, date_range=None):
+    categorical, numeric = _factors(snap.columns)
+    rows = snap.frame([TARGET, *categorical, *numeric, "Date_of_Admission"])
+    if date_range is not None:
+        dates = rows["Date_of_Admission"].to_numpy("datetime64[D]")
+        start, end = (np.datetime64(day, "D") for day in date_range)
+        rows = rows[(dates >= start) & (dates <= end)]
+    return sample(rows)
+
+
+def _build(part):
+    # One analysis pass publishes both parts, whichever is asked for first.
+    def build(snap):
+        ranking, stats = analyze(_rows(snap))
+        parts = {"drivers": ranking, "drivers.groups": stats}
+        for name, df in parts.items():
+            if name != part:
+                snapshots.publish_rollup(snap, name, df)
+        return parts[part]
+
+    return build
+
+
+# Results for recent date ranges: (version, range, with importance) -> (ranking, groups)
+_ranged = {}
+_ranged_lock = threading.Lock()
+
+
+def _for_range(snap, date_range, with_importance):
+    key = (snap.version, date_range, with_importance)
+    result = _ranged.get(key)
+    if result is None:
+        rows = _rows(snap, date_range)
+        ranking, groups = analyze(rows)
+        if with_importance:
+            ranking = _with_importance(ranking, importance(rows))
+        result = (ranking, groups)
+        with _ranged_lock:
+            if len(_ranged) >= RANGED_RESULTS:
+                del _ranged[next(iter(_ranged))]
+            _ranged[key] = result
+    return result
+
+
+def _with_importance(ranking, scores):
+    if scores is None:
+        return ranking.assign(Importance=np.nan)
+    return ranking.merge(scores, on="Factor", how="left")
+
+
+def ranked(database_path=None, date_range=None, with_importance=False):
+    """Driver ranking for the live data (see :func:`analyze`), strongest first.
+
+    ``with_importance`` adds the gradient-boosted ``Importance`` column;
+    it is empty when scikit-learn is not installed.
+    """
+    snap = snapshots.current(database_path)
+    if date_range is not None:
+        return _for_range(snap, tuple(date_range), with_importance)[0]
+    ranking = snap.rollup("drivers", build=_build("drivers"))
+    if not with_importance:
+        return ranking
+    if _optional("sklearn.ensemble") is None:
+        return _with_importance(ranking, None)
+    scores = snap.rollup("drivers.importance", build=lambda s: importance(_rows(s)))
+    return _with_importance(ranking, scores)
+
+
+def groups(factor, database_path=None, date_range=None):
+    """Count, mean and variance of the target for each level of ``factor``."""
+    snap = snapshots.current(database_path)
+    if date_range is not None:
+        stats = _for_range(snap, tuple(date_range), False)[1]
+    else:
+        stats = snap.rollup("drivers.groups", build=_build("drivers.groups"))
+    stats = stats[stats["Factor"] == factor]
+    return stats.drop(columns="Factor").reset_index(drop=True)
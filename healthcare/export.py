@@ -0,0 +1,207 @@
+"""Stream query results to CSV or Parquet in constant memory.
+
+Exports rerun the page's current filter on the server, without the row
+limit the page applies for display, and pull rows ``EXPORT_CHUNK_ROWS`` at
+a time. Each chunk is encoded and written out before the next one is
+fetched, so an extract of any size needs only one chunk in memory.
+
+Finished files go to ``EXPORT_DIR``, which Streamlit serves as static
+files (``server.enableStaticServing``), so a download is streamed from disk
+by the web server instead of being loaded into the app's memory. That server
+sends files up to ``STATIC_MAX_BYTES``; larger extracts are kept on the
+server for collection instead. File names are random and :func:`cleanup`
+removes files by age and total size.
+
+The Parquet schema is fixed before the first chunk from the declared types
+of the dataset columns and the query's aggregates, so a first chunk of
+NULLs or of whole numbers cannot pin the wrong type.
+
+Parquet support needs ``pyarrow``; CSV works with the standard library.
+"""
+
+import csv
+import io
+import os
+import time
+import uuid
+
+from healthcare import db, schema
+from healthcare.governor import governor
+
+EXPORT_CHUNK_ROWS = 50_000
+
+# Served by Streamlit at EXPORT_URL (static serving maps ./static to app/static).
+EXPORT_DIR = os.path.join("static", "exports")
+EXPORT_URL = "app/static/exports"
+
+# Largest file Streamlit's static server will send (it answers 404 above this).
+STATIC_MAX_BYTES = 200 * 1024 ** 2
+
+# Exports older than this, or beyond this total size (oldest first), are removed.
+EXPORT_MAX_AGE = 3600.0
+EXPORT_MAX_BYTES = 2 * 1024 ** 3
+
+# Exports are expected to be long; they still take a heavy-scan permit.
+EXPORT_TIMEOUT = 600.0
+
+FORMATS = {
+    "CSV": ("csv", "text/csv"),
+    "Parquet": ("parquet", "application/vnd.apache.parquet"),
+}
+
+
+def _chunks(query, connection, chunk_rows):
+    """Yield ``(columns, rows)`` chunks; an empty result yields one empty chunk."""
+    sql, params = db.as_statement(query)
+    cursor = connection.execute(sql, params)
+    columns = [desc[0] for desc in cursor.description]
+    rows = cursor.fetchmany(chunk_rows)
+    yield columns, rows
+    while rows:
+        rows = cursor.fetchmany(chunk_rows)
+        if rows:
+            yield columns, rows
+
+
+def _governed_chunks(query, chunk_rows, session):
+    with db.get_pool().connection() as connection:
+        with governor.govern(
+            connection, session=session, slot="export", heavy=True, timeout=EXPORT_TIMEOUT
+        ):
+            yield from _chunks(query, connection, chunk_rows)
+
+
+def iter_csv(query, chunk_rows=EXPORT_CHUNK_ROWS, session=None):
+    """Yield the result of ``query`` as UTF-8 CSV, one chunk of bytes at a time."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    header_written = False
+    for columns, rows in _governed_chunks(query, chunk_rows, session):
+        if not header_written:
+            writer.writerow(columns)
+            header_written = True
+        writer.writerows(rows)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def write_csv(query, f, chunk_rows=EXPORT_CHUNK_ROWS, session=None):
+    for chunk in iter_csv(query, chunk_rows, session):
+        f.write(chunk)
+
+
+# SQLite declared type (by affinity) or aggregate -> Arrow type name
+_DECLARED_TYPES = (("INT", "int64"), ("CHAR", "string"), ("CLOB", "string"), ("TEXT", "string"),
+                   ("REAL", "float64"), ("FLOA", "float64"), ("DOUB", "float64"))
+_AGGREGATE_TYPES = {"COUNT": "int64", "AVG": "float64", "SUM": "float64"}
+
+
+def _declared_type(declared):
+    declared = (declared or "").upper()
+    for marker, kind in _DECLARED_TYPES:
+        if marker in declared:
+            return kind
+    return None
+
+
+def column_types(query, connection):
+    """Arrow type name of each result column ``query`` declares, by column name.
+
+    Dataset columns take their declared SQLite type; aggregates take the
+    type of their function (MIN/MAX: of their column). Columns not covered
+    are left out.
+    """
+    declared = {
+        row[1]: _declared_type(row[2])
+        for row in connection.execute(f"PRAGMA table_info({schema.SOURCE_TABLE})")
+    }
+    types = {name: kind for name, kind in declared.items() if kind}
+    for func, column, alias in getattr(query, "_aggregates", ()):
+        kind = _AGGREGATE_TYPES.get(func) or declared.get(column.split(".")[-1])
+        if kind:
+            types[alias] = kind
+    return types
+
+
+def _fallback_type(values):
+    # Only for columns without a declared type: numbers as float64 so whole
+    # numbers in the first chunk do not truncate later fractions.
+    present = [value for value in values if value is not None]
+    if present and all(isinstance(value, (int, float)) for value in present):
+        return "float64"
+    return "string"
+
+
+def write_parquet(query, f, chunk_rows=EXPORT_CHUNK_ROWS, session=None):
+    """Write the result of ``query`` to ``f`` as Parquet, one row group per chunk."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    writer = None
+    with db.get_pool().connection() as connection:
+        types = column_types(query, connection)
+    try:
+        for columns, rows in _governed_chunks(query, chunk_rows, session):
+            values = list(zip(*rows)) or [() for _ in columns]
+            if writer is None:
+                arrow_schema = pa.schema([
+                    (name, pa.type_for_alias(types.get(name) or _fallback_type(column)))
+                    for name, column in zip(columns, values)
+                ])
+                writer = pq.ParquetWriter(f, arrow_schema)
+            batch = pa.RecordBatch.from_arrays(
+                [pa.array(column, type=field.type) for column, field in zip(values, writer.schema)],
+                schema=writer.schema,
+            )
+            writer.write_batch(batch)
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def cleanup(max_age=EXPORT_MAX_AGE, max_bytes=EXPORT_MAX_BYTES, now=None):
+    """Remove exports older than ``max_age`` seconds, then the oldest beyond ``max_bytes``."""
+    now = time.time() if now is None else now
+    try:
+        entries = sorted(
+            (entry for entry in os.scandir(EXPORT_DIR) if entry.is_file()),
+            key=lambda entry: entry.stat().st_mtime,
+            reverse=True,
+        )
+    except FileNotFoundError:
+        return
+    total = 0
+    for entry in entries:
+        stat = entry.stat()
+        total += stat.st_size
+        if now - stat.st_mtime > max_age or total > max_bytes:
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+
+
+def export_to_file(query, fmt="CSV", session=None):
+    """Write an export to a file under ``EXPORT_DIR`` and return its path."""
+    extension, _ = FORMATS[fmt]
+    cleanup()
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    # Random, unguessable names: the static directory is readable by URL.
+    path = os.path.join(EXPORT_DIR, f"{uuid.uuid4().hex}.{extension}")
+    try:
+        with open(path, "wb") as f:
+            if fmt == "Parquet":
+                write_parquet(query, f, session=session)
+            else:
+                write_csv(query, f, session=session)
+    except BaseException:
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+    return path
+
+
+def url(path):
+    """URL Streamlit serves the export at ``path`` from."""
+    return f"{EXPORT_URL}/{os.path.basename(path)}"
@@ -0,0 +1,147 @@
+"""Global admission-date range shared by every dashboard page.
+
+The sidebar control stores the chosen range in ``st.session_state`` under
+``SESSION_KEY``, which survives page switches, so a range picked on one
+page narrows all of them. Pages pass their queries through :func:`apply`,
+which adds an indexed ``Date_of_Admission`` range predicate (and lets
+sharded reads skip years outside the range); in-memory data from the
+snapshot or the cubes is narrowed with :func:`mask` instead.
+
+:func:`comparison_periods` adds the period-over-period toggle; the periods
+it returns are queried with :mod:`healthcare.compare`.
+"""
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from healthcare import compare, db
+from healthcare.query import Query
+from healthcare.schema import FACT_TABLE
+
+SESSION_KEY = "date_range"
+COMPARE_KEY = "compare_periods"
+DATE_COLUMN = "Date_of_Admission"
+
+# preset label -> months back from the latest admission (None: everything)
+PRESETS = {
+    "All time": None,
+    "Last quarter": 3,
+    "Last 12 months": 12,
+    "Custom range": "custom",
+}
+
+
+@st.cache_data(ttl=600)
+def _bounds(source):
+    # ``source`` is only the cache key: the live database and shard set.
+    bounds = db.read_query(
+        Query(FACT_TABLE).min(DATE_COLUMN, "first_day").max(DATE_COLUMN, "last_day")
+    )
+    first, last = bounds.iloc[0]
+    return pd.Timestamp(first).date(), pd.Timestamp(last).date()
+
+
+def data_bounds():
+    """First and last admission date of the live data."""
+    from healthcare import shards
+
+    return _bounds((db.current_database(), shards.version()))
+
+
+def current_range():
+    """The selected ``(start, end)`` dates, or None for all time."""
+    return st.session_state.get(SESSION_KEY)
+
+
+def date_range_filter():
+    """Sidebar control for the global date range; returns ``current_range()``."""
+    first, last = data_bounds()
+    presets = list(PRESETS)
+    chosen = st.session_state.get(f"{SESSION_KEY}_preset", presets[0])
+    preset = st.sidebar.selectbox(
+        "Admission dates:",
+        presets,
+        index=presets.index(chosen),
+        help="Applies to every page. Narrower ranges read only the matching rows.",
+    )
+    st.session_state[f"{SESSION_KEY}_preset"] = preset
+
+    months = PRESETS[preset]
+    if months is None:
+        selected = None
+    elif months == "custom":
+        start, end = current_range() or (first, last)
+        picked = st.sidebar.date_input(
+            "From / to:", value=(start, end), min_value=first, max_value=last
+        )
+        selected = tuple(picked) if len(picked) == 2 else (start, end)
+    else:
+        start = (pd.Timestamp(last) - pd.DateOffset(months=months) + pd.Timedelta(days=1)).date()
+        selected = (max(start, first), last)
+
+    st.session_state[SESSION_KEY] = selected
+    if selected is not None:
+        st.sidebar.caption(f"Showing admissions from {selected[0]:%b %d, %Y} to {selected[1]:%b %d, %Y}.")
+    return selected
+
+
+def comparison_periods():
+    """Sidebar toggle for comparison mode; ``(current, previous)`` periods, or None when off.
+
+    The current period is the global date range, or the last 12 months of
+    data when the range is "All time". A range the chosen mode cannot be
+    compared over (see :func:`compare.previous_period`) turns comparison
+    off with a warning.
+    """
+    enabled = st.sidebar.toggle(
+        "Compare with an earlier period",
+        value=st.session_state.get(f"{COMPARE_KEY}_enabled", False),
+    )
+    st.session_state[f"{COMPARE_KEY}_enabled"] = enabled
+    if not enabled:
+        return None
+
+    modes = list(compare.MODES)
+    chosen = st.session_state.get(f"{COMPARE_KEY}_mode", modes[0])
+    mode = st.sidebar.radio("Compare with:", modes, index=modes.index(chosen))
+    st.session_state[f"{COMPARE_KEY}_mode"] = mode
+
+    current = current_range()
+    if current is None:
+        first, last = data_bounds()
+        start = (pd.Timestamp(last) - pd.DateOffset(months=12) + pd.Timedelta(days=1)).date()
+        current = (max(start, first), last)
+    try:
+        previous = compare.previous_period(current, compare.MODES[mode])
+    except ValueError:
+        st.sidebar.warning(f"{mode} needs a date range of at most one year, so comparison is off.")
+        return None
+    st.sidebar.caption(f"Comparing {compare.describe(current, previous)}.")
+    return current, previous
+
+
+def apply(query, date_range=None):
+    """Narrow ``query`` to the selected range (``date_range`` overrides it)."""
+    date_range = date_range or current_range()
+    if date_range is None:
+        return query
+    return query.where_date_range(*date_range, column=DATE_COLUMN)
+
+
+def mask(dates, date_range=None):
+    """Boolean mask of ``dates`` inside the selected range (all true when unset)."""
+    date_range = date_range or current_range()
+    dates = np.asarray(dates, dtype="datetime64[D]")
+    if date_range is None:
+        return np.ones(len(dates), dtype=bool)
+    start, end = (np.datetime64(day, "D") for day in date_range)
+    return (dates >= start) & (dates <= end)
+
+
+def filter_frame(df, date_range=None, column=DATE_COLUMN):
+    """Rows of ``df`` whose ``column`` lies in the selected range."""
+    if (date_range or current_range()) is None:
+        return df
+    return df[mask(df[column], date_range)]
+
@@ -0,0 +1,219 @@
+"""Monthly revenue anomalies and short-horizon forecasts.
+
+Revenue is laid out as one dense matrix per level, a row per group
+(hospital, insurer, or the single "All" row) and a column per month, built
+with one ``np.bincount``. Everything after that operates on whole matrices,
+so ten thousand hospitals cost a few array passes, not ten thousand fits:
+
+* Anomalies: each month is compared with the median of the previous
+  ``WINDOW`` months, scaled by their median absolute deviation (MAD,
+  floored at ``MIN_SPREAD`` of the median). A robust score above
+  ``THRESHOLD`` flags the month. Months with too little history, or a
+  history of zeros, are never flagged.
+* Forecasts: Holt's linear exponential smoothing, stepped through time once
+  per candidate ``(alpha, beta)`` pair for all groups at once; each group
+  keeps the pair with the smallest one-step error. The band widens with the
+  horizon using the usual Holt error-variance formula.
+
+The first and last month are dropped when the data starts or ends part-way
+through them, so an export cut off mid-month does not look like a collapse
+in revenue.
+
+Results are stored as snapshot rollups, computed once per data version.
+"""
+
+import warnings
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from healthcare import snapshot as snapshots
+
+# level -> column revenue is split by (None: one series for all rows)
+LEVELS = {"total": None, "insurer": "Insurance_Provider", "hospital": "Hospital"}
+
+WINDOW = 12
+MIN_HISTORY = 6
+THRESHOLD = 3.5
+HORIZON = 6
+
+# MAD times this estimates the standard deviation of normal data.
+MAD_SCALE = 1.4826
+
+# Smallest spread assumed, as a share of the expected revenue, so a short
+# or unusually steady history does not turn ordinary noise into anomalies.
+MIN_SPREAD = 0.05
+
+# Two-sided 95% band.
+BAND_Z = 1.96
+
+SMOOTHING_GRID = (0.2, 0.4, 0.6, 0.8)
+TREND_GRID = (0.05, 0.15, 0.3)
+
+# Groups per chunk when computing rolling statistics, to bound memory.
+CHUNK_GROUPS = 4096
+
+
+def monthly_matrix(rows, by=None):
+    """Revenue per group and complete calendar month.
+
+    Returns ``(labels, months, revenue)`` with ``revenue[i, j]`` the
+    billing total of group ``labels[i]`` in ``months[j]``.
+    """
+    days = rows["Date_of_Admission"].to_numpy("datetime64[D]")
+    billing = rows["Billing_Amount"].to_numpy(dtype=float)
+    if by is None:
+        codes, labels = np.zeros(len(rows), dtype=np.int64), np.array(["All"])
+    else:
+        codes, labels = pd.factorize(rows[by], sort=True)
+        labels = np.asarray(labels, dtype=str)
+    keep = codes >= 0
+    if not keep.any():
+        return labels, np.array([], dtype="datetime64[M]"), np.zeros((len(labels), 0))
+    days, billing, codes = days[keep], billing[keep], codes[keep]
+
+    months = days.astype("datetime64[M]")
+    first, last = months.min(), months.max()
+    width = int((last - first).astype(int)) + 1
+    column = (months - first).astype(np.int64)
+    revenue = np.bincount(
+        codes * width + column, weights=billing, minlength=len(labels) * width
+    ).reshape(len(labels), width)
+    grid = np.arange(first, last + 1)
+
+    # Partial first or last month.
+    start = 1 if days.min() > first.astype("datetime64[D]") else 0
+    stop = width - 1 if (days.max() + 1).astype("datetime64[M]") == last else width
+    return labels, grid[start:stop], revenue[:, start:stop]
+
+
+def robust_scores(revenue, window=WINDOW, min_history=MIN_HISTORY):
+    """Rolling median of the previous ``window`` months and the robust score of each month."""
+    groups, width = revenue.shape
+    expected = np.full((groups, width), np.nan)
+    scores = np.full((groups, width), np.nan)
+    for start in range(0, groups, CHUNK_GROUPS):
+        block = revenue[start:start + CHUNK_GROUPS]
+        padded = np.concatenate([np.full((len(block), window), np.nan), block], axis=1)
+        # history[:, t] holds months t - window .. t - 1
+        history = sliding_window_view(padded, window, axis=1)[:, :width]
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)  # all-NaN windows at the start
+            median = np.nanmedian(history, axis=2)
+            mad = np.nanmedian(np.abs(history - median[..., None]), axis=2) * MAD_SCALE
+        mad = np.fmax(mad, MIN_SPREAD * np.abs(median))
+        enough = (~np.isnan(history)).sum(axis=2) >= min_history
+        valid = enough & (mad > 0)
+        expected[start:start + CHUNK_GROUPS] = np.where(enough, median, np.nan)
+        scores[start:start + CHUNK_GROUPS] = np.where(
+            valid, (block - median) / np.where(valid, mad, 1), np.nan
+        )
+    return expected, scores
+
+
+def holt(revenue, horizon=HORIZON):
+    """Holt forecasts for every row of ``revenue`` at once.
+
+    Returns ``(forecast, lower, upper)``, each ``groups x horizon``; rows
+    with fewer than three months are all NaN.
+    """
+    groups, width = revenue.shape
+    if width < 3:
+        empty = np.full((groups, horizon), np.nan)
+        return empty, empty, empty
+
+    best_error = np.full(groups, np.inf)
+    best = [np.zeros(groups) for _ in range(4)]  # level, trend, alpha, beta
+    for alpha in SMOOTHING_GRID:
+        for beta in TREND_GRID:
+            level, trend = revenue[:, 0].copy(), revenue[:, 1] - revenue[:, 0]
+            error = np.zeros(groups)
+            for t in range(1, width):
+                predicted = level + trend
+                error += (revenue[:, t] - predicted) ** 2
+                new_level = alpha * revenue[:, t] + (1 - alpha) * predicted
+                trend = beta * (new_level - level) + (1 - beta) * trend
+                level = new_level
+            better = error < best_error
+            best_error = np.where(better, error, best_error)
+            for i, value in enumerate((level, trend, alpha, beta)):
+                best[i] = np.where(better, value, best[i])
+
+    level, trend, alpha, beta = best
+    steps = np.arange(1, horizon + 1)
+    forecast = level[:, None] + steps * trend[:, None]
+    sigma = np.sqrt(best_error / (width - 1))
+    # Var(h) = sigma^2 * (1 + sum_{j<h} (alpha * (1 + j * beta))^2)
+    spread = (alpha[:, None] * (1 + steps[None, :-1] * beta[:, None])) ** 2
+    variance = 1 + np.concatenate([np.zeros((groups, 1)), np.cumsum(spread, axis=1)], axis=1)
+    band = BAND_Z * sigma[:, None] * np.sqrt(variance)
+    return forecast, forecast - band, forecast + band
+
+
+def analyze(rows, by=None):
+    """Long ``(history, forecast)`` frames for the groups of ``by``.
+
+    ``history`` has Revenue, Expected, Score and Anomaly per group and
+    month; ``forecast`` has Forecast, Lower and Upper for the next
+    ``HORIZON`` months.
+    """
+    labels, months, revenue = monthly_matrix(rows, by)
+    expected, scores = robust_scores(revenue)
+    predicted, lower, upper = holt(revenue)
+    name = by or "Group"
+
+    history = pd.DataFrame({
+        name: np.repeat(labels, len(months)),
+        "Month": np.tile(months.astype("datetime64[D]"), len(labels)),
+        "Revenue": revenue.ravel(),
+        "Expected": expected.ravel(),
+        "Score": scores.ravel(),
+    })
+    history["Anomaly"] = np.abs(history["Score"].to_numpy()) > THRESHOLD
+
+    ahead = np.arange(1, HORIZON + 1) + (months[-1] if len(months) else np.datetime64("today", "M"))
+    forecast = pd.DataFrame({
+        name: np.repeat(labels, HORIZON),
+        "Month": np.tile(ahead.astype("datetime64[D]"), len(labels)),
+        "Forecast": predicted.ravel(),
+        "Lower": lower.ravel(),
+        "Upper": upper.ravel(),
+    })
+    return history, forecast
+
+
+def _build(level, part):
+    # One pass publishes both parts, whichever is asked for first.
+    def build(snap):
+        by = LEVELS[level]
+        columns = ["Date_of_Admission", "Billing_Amount"] + ([by] if by else [])
+        history, forecast = analyze(snap.frame(columns), by)
+        parts = {"history": history, "forecast": forecast}
+        for name, df in parts.items():
+            if name != part:
+                snapshots.publish_rollup(snap, f"revenue.{level}.{name}", df)
+        return parts[part]
+
+    return build
+
+
+def history(level="total", database_path=None):
+    """Monthly revenue with its expected value and anomaly score (see :func:`analyze`)."""
+    snap = snapshots.current(database_path)
+    return snap.rollup(f"revenue.{level}.history", build=_build(level, "history"))
+
+
+def forecast(level="total", database_path=None):
+    """Forecast and 95% band for the next ``HORIZON`` months."""
+    snap = snapshots.current(database_path)
+    return snap.rollup(f"revenue.{level}.forecast", build=_build(level, "forecast"))
+
+
+def anomalies(level="total", limit=None, database_path=None):
+    """Flagged months, strongest deviation first."""
+    flagged = history(level, database_path)
+    flagged = flagged[flagged["Anomaly"]]
+    order = np.argsort(-np.abs(flagged["Score"].to_numpy()), kind="stable")
+    flagged = flagged.iloc[order].reset_index(drop=True)
+    return flagged if limit is None else flagged.head(limit)
@@ -0,0 +1,144 @@
+"""Query governor: cancellation, time budgets and admission control.
+
+Streamlit starts a fresh rerun whenever a widget changes, but a statement
+the previous run started keeps stepping inside SQLite until it finishes.
+The governor tracks the running statement for each (session, slot) pair
+and interrupts it as soon as the same slot issues a newer query. Every
+governed statement also has a time budget, and statements marked ``heavy``
+(full-table scans) must take one of a fixed number of permits before they
+start, so bursts queue briefly and then fail fast instead of occupying
+every core.
+
+Interruption goes through ``set_progress_handler``: SQLite calls the
+handler every ``PROGRESS_STEPS`` virtual-machine instructions and aborts
+the statement as soon as it returns true.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+# Seconds a governed statement may run before it is interrupted.
+QUERY_TIMEOUT = 15.0
+
+# Heavy scans allowed to run at once across all sessions of this process;
+# one core is always left free for the Streamlit server itself.
+MAX_HEAVY_QUERIES = max(2, (os.cpu_count() or 2) - 1)
+
+# Seconds a heavy scan waits for a permit before it is rejected.
+QUEUE_TIMEOUT = 5.0
+
+# SQLite VM instructions between progress-handler calls.
+PROGRESS_STEPS = 10_000
+
+
+class GovernorError(Exception):
+    """A governed query did not run to completion."""
+
+
+class QuerySuperseded(GovernorError):
+    """A newer query from the same session and slot replaced this one."""
+
+
+class QueryTimeout(GovernorError):
+    """The query ran past its time budget."""
+
+
+class QueryRejected(GovernorError):
+    """Too many heavy queries were already running."""
+
+
+def current_session():
+    """Streamlit session id of the calling thread, or None outside Streamlit."""
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+    except ImportError:
+        return None
+    ctx = get_script_run_ctx(suppress_warning=True)
+    return ctx.session_id if ctx is not None else None
+
+
+class _Ticket:
+    def __init__(self, timeout):
+        self.deadline = time.monotonic() + timeout
+        self.superseded = False
+
+    def expired(self):
+        return time.monotonic() > self.deadline
+
+    def should_abort(self):
+        # Called by SQLite from inside sqlite3_step(); non-zero aborts.
+        return 1 if self.superseded or self.expired() else 0
+
+    def error(self):
+        if self.superseded:
+            return QuerySuperseded("Query replaced by a newer request.")
+        return QueryTimeout("Query took too long and was stopped. Try narrowing the filters.")
+
+
+class Governor:
+    def __init__(
+        self,
+        max_heavy=MAX_HEAVY_QUERIES,
+        timeout=QUERY_TIMEOUT,
+        queue_timeout=QUEUE_TIMEOUT,
+    ):
+        self.timeout = timeout
+        self.queue_timeout = queue_timeout
+        self._heavy = threading.BoundedSemaphore(max_heavy)
+        self._lock = threading.Lock()
+        self._running = {}
+
+    def _wait_for_permit(self, ticket):
+        """Wait for a heavy-scan permit, giving up early if superseded."""
+        waited_until = time.monotonic() + self.queue_timeout
+        while not self._heavy.acquire(timeout=0.1):
+            if ticket.superseded:
+                raise ticket.error()
+            if time.monotonic() > waited_until:
+                raise QueryRejected(
+                    "The dashboard is busy with other large queries. Please try again shortly."
+                )
+
+    @contextmanager
+    def govern(self, connection, session=None, slot=None, heavy=False, timeout=None):
+        """Run the body's statements on ``connection`` under governance.
+
+        ``slot`` names the widget or chart issuing the query; a new query
+        in the same ``(session, slot)`` interrupts the one still running.
+        """
+        ticket = _Ticket(self.timeout if timeout is None else timeout)
+        key = (session, slot) if slot is not None else None
+        if key is not None:
+            with self._lock:
+                previous = self._running.get(key)
+                self._running[key] = ticket
+            if previous is not None:
+                previous.superseded = True
+
+        permit = False
+        try:
+            if heavy:
+                self._wait_for_permit(ticket)
+                permit = True
+            connection.set_progress_handler(ticket.should_abort, PROGRESS_STEPS)
+            try:
+                yield
+            except sqlite3.OperationalError as error:
+                if ticket.superseded or ticket.expired():
+                    raise ticket.error() from error
+                raise
+            finally:
+                connection.set_progress_handler(None, 0)
+        finally:
+            if permit:
+                self._heavy.release()
+            if key is not None:
+                with self._lock:
+                    if self._running.get(key) is ticket:
+                        del self._running[key]
+
+
+governor = Governor()
@@ -0,0 +1,29 @@
+"""Migrate a database holding the flat table to the star schema.
+
+    python -m healthcare.normalize [healthcare_database.db]
+
+Runs the same steps as re-deriving a database with :mod:`healthcare.pipeline`:
+rows failing the :mod:`healthcare.validation` rules are moved to the
+quarantine, and the derived columns the pages query (age band, stay length,
+admission year/month) are added, so a migrated database can be served as
+is. Kept apart from :mod:`healthcare.schema`, which the package imports on
+load and so cannot itself be run with ``-m``.
+"""
+
+import sqlite3
+import sys
+
+from healthcare import pipeline, validation
+from healthcare.db import DATABASE_PATH
+from healthcare.schema import DIMENSIONS, FACT_TABLE
+
+if __name__ == "__main__":
+    database_path = sys.argv[1] if len(sys.argv) > 1 else DATABASE_PATH
+    pipeline.rederive(database_path)
+    with sqlite3.connect(database_path) as conn:
+        quarantined = conn.execute(f"SELECT COUNT(*) FROM {validation.QUARANTINE_TABLE}").fetchone()[0]
+    conn.close()
+    print(
+        f"{database_path}: normalized into {FACT_TABLE} + {len(DIMENSIONS)} dimensions, "
+        f"derived columns added; rows in quarantine: {quarantined}"
+    )
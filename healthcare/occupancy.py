@@ -0,0 +1,145 @@
+"""Bed census and room occupancy from admission and discharge dates.
+
+Each admission occupies its room from ``Date_of_Admission`` up to, but not
+including, ``Discharge_Date`` (the midnight-census convention), falling
+back to ``Date_of_Admission + Total_Days_of_Stay`` when the discharge date
+is missing. The census is computed with a sweep line: every stay becomes a
++1 event on its first day and a -1 event on its discharge day, the events
+are sorted by (group, day) and a single cumulative sum gives the number of
+occupied rooms after every change point. No per-day loop is involved.
+
+The change points are a compact step-function time series, stored as
+snapshot rollups per data version; :func:`daily_census` expands them onto
+a daily grid for any date range with one ``searchsorted``.
+"""
+
+import numpy as np
+import pandas as pd
+
+from healthcare import snapshot as snapshots
+
+# Change-point series kept per data version: name -> grouping columns.
+LEVELS = {
+    "total": [],
+    "hospital": ["Hospital"],
+    "room": ["Hospital", "Room_Number"],
+}
+
+
+def stays(df):
+    """First and last-plus-one occupied day of each stay as ``datetime64[D]``."""
+    starts = pd.to_datetime(df["Date_of_Admission"]).to_numpy("datetime64[D]")
+    ends = pd.to_datetime(df["Discharge_Date"]).to_numpy("datetime64[D]")
+    if "Total_Days_of_Stay" in df:
+        missing = np.isnat(ends)
+        days = np.nan_to_num(df["Total_Days_of_Stay"].to_numpy(dtype=np.float64)).astype(np.int64)
+        ends = np.where(missing, starts + days.astype("timedelta64[D]"), ends)
+    return starts, ends
+
+
+def sweep(groups, starts, ends):
+    """Change points of the number of open ``[start, end)`` intervals per group.
+
+    Returns ``(groups, days, levels)`` sorted by group then day, where
+    ``levels[i]`` is the count from ``days[i]`` until the group's next
+    change point. Intervals with a missing or non-positive length are
+    ignored.
+    """
+    valid = ~(np.isnat(starts) | np.isnat(ends)) & (ends > starts)
+    groups, starts, ends = groups[valid], starts[valid], ends[valid]
+    count = len(starts)
+
+    group = np.concatenate([groups, groups])
+    day = np.concatenate([starts, ends]).astype(np.int64)
+    delta = np.concatenate([np.ones(count, np.int64), -np.ones(count, np.int64)])
+    order = np.lexsort((day, group))
+    group, day, delta = group[order], day[order], delta[order]
+
+    # Merge events that share a group and a day.
+    first = np.ones(len(day), dtype=bool)
+    first[1:] = (group[1:] != group[:-1]) | (day[1:] != day[:-1])
+    starts_at = np.flatnonzero(first)
+    delta = np.add.reduceat(delta, starts_at) if len(starts_at) else delta
+    group, day = group[starts_at], day[starts_at]
+
+    # Every group opens and closes the same number of stays, so the running
+    # total is back at zero at each group boundary and one cumsum suffices.
+    level = np.cumsum(delta)
+    changed = delta != 0
+    return group[changed], day[changed].astype("datetime64[D]"), level[changed]
+
+
+def change_points(df, by=()):
+    """Occupancy change points for each combination of the ``by`` columns."""
+    by = list(by)
+    starts, ends = stays(df)
+    if by:
+        grouped = df.groupby(by, sort=True, observed=True, dropna=False)
+        codes = grouped.ngroup().to_numpy()
+        labels = grouped.size().index.to_frame(index=False)
+    else:
+        codes = np.zeros(len(df), dtype=np.int64)
+    group, day, level = sweep(np.asarray(codes, dtype=np.int64), starts, ends)
+
+    points = {}
+    if by:
+        for column in by:
+            points[column] = labels[column].to_numpy()[group]
+    points["Date"] = day
+    points["Occupied"] = level
+    return pd.DataFrame(points)
+
+
+def _build(level):
+    def build(snap):
+        columns = ["Date_of_Admission", "Discharge_Date", "Total_Days_of_Stay"] + LEVELS[level]
+        return change_points(snap.frame(columns), LEVELS[level])
+
+    return build
+
+
+def series(level="total", database_path=None):
+    """Stored change points for ``level`` (see ``LEVELS``) of the live data."""
+    snap = snapshots.current(database_path)
+    return snap.rollup(f"occupancy.{level}", build=_build(level))
+
+
+def daily_census(points, start=None, end=None):
+    """Expand a single group's change points to one row per day.
+
+    ``points`` is the output of :func:`series` filtered to one group (or the
+    ``total`` level). ``start`` and ``end`` default to the series' range.
+    """
+    days = pd.to_datetime(points["Date"]).to_numpy("datetime64[D]")
+    levels = np.asarray(points["Occupied"])
+    order = np.argsort(days, kind="stable")
+    days, levels = days[order], levels[order]
+    if start is None:
+        start = days[0] if len(days) else np.datetime64("today", "D")
+    if end is None:
+        end = days[-1] if len(days) else start
+    grid = np.arange(np.datetime64(start, "D"), np.datetime64(end, "D") + 1)
+    position = np.searchsorted(days, grid, side="right") - 1
+    occupied = np.where(position >= 0, levels[np.maximum(position, 0)], 0)
+    return pd.DataFrame({"Date": grid, "Occupied": occupied})
+
+
+def double_bookings(points, start=None, end=None):
+    """Periods in which a room holds more than one patient.
+
+    ``points`` is the ``room`` level series; returns one row per period
+    with its first day, the day it ended and the number of patients.
+    With ``start`` and/or ``end`` only periods overlapping those days are kept.
+    """
+    points = points.sort_values(["Hospital", "Room_Number", "Date"], kind="stable")
+    keys = points[["Hospital", "Room_Number"]]
+    same_room = (keys.shift(-1) == keys).all(axis=1).to_numpy()
+    until = points["Date"].shift(-1).where(same_room)
+    booked = points.assign(Until=until)
+    keep = booked["Occupied"] > 1
+    if start is not None:
+        # ``Until`` is the first day after the period; open periods have none.
+        keep &= booked["Until"].isna() | (booked["Until"] > pd.Timestamp(start))
+    if end is not None:
+        keep &= booked["Date"] <= pd.Timestamp(end)
+    return booked[keep].reset_index(drop=True)
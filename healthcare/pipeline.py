@@ -0,0 +1,150 @@
+"""Load the cleaned CSV into SQLite, deriving the per-row features once.
+
+The pages group and filter on age bands, stay length and admission
+year/month instead of formatting dates inside every query, so those values
+are computed here, vectorized over whole columns, and stored as typed,
+indexed columns of the fact table. Rows are validated first (see
+:mod:`healthcare.validation`); rejected rows go to the quarantine table.
+
+Usage::
+
+    python -m healthcare.pipeline --csv Clean_Healthcare_Dataset.csv
+    python -m healthcare.pipeline            # re-derive an existing database
+"""
+
+import argparse
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+from healthcare import schema, validation
+from healthcare.db import DATABASE_PATH
+
+# Lower bound (inclusive) of each age band and its label.
+AGE_BANDS = [(0, "0-17"), (18, "18-34"), (35, "35-49"), (50, "50-64"), (65, "65+")]
+
+# name -> SQLite type of every column produced by derive_features()
+DERIVED_COLUMNS = {
+    "Age_Group": "TEXT",
+    "Total_Days_of_Stay": "INTEGER",
+    "Admission_Year": "INTEGER",
+    "Admission_Month": "INTEGER",
+    "Admission_Weekday": "INTEGER",
+    "Admission_Month_Name": "TEXT",
+    "Admission_Period": "TEXT",
+}
+
+DERIVED_INDEXES = [
+    ("Date_of_Admission",),
+    ("Admission_Period",),
+    ("Admission_Year", "Admission_Month"),
+    ("Age_Group",),
+]
+
+
+def age_band(ages):
+    """Label of the ``AGE_BANDS`` entry each age falls into."""
+    edges = np.array([lower for lower, _ in AGE_BANDS])
+    labels = np.array([label for _, label in AGE_BANDS])
+    band = np.searchsorted(edges, np.asarray(ages), side="right") - 1
+    return labels[np.clip(band, 0, None)]
+
+
+def derive_features(df):
+    """Return the derived columns for ``df`` as a new DataFrame.
+
+    Needs ``Age``, ``Date_of_Admission`` and ``Discharge_Date``.
+    """
+    admitted = pd.to_datetime(df["Date_of_Admission"])
+    discharged = pd.to_datetime(df["Discharge_Date"])
+
+    month_names = np.array(pd.date_range("2000-01-01", periods=12, freq="MS").strftime("%B"))
+    month = admitted.dt.month.to_numpy()
+
+    return pd.DataFrame(
+        {
+            "Age_Group": age_band(df["Age"].to_numpy(dtype=np.int64)),
+            "Total_Days_of_Stay": (discharged - admitted).dt.days.to_numpy(),
+            "Admission_Year": admitted.dt.year.to_numpy(),
+            "Admission_Month": month,
+            "Admission_Weekday": admitted.dt.weekday.to_numpy(),
+            "Admission_Month_Name": month_names[month - 1],
+            "Admission_Period": admitted.dt.to_period("M").astype(str).to_numpy(),
+        },
+        index=df.index,
+    )
+
+
+def create_derived_indexes(connection):
+    with connection:
+        for columns in DERIVED_INDEXES:
+            name = "_".join(column.lower() for column in columns)
+            connection.execute(
+                f"CREATE INDEX IF NOT EXISTS idx_{schema.FACT_TABLE}_{name} "
+                f"ON {schema.FACT_TABLE} ({', '.join(columns)})"
+            )
+
+
+def build_database(csv_path, database_path=DATABASE_PATH):
+    """Create ``database_path`` from the cleaned CSV."""
+    df = pd.read_csv(csv_path)
+    df = df.drop(columns=[column for column in DERIVED_COLUMNS if column in df])
+    df, quarantined = validation.validate(df)
+    df = pd.concat([df, derive_features(df)], axis=1)
+
+    with sqlite3.connect(database_path) as connection:
+        df.to_sql(
+            schema.SOURCE_TABLE,
+            connection,
+            if_exists="replace",
+            index=False,
+            dtype=DERIVED_COLUMNS,
+        )
+        schema.normalize(connection)
+        validation.write_quarantine(connection, quarantined)
+        create_derived_indexes(connection)
+        schema.stamp_version(connection)
+    connection.close()
+
+
+def add_derived_columns(connection):
+    """(Re)compute the derived columns of a normalized database in place."""
+    fact = schema.FACT_TABLE
+    existing = {row[1] for row in connection.execute(f"PRAGMA table_info({fact})")}
+    source = pd.read_sql_query(
+        f"SELECT id, Age, Date_of_Admission, Discharge_Date FROM {fact}", connection
+    )
+    derived = derive_features(source)
+
+    with connection:
+        for column, declared_type in DERIVED_COLUMNS.items():
+            if column not in existing:
+                connection.execute(f"ALTER TABLE {fact} ADD COLUMN {column} {declared_type}")
+        assignments = ", ".join(f"{column} = ?" for column in DERIVED_COLUMNS)
+        rows = derived.assign(id=source["id"]).itertuples(index=False, name=None)
+        connection.executemany(f"UPDATE {fact} SET {assignments} WHERE id = ?", rows)
+
+    schema.create_compat_view(connection, schema.flat_columns(connection))
+    create_derived_indexes(connection)
+
+
+def rederive(database_path=DATABASE_PATH):
+    """Validate an existing database and recompute its derived columns in place."""
+    with sqlite3.connect(database_path) as connection:
+        schema.normalize(connection)
+        validation.quarantine_existing(connection)
+        add_derived_columns(connection)
+        schema.stamp_version(connection)
+    connection.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--csv", help="cleaned CSV to load; omit to re-derive in place")
+    parser.add_argument("--database", default=DATABASE_PATH)
+    args = parser.parse_args()
+    if args.csv:
+        build_database(args.csv, args.database)
+    else:
+        rederive(args.database)
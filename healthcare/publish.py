@@ -0,0 +1,150 @@
+"""Versioned publishing so loads never block or tear dashboard reads.
+
+Each load is written to a brand-new database file under
+``data/versions/``. Indexes, the data version stamp, the columnar
+snapshot, its adjacency graphs and (in a sharded deployment) the shards
+are all built there while the dashboard keeps reading the previous
+version. Only then is ``data/CURRENT`` replaced (write to a temp file plus
+``os.replace``, which is atomic), and each page picks up the new version on
+its next query. Old versions stay on disk until :func:`retire` removes them,
+so queries already running on them finish normally.
+
+Usage::
+
+    python -m healthcare.publish --csv Clean_Healthcare_Dataset.csv
+    python -m healthcare.publish --from healthcare_database.db
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import warnings
+
+from healthcare import adjacency, db, pipeline, schema, shards, snapshot
+
+VERSIONS_DIR = os.path.join(db.DATA_ROOT, "versions")
+
+
+def _staging_path():
+    os.makedirs(VERSIONS_DIR, exist_ok=True)
+    fd, path = tempfile.mkstemp(prefix=".staging-", suffix=".db", dir=VERSIONS_DIR)
+    os.close(fd)
+    os.remove(path)
+    return path
+
+
+def _go_live(staging):
+    """Name the staged file after its version, then switch the pointer."""
+    with sqlite3.connect(staging) as connection:
+        version = schema.read_version(connection)
+    connection.close()
+    filename = f"{version}.db"
+    final = os.path.join(VERSIONS_DIR, filename)
+    if os.path.abspath(final) == os.path.abspath(db.current_database()):
+        raise ValueError(f"version {version} is already live")
+    os.replace(staging, final)
+    snapshot_dir = os.path.join(snapshot.SNAPSHOT_ROOT, version)
+    sharded = shards.stored_manifest()
+
+    try:
+        # Build the snapshot before going live so the first reader finds it ready.
+        snapshot.publish(final)
+        try:
+            adjacency.publish(snapshot.Snapshot(snapshot_dir))
+        except Exception as error:
+            # Optional: the graphs are built on first use instead.
+            warnings.warn(f"adjacency graphs not built at publish time: {error}", RuntimeWarning)
+
+        # A sharded deployment gets shards of the new version, split the same way.
+        # Until the pointer moves, the new manifest does not match the live
+        # version and queries keep using the previous consolidated database.
+        if sharded is not None:
+            shards.build(final, by=sharded["by"], count=sharded.get("groups", sharded["count"]))
+
+        fd, pointer = tempfile.mkstemp(prefix=".CURRENT-", dir=db.DATA_ROOT)
+        with os.fdopen(fd, "w") as f:
+            f.write(os.path.join("versions", filename))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(pointer, db.POINTER_FILE)
+    except BaseException:
+        # Nothing points at this version yet: remove what was built for it.
+        if sharded is not None and shards.stored_manifest() != sharded:
+            _restore_manifest(sharded)
+        shutil.rmtree(snapshot_dir, ignore_errors=True)
+        if os.path.exists(final):
+            os.remove(final)
+        raise
+    return version
+
+
+def _restore_manifest(manifest):
+    staging = f"{shards.SHARD_MANIFEST}.restore"
+    with open(staging, "w") as f:
+        json.dump(manifest, f, indent=2, default=str)
+    os.replace(staging, shards.SHARD_MANIFEST)
+
+
+def publish_csv(csv_path):
+    """Load a cleaned CSV as a new version and make it live."""
+    staging = _staging_path()
+    try:
+        pipeline.build_database(csv_path, staging)
+        return _go_live(staging)
+    finally:
+        if os.path.exists(staging):
+            os.remove(staging)
+
+
+def publish_copy(database_path):
+    """Publish a copy of an existing database (normalized and re-derived)."""
+    staging = _staging_path()
+    try:
+        source = sqlite3.connect(database_path)
+        target = sqlite3.connect(staging)
+        source.backup(target)
+        source.close()
+        target.close()
+        pipeline.rederive(staging)
+        return _go_live(staging)
+    finally:
+        if os.path.exists(staging):
+            os.remove(staging)
+
+
+def retire(keep=2):
+    """Delete all but the newest ``keep`` versions; the live one is always kept."""
+    live = os.path.basename(db.current_database())
+    versions = sorted(
+        (entry for entry in os.scandir(VERSIONS_DIR) if entry.name.endswith(".db")
+         and not entry.name.startswith(".")),
+        key=lambda entry: entry.stat().st_mtime,
+        reverse=True,
+    )
+    for entry in versions[keep:]:
+        if entry.name != live:
+            os.remove(entry.path)
+            version = entry.name[: -len(".db")]
+            shutil.rmtree(os.path.join(snapshot.SNAPSHOT_ROOT, version), ignore_errors=True)
+
+    # Shard sets other than the current one are no longer read.
+    sharded = shards.stored_manifest()
+    if sharded is not None and os.path.isdir(shards.SHARD_DIR):
+        for entry in os.scandir(shards.SHARD_DIR):
+            if entry.is_dir() and entry.name != sharded["version"]:
+                shutil.rmtree(entry.path, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--csv", help="cleaned CSV to load")
+    source.add_argument("--from", dest="database", help="existing database to publish")
+    parser.add_argument("--keep", type=int, default=2, help="versions to keep on disk")
+    args = parser.parse_args()
+    version = publish_csv(args.csv) if args.csv else publish_copy(args.database)
+    retire(args.keep)
+    print(f"version {version} is live")
@@ -0,0 +1,217 @@
+"""Composable SELECT builder used by every dashboard page.
+
+Every value a user can influence (search text, selected hospital, row limit)
+is emitted as a ``?`` placeholder, so the SQL text for a given page stays
+identical across reruns and SQLite can reuse the prepared statement.
+"""
+
+from healthcare.schema import DIMENSIONS, FACT_TABLE
+
+DEFAULT_TABLE = "Healthcare_Dataset"
+
+# Appended to every LIKE, so typed % and _ are matched literally (see escape_like).
+LIKE_ESCAPE = "ESCAPE '\\'"
+
+
+def escape_like(text):
+    """``text`` with the LIKE wildcards ``%`` and ``_`` escaped for ``LIKE_ESCAPE``."""
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+class Query:
+    """Build a parameterized ``SELECT`` statement step by step.
+
+    Each method returns the query itself so calls can be chained::
+
+        Query().select("Hospital").sum("Billing_Amount", "Total_Revenue") \\
+            .group_by("Hospital").order_by("Total_Revenue DESC").limit(100)
+    """
+
+    def __init__(self, table=DEFAULT_TABLE):
+        self.table = table
+        self._distinct = False
+        self._columns = []
+        self._select_params = []
+        self._joins = []
+        self._aggregates = []
+        self._where = []
+        self._params = []
+        self._group_by = []
+        self._order_by = []
+        self._limit = None
+        self._date_range = None
+
+    # Columns ---------------------------------------------------------------
+    def select(self, *columns):
+        self._columns.extend(columns)
+        return self
+
+    def select_expression(self, expression, alias, *params):
+        """Add ``expression AS alias``; values must be passed as ``?`` params."""
+        self._columns.append(f"{expression} AS {alias}")
+        self._select_params.extend(params)
+        return self
+
+    def distinct(self):
+        self._distinct = True
+        return self
+
+    def aggregate(self, func, column, alias):
+        """Add ``func(column) AS alias`` to the select list."""
+        self._aggregates.append((func.upper(), column, alias))
+        return self
+
+    def sum(self, column, alias):
+        return self.aggregate("SUM", column, alias)
+
+    def avg(self, column, alias):
+        return self.aggregate("AVG", column, alias)
+
+    def min(self, column, alias):
+        return self.aggregate("MIN", column, alias)
+
+    def max(self, column, alias):
+        return self.aggregate("MAX", column, alias)
+
+    def count(self, alias, column="*", distinct=False):
+        return self.aggregate("COUNT", f"DISTINCT {column}" if distinct else column, alias)
+
+    # Star schema -----------------------------------------------------------
+    def join_dimension(self, column):
+        """Join the dimension table holding ``column`` (e.g. ``"Hospital"``)."""
+        table, key = DIMENSIONS[column]
+        join = f"JOIN {table} ON {table}.id = {FACT_TABLE}.{key}"
+        if join not in self._joins:
+            self._joins.append(join)
+        return self
+
+    def group_by_dimension(self, *columns):
+        """Group on the integer keys and select the names back as ``columns``.
+
+        Only valid on queries over :data:`~healthcare.schema.FACT_TABLE`.
+        """
+        for column in columns:
+            table, key = DIMENSIONS[column]
+            self.join_dimension(column)
+            self._columns.append(f"{table}.name AS {column}")
+            self._group_by.append(f"{FACT_TABLE}.{key}")
+        return self
+
+    def where_dimension_eq(self, column, name):
+        """Filter the fact table to one dimension member, resolved by name."""
+        table, key = DIMENSIONS[column]
+        return self.where(f"{FACT_TABLE}.{key} = (SELECT id FROM {table} WHERE name = ?)", name)
+
+    def where_dimension_like(self, column, text):
+        """Substring match on dimension names; only the dimension is scanned."""
+        if text:
+            table, key = DIMENSIONS[column]
+            self.where(
+                f"{FACT_TABLE}.{key} IN (SELECT id FROM {table} WHERE name LIKE ? {LIKE_ESCAPE})",
+                f"%{escape_like(text)}%",
+            )
+        return self
+
+    # Filters ---------------------------------------------------------------
+    def where(self, clause, *params):
+        """Add a raw predicate; values must be passed as ``?`` params."""
+        self._where.append(clause)
+        self._params.extend(params)
+        return self
+
+    def where_eq(self, column, value):
+        return self.where(f"{column} = ?", value)
+
+    def where_in(self, column, values):
+        """Filter on a list of values; an empty selection adds no filter."""
+        values = list(values)
+        if values:
+            placeholders = ", ".join(["?"] * len(values))
+            self.where(f"{column} IN ({placeholders})", *values)
+        return self
+
+    def where_like(self, column, text):
+        """Case-insensitive substring match; blank text adds no filter."""
+        if text:
+            self.where(f"{column} LIKE ? {LIKE_ESCAPE}", f"%{escape_like(text)}%")
+        return self
+
+    def where_any_like(self, columns, text):
+        """Substring match against any of ``columns`` (OR-ed together)."""
+        if text:
+            clause = " OR ".join(f"{column} LIKE ? {LIKE_ESCAPE}" for column in columns)
+            self.where(f"({clause})", *[f"%{escape_like(text)}%"] * len(columns))
+        return self
+
+    def where_date_range(self, start=None, end=None, column="Date_of_Admission"):
+        """Rows dated from ``start`` through ``end`` (inclusive); None leaves a side open.
+
+        Dates are stored as ISO ``YYYY-MM-DD`` text, so the comparison can
+        use the date index. The range is also kept on the query so sharded
+        reads only visit the shards that can hold matching rows.
+        """
+        if start is not None:
+            self.where(f"{column} >= ?", str(start))
+        if end is not None:
+            self.where(f"{column} <= ?", str(end))
+        if start is not None or end is not None:
+            self._date_range = (start, end)
+        return self
+
+    # Grouping, ordering and limits -----------------------------------------
+    def group_by(self, *columns):
+        self._group_by.extend(columns)
+        return self
+
+    def order_by(self, *columns):
+        self._order_by.extend(columns)
+        return self
+
+    def without_order(self):
+        """Drop every ORDER BY, e.g. when the rows are regrouped or reordered later."""
+        self._order_by = []
+        return self
+
+    def limit(self, n):
+        self._limit = None if n is None else int(n)
+        return self
+
+    def is_aggregate(self):
+        """True if the query groups or aggregates rather than listing them."""
+        return bool(self._aggregates or self._group_by)
+
+    # Rendering -------------------------------------------------------------
+    def select_list(self):
+        columns = list(self._columns)
+        columns += [f"{func}({column}) AS {alias}" for func, column, alias in self._aggregates]
+        return columns or ["*"]
+
+    def build(self):
+        """Return ``(sql, params)`` ready for ``cursor.execute``."""
+        keyword = "SELECT DISTINCT" if self._distinct else "SELECT"
+        sql = [f"{keyword} {', '.join(self.select_list())}", f"FROM {self.table}"]
+        sql += self._joins
+        params = list(self._select_params) + list(self._params)
+        if self._where:
+            sql.append("WHERE " + " AND ".join(self._where))
+        if self._group_by:
+            sql.append("GROUP BY " + ", ".join(self._group_by))
+        if self._order_by:
+            sql.append("ORDER BY " + ", ".join(self._order_by))
+        if self._limit is not None:
+            sql.append("LIMIT ?")
+            params.append(self._limit)
+        return "\n".join(sql), tuple(params)
+
+    def copy(self):
+        """Independent copy, e.g. to drop the display limit for an export."""
+        clone = Query(self.table)
+        clone.__dict__.update({
+            name: list(value) if isinstance(value, list) else value
+            for name, value in self.__dict__.items()
+        })
+        return clone
+
+    def __repr__(self):
+        sql, params = self.build()
+        return f"Query({sql!r}, params={params!r})"
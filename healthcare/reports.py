@@ -0,0 +1,192 @@
+"""Static per-hospital reports, rendered in bulk.
+
+Each report holds the Demographics page's age-group pies by admission type
+and the Admissions page's average-stay metrics for one hospital. The data
+for every hospital comes from two grouped queries over the whole fact
+table (the page aggregates, grouped by hospital instead of filtered to
+one), split in memory; no per-hospital query is run.
+
+Hospitals are rendered in batches of ``BATCH_HOSPITALS`` across a process
+pool, each batch writing ``<name>.html`` and/or ``<name>.png`` per
+hospital. Reports go to ``REPORT_DIR/<data version>/`` and every finished
+hospital is appended to ``progress.log`` there, so an interrupted run
+picks up where it stopped when started again for the same data.
+
+Usage::
+
+    python -m healthcare.reports                       # every hospital
+    python -m healthcare.reports --hospital "Smith LLC" --formats png
+    python -m healthcare.reports --start 2023-01-01 --end 2023-12-31
+"""
+
+import argparse
+import base64
+import html
+import io
+import multiprocessing
+import os
+import re
+import zlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from healthcare import aggregates, db, snapshot, validation
+
+REPORT_DIR = "reports"
+PROGRESS_LOG = "progress.log"
+FORMATS = ("html", "png")
+
+# Hospitals rendered per task; large enough to amortize process overhead.
+BATCH_HOSPITALS = 200
+
+
+def file_stem(hospital):
+    """File name for a hospital: readable, filesystem-safe and unique."""
+    readable = re.sub(r"[^A-Za-z0-9]+", "_", hospital).strip("_")[:60] or "hospital"
+    return f"{readable}-{zlib.crc32(hospital.encode()):08x}"
+
+
+def collect(hospitals=None, date_range=None):
+    """Report data for every hospital (or only ``hospitals``) from two grouped scans.
+
+    Returns ``{hospital: (age_groups, stays)}``.
+    """
+    queries = {
+        "ages": aggregates.age_groups_by_hospital(),
+        "stays": aggregates.average_stay_by_hospital(),
+    }
+    if date_range is not None:
+        queries = {name: query.where_date_range(*date_range) for name, query in queries.items()}
+    results = db.read_many(queries, heavy=True)
+    ages, stays = results["ages"], results["stays"]
+    if hospitals is not None:
+        wanted = set(hospitals)
+        ages, stays = ages[ages["Hospital"].isin(wanted)], stays[stays["Hospital"].isin(wanted)]
+
+    stays = stays.sort_values("Avg_Stay", ascending=False, kind="stable")
+    stays_by_hospital = dict(tuple(stays.groupby("Hospital", sort=False)))
+    empty_stays = stays.iloc[:0]
+    reports = {}
+    for hospital, group in ages.groupby("Hospital", sort=True):
+        hospital_stays = stays_by_hospital.get(hospital, empty_stays)
+        reports[hospital] = (group.drop(columns="Hospital"), hospital_stays.drop(columns="Hospital"))
+    return reports
+
+
+def _summary(ages):
+    """Most common age group per admission type, as on the Demographics page."""
+    top = ages.loc[ages.groupby("Admission_Type")["admission_count"].idxmax()]
+    return top.rename(columns={
+        "Admission_Type": "Admission Type",
+        "Age_Group": "Most Common Age Group",
+        "admission_count": "Admission Count",
+    })
+
+
+def _html(hospital, ages, stays, image):
+    stay_table = stays.rename(columns={
+        "Admission_Type": "Admission Type", "Avg_Stay": "Average Stay (Days)"
+    })
+    longest = (
+        f"<p>The longest average stay is <b>{stays['Avg_Stay'].iloc[0]:.2f} days</b> for "
+        f"<b>{html.escape(str(stays['Admission_Type'].iloc[0]))}</b> admissions.</p>"
+        if not stays.empty else "<p>No stays recorded.</p>"
+    )
+    return f"""<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>{html.escape(hospital)}</title></head>
+<body>
+<h1>{html.escape(hospital)}</h1>
+<h2>Most Common Age Group by Admission Type</h2>
+<img src="{image}" alt="Age groups by admission type" style="max-width:100%">
+{_summary(ages).to_html(index=False)}
+<h2>Average Length of Stay</h2>
+{longest}
+{stay_table.to_html(index=False, float_format=lambda value: f"{value:.2f}")}
+</body></html>
+"""
+
+
+def render(hospital, ages, stays, directory, formats=FORMATS):
+    """Write one hospital's report files into ``directory``."""
+    from healthcare import charts
+
+    stem = file_stem(hospital)
+    fig = charts.age_group_pies(ages, validation.ADMISSION_TYPES)
+    fig.suptitle(hospital)
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="png", bbox_inches="tight")
+    charts.plt.close(fig)
+
+    if "png" in formats:
+        with open(os.path.join(directory, f"{stem}.png"), "wb") as f:
+            f.write(buffer.getvalue())
+    if "html" in formats:
+        image = (
+            f"{stem}.png" if "png" in formats
+            else "data:image/png;base64," + base64.b64encode(buffer.getvalue()).decode()
+        )
+        with open(os.path.join(directory, f"{stem}.html"), "w", encoding="utf-8") as f:
+            f.write(_html(hospital, ages, stays, image))
+    return stem
+
+
+def _render_batch(batch, directory, formats):
+    # Runs in a worker process.
+    return [(hospital, render(hospital, ages, stays, directory, formats)) for hospital, ages, stays in batch]
+
+
+def completed(directory):
+    """Hospitals already listed in the progress log of ``directory``."""
+    try:
+        with open(os.path.join(directory, PROGRESS_LOG), encoding="utf-8") as f:
+            return {line.split("\t", 1)[0] for line in f if line.strip()}
+    except FileNotFoundError:
+        return set()
+
+
+def generate(hospitals=None, date_range=None, formats=FORMATS, workers=None, out=REPORT_DIR, restart=False):
+    """Render reports for every hospital not yet done; returns the output directory."""
+    version = snapshot.data_version()
+    if date_range is not None:
+        version += f"-{date_range[0]}_{date_range[1]}"
+    directory = os.path.join(out, version)
+    os.makedirs(directory, exist_ok=True)
+    log_path = os.path.join(directory, PROGRESS_LOG)
+    if restart and os.path.exists(log_path):
+        os.remove(log_path)
+
+    done = completed(directory)
+    reports = collect(hospitals, date_range)
+    pending = [(hospital, *data) for hospital, data in reports.items() if hospital not in done]
+    print(f"{len(reports) - len(pending)} of {len(reports)} reports already written to {directory}")
+    if not pending:
+        return directory
+
+    batches = [pending[i:i + BATCH_HOSPITALS] for i in range(0, len(pending), BATCH_HOSPITALS)]
+    # Fresh interpreters: forking would copy the parent's connection pools and threads.
+    context = multiprocessing.get_context("spawn")
+    written = 0
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool, \
+            open(log_path, "a", encoding="utf-8") as log:
+        futures = [pool.submit(_render_batch, batch, directory, tuple(formats)) for batch in batches]
+        for future in as_completed(futures):
+            finished = future.result()
+            for hospital, stem in finished:
+                log.write(f"{hospital}\t{stem}\n")
+            log.flush()
+            written += len(finished)
+            print(f"{written}/{len(pending)} reports written")
+    return directory
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--hospital", action="append", help="only this hospital (repeatable)")
+    parser.add_argument("--formats", nargs="+", choices=FORMATS, default=list(FORMATS))
+    parser.add_argument("--start", help="first admission date (YYYY-MM-DD)")
+    parser.add_argument("--end", help="last admission date (YYYY-MM-DD)")
+    parser.add_argument("--workers", type=int, help="render processes (default: one per CPU)")
+    parser.add_argument("--out", default=REPORT_DIR)
+    parser.add_argument("--restart", action="store_true", help="ignore the progress log and render everything")
+    args = parser.parse_args()
+    date_range = (args.start, args.end) if args.start or args.end else None
+    print(f"reports in {generate(args.hospital, date_range, args.formats, args.workers, args.out, args.restart)}")
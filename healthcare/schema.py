@@ -0,0 +1,159 @@
+"""Star schema for the healthcare data.
+
+The free-text columns with many distinct values are moved into dimension
+tables keyed by integers, leaving a slim ``fact_admission`` table. A view
+named ``Healthcare_Dataset`` joins everything back together so queries
+written against the original flat table keep working.
+
+Run ``python -m healthcare.normalize [healthcare_database.db]`` to migrate
+a database that still holds the flat table.
+"""
+
+import sqlite3
+import uuid
+
+SOURCE_TABLE = "Healthcare_Dataset"
+FACT_TABLE = "fact_admission"
+INDEX_COLUMNS = ("index", "level_0", "Unnamed: 0")
+META_TABLE = "dataset_meta"
+
+# column in the flat table -> (dimension table, foreign key in the fact table)
+DIMENSIONS = {
+    "Hospital": ("dim_hospital", "hospital_id"),
+    "Doctor": ("dim_doctor", "doctor_id"),
+    "Insurance_Provider": ("dim_insurance_provider", "insurance_provider_id"),
+    "Medication": ("dim_medication", "medication_id"),
+    "Medical_Condition": ("dim_medical_condition", "medical_condition_id"),
+}
+
+
+def dimension_table(column):
+    return DIMENSIONS[column][0]
+
+
+def _columns(connection, table):
+    return [(row[1], row[2]) for row in connection.execute(f'PRAGMA table_info("{table}")')]
+
+
+def stamp_version(connection):
+    """Record a new data version; call after every change to the data."""
+    version = uuid.uuid4().hex[:12]
+    with connection:
+        connection.execute(
+            f"CREATE TABLE IF NOT EXISTS {META_TABLE} (key TEXT PRIMARY KEY, value TEXT)"
+        )
+        connection.execute(
+            f"INSERT OR REPLACE INTO {META_TABLE} (key, value) VALUES ('data_version', ?)",
+            (version,),
+        )
+    return version
+
+
+def read_version(connection):
+    try:
+        row = connection.execute(
+            f"SELECT value FROM {META_TABLE} WHERE key = 'data_version'"
+        ).fetchone()
+    except sqlite3.OperationalError:
+        return None
+    return row[0] if row else None
+
+
+def flat_columns(connection):
+    """Columns of the flat table, in fact-table order, with keys named back."""
+    names = {key: column for column, (_, key) in DIMENSIONS.items()}
+    return [names.get(column, column) for column, _ in _columns(connection, FACT_TABLE)[1:]]
+
+
+def is_normalized(connection):
+    row = connection.execute(
+        "SELECT type FROM sqlite_master WHERE name = ?", (SOURCE_TABLE,)
+    ).fetchone()
+    return row is not None and row[0] == "view"
+
+
+def create_compat_view(connection, columns):
+    """(Re)create the flat ``Healthcare_Dataset`` view over the star schema."""
+    select = [f"{FACT_TABLE}.id AS id"]
+    joins = []
+    for column in columns:
+        if column in DIMENSIONS:
+            table, key = DIMENSIONS[column]
+            select.append(f"{table}.name AS {column}")
+            joins.append(f"LEFT JOIN {table} ON {table}.id = {FACT_TABLE}.{key}")
+        else:
+            select.append(f"{FACT_TABLE}.{column} AS {column}")
+    connection.execute(f"DROP VIEW IF EXISTS {SOURCE_TABLE}")
+    connection.execute(
+        f"CREATE VIEW {SOURCE_TABLE} AS SELECT {', '.join(select)} "
+        f"FROM {FACT_TABLE} {' '.join(joins)}"
+    )
+
+
+def create_search_indexes(connection):
+    """Case-insensitive name indexes used for prefix (typeahead) lookups."""
+    with connection:
+        for table, _ in DIMENSIONS.values():
+            connection.execute(
+                f"CREATE INDEX IF NOT EXISTS idx_{table}_name_nocase ON {table} (name COLLATE NOCASE)"
+            )
+
+
+def normalize(connection):
+    """Split the flat table into dimensions plus a fact table, in place."""
+    if is_normalized(connection):
+        create_search_indexes(connection)
+        return
+
+    # Drop the pandas index column written by to_sql; the fact id replaces it.
+    source_columns = [
+        (column, declared_type)
+        for column, declared_type in _columns(connection, SOURCE_TABLE)
+        if column not in INDEX_COLUMNS
+    ]
+    raw = f"{SOURCE_TABLE}_raw"
+
+    with connection:
+        connection.execute(f"ALTER TABLE {SOURCE_TABLE} RENAME TO {raw}")
+
+        for column, (table, _) in DIMENSIONS.items():
+            connection.execute(
+                f"CREATE TABLE {table} (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE)"
+            )
+            connection.execute(
+                f"INSERT INTO {table} (name) SELECT DISTINCT {column} FROM {raw} "
+                f"WHERE {column} IS NOT NULL ORDER BY {column}"
+            )
+
+        fact_columns = ["id INTEGER PRIMARY KEY"]
+        insert_columns = []
+        select = []
+        joins = []
+        for column, declared_type in source_columns:
+            if column in DIMENSIONS:
+                table, key = DIMENSIONS[column]
+                fact_columns.append(f"{key} INTEGER REFERENCES {table} (id)")
+                insert_columns.append(key)
+                select.append(f"{table}.id")
+                joins.append(f"LEFT JOIN {table} ON {table}.name = {raw}.{column}")
+            else:
+                fact_columns.append(f"{column} {declared_type}".strip())
+                insert_columns.append(column)
+                select.append(f"{raw}.{column}")
+
+        connection.execute(f"CREATE TABLE {FACT_TABLE} ({', '.join(fact_columns)})")
+        connection.execute(
+            f"INSERT INTO {FACT_TABLE} ({', '.join(insert_columns)}) "
+            f"SELECT {', '.join(select)} FROM {raw} {' '.join(joins)}"
+        )
+        for _, key in DIMENSIONS.values():
+            connection.execute(f"CREATE INDEX idx_{FACT_TABLE}_{key} ON {FACT_TABLE} ({key})")
+
+        connection.execute(f"DROP TABLE {raw}")
+        create_compat_view(connection, [column for column, _ in source_columns])
+
+    create_search_indexes(connection)
+
+    # Reclaim the pages freed by the long text columns.
+    connection.execute("VACUUM")
+    connection.execute("ANALYZE")
@@ -0,0 +1,336 @@
+"""Horizontal shards of the dataset and scatter-gather query execution.
+
+A sharded deployment splits the rows into several normalized databases,
+partitioned by admission year or by hospital group, and lists them in
+``SHARD_MANIFEST``. Shards spread page queries over several smaller files
+and connections. They are split from the consolidated database, which is
+still loaded first and stays the source of truth, so they do not lift its
+size or single-writer ingest limits.
+
+The manifest records the data version the shards were split from. It is
+ignored while the live database has a different version, so queries never
+mix two versions: they run on the consolidated database until the shards
+are rebuilt, which publishing a new version does automatically
+(see :mod:`healthcare.publish`).
+
+Page queries stay ordinary :class:`~healthcare.query.Query` objects. When a
+manifest exists, :func:`healthcare.db.read_query` and ``read_many`` plan
+them here: every shard runs a partial aggregate in parallel, and the parts
+are merged centrally. SUM and COUNT are summed, MIN/MAX are reduced, and
+AVG is rewritten to SUM and COUNT and divided after the merge. ORDER BY and
+LIMIT are applied to the merged result. ``COUNT(DISTINCT ...)`` cannot be
+merged from partials and is rejected.
+
+Raw SQL strings are not planned; they keep running against the
+consolidated database (see :func:`healthcare.db.current_database`).
+
+Build shards with::
+
+    python -m healthcare.shards --by year
+    python -m healthcare.shards --by hospital --count 4
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import uuid
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from healthcare import db, schema, snapshot
+from healthcare.pipeline import DERIVED_COLUMNS, create_derived_indexes
+
+SHARD_MANIFEST = os.path.join(db.DATA_ROOT, "shards.json")
+SHARD_DIR = os.path.join(db.DATA_ROOT, "shards")
+
+# --by value -> column the rows are partitioned on
+PARTITIONS = {"year": "Admission_Year", "hospital": "Hospital"}
+
+# Rows copied from the consolidated database per read while building shards.
+BUILD_CHUNK_ROWS = 100_000
+
+# Shard queries in flight at once, across all pages of this process.
+MAX_SHARD_QUERIES = 8
+
+MERGES = {"SUM": "sum", "COUNT": "sum", "MIN": "min", "MAX": "max"}
+
+
+class Shard:
+    """One shard database and the partition values it holds."""
+
+    def __init__(self, name, path, values):
+        self.name = name
+        self.path = path
+        self.values = values
+
+    def __repr__(self):
+        return f"Shard({self.name!r}, {self.path!r})"
+
+
+_manifest = (None, None)
+_manifest_lock = threading.Lock()
+
+
+def stored_manifest():
+    """The shard manifest on disk as a dict, whatever version it was split from."""
+    global _manifest
+    try:
+        mtime = os.stat(SHARD_MANIFEST).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    with _manifest_lock:
+        if _manifest[0] != mtime:
+            with open(SHARD_MANIFEST) as f:
+                _manifest = (mtime, json.load(f))
+        return _manifest[1]
+
+
+def manifest():
+    """The shard manifest as a dict, or None when the live data is not sharded.
+
+    Shards split from another data version than the live database are
+    treated as absent.
+    """
+    current = stored_manifest()
+    if current is None:
+        return None
+    if current.get("source_version") != snapshot.data_version(db.current_database()):
+        return None
+    return current
+
+
+def configured():
+    return manifest() is not None
+
+
+def version():
+    """Identifier of the current shard set, or None when not sharded."""
+    current = manifest()
+    return None if current is None else current["version"]
+
+
+def shards():
+    current = manifest() or {"shards": []}
+    return [Shard(shard["name"], shard["path"], shard["values"]) for shard in current["shards"]]
+
+
+# Planning ------------------------------------------------------------------
+def _output_name(column):
+    """Name a select-list entry has in the result (``x AS y`` -> ``y``)."""
+    expression, _, alias = column.rpartition(" AS ")
+    return alias if expression else column.split(".")[-1]
+
+
+def plan(query):
+    """Split ``query`` into the per-shard partial query and its merge spec.
+
+    Returns ``(partial, keys, merges)``: ``keys`` are the output columns to
+    group partials on, ``merges`` lists ``(alias, how, parts)``.
+    """
+    keys = [_output_name(column) for column in query._columns]
+    if not query._aggregates:
+        # Plain or DISTINCT rows: each shard can already order and limit.
+        return query.copy(), keys, []
+    if query._distinct:
+        raise ValueError("SELECT DISTINCT with aggregates cannot be merged across shards")
+
+    partial = query.copy()
+    partial._aggregates = []
+    partial._order_by = []
+    partial._limit = None
+    merges = []
+    for func, column, alias in query._aggregates:
+        if column.upper().startswith("DISTINCT "):
+            raise ValueError(f"{func}({column}) cannot be merged across shards")
+        if func == "AVG":
+            partial.sum(column, f"{alias}__sum").aggregate("COUNT", column, f"{alias}__count")
+            merges.append((alias, "avg", (f"{alias}__sum", f"{alias}__count")))
+        elif func in MERGES:
+            partial.aggregate(func, column, alias)
+            merges.append((alias, MERGES[func], (alias,)))
+        else:
+            raise ValueError(f"{func} cannot be merged across shards")
+    return partial, keys, merges
+
+
+def _sort(df, query):
+    expressions = {
+        column.rpartition(" AS ")[0]: _output_name(column)
+        for column in query._columns if " AS " in column
+    }
+    columns, ascending = [], []
+    for term in query._order_by:
+        name, _, direction = term.strip().partition(" ")
+        name = expressions.get(name, name.split(".")[-1])
+        if name not in df:
+            raise ValueError(f"cannot order merged shard results by {term!r}")
+        columns.append(name)
+        ascending.append(direction.strip().upper() != "DESC")
+    if columns:
+        df = df.sort_values(columns, ascending=ascending, kind="stable")
+    return df
+
+
+def merge(frames, query, keys, merges):
+    """Combine per-shard partial results into the result of ``query``."""
+    df = pd.concat(frames, ignore_index=True)
+    if merges:
+        parts = {part: ("sum" if how == "avg" else how) for _, how, names in merges for part in names}
+        if keys:
+            df = df.groupby(keys, sort=False, dropna=False, as_index=False).agg(parts)
+        else:
+            df = pd.DataFrame([{part: getattr(df[part], how)() for part, how in parts.items()}])
+        for alias, how, names in merges:
+            if how == "avg":
+                total, count = (df[name] for name in names)
+                df[alias] = total / count.where(count != 0)
+        df = df[keys + [alias for alias, _, _ in merges]]
+    elif query._distinct:
+        df = df.drop_duplicates()
+    df = _sort(df, query)
+    if query._limit is not None:
+        df = df.head(query._limit)
+    return df.reset_index(drop=True)
+
+
+# Execution -----------------------------------------------------------------
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    # Separate from db's batch executor: read_many workers wait on shard
+    # queries, and sharing one pool could leave them waiting on themselves.
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=MAX_SHARD_QUERIES, thread_name_prefix="healthcare-shard"
+            )
+    return _executor
+
+
+def _run_shard(shard, sql, params, slot, heavy, session, cache=False):
+    with db.get_pool(shard.path).connection() as connection:
+        return db.execute(sql, params, connection, slot=slot, heavy=heavy, session=session, cache=cache)
+
+
+def prune(query):
+    """The shards that can hold rows for ``query``'s date range.
+
+    Only year-partitioned shards can be pruned; hospital shards are all
+    visited.
+    """
+    current = manifest()
+    if query._date_range is None or current is None or current.get("by") != "year":
+        return shards()
+    start, end = query._date_range
+    first = 0 if start is None else pd.Timestamp(start).year
+    last = 9999 if end is None else pd.Timestamp(end).year
+    return [
+        shard for shard in shards()
+        if any(first <= int(value) <= last for value in shard.values)
+    ]
+
+
+def read_query(query, slot=None, heavy=False, session=None, targets=None):
+    """Scatter ``query`` over ``targets`` (default: the unpruned shards) and gather it."""
+    partial, keys, merges = plan(query)
+    sql, params = partial.build()
+    targets = prune(query) if targets is None else targets
+    executor = _get_executor()
+    futures = [
+        executor.submit(
+            _run_shard, shard, sql, params,
+            None if slot is None else f"{slot}.{shard.name}", heavy, session, query.is_aggregate(),
+        )
+        for shard in targets
+    ]
+    frames = [future.result() for future in futures]
+    if not frames:
+        # Every shard was pruned: an empty result that still has the right columns.
+        empty_sql, empty_params = partial.copy().limit(0).build()
+        available = shards()
+        if available:
+            frames = [_run_shard(available[0], empty_sql, empty_params, None, False, None)]
+        else:
+            frames = [db.execute(empty_sql, empty_params)]
+    return merge(frames, query, keys, merges)
+
+
+# Building ------------------------------------------------------------------
+def _partition(chunk, by, count):
+    if by == "hospital":
+        # crc32 is stable across processes, unlike hash().
+        names = chunk["Hospital"].fillna("").astype(str)
+        return names.map(lambda name: zlib.crc32(name.encode()) % count).astype(str)
+    return chunk[PARTITIONS[by]].astype("Int64").astype(str)
+
+
+def build(database_path=None, by="year", count=4):
+    """Split a consolidated database into shards and publish their manifest."""
+    if database_path is None:
+        database_path = db.current_database()
+    source_version = snapshot.data_version(database_path)
+    run = uuid.uuid4().hex[:12]
+    directory = os.path.join(SHARD_DIR, run)
+    os.makedirs(directory)
+
+    source = sqlite3.connect(database_path)
+    columns = schema.flat_columns(source)
+    sql = f"SELECT {', '.join(columns)} FROM {schema.SOURCE_TABLE}"
+    outputs = {}
+    values = {}
+    for chunk in pd.read_sql_query(sql, source, chunksize=BUILD_CHUNK_ROWS):
+        part = _partition(chunk, by, count)
+        for name, rows in chunk.groupby(part, sort=False):
+            if name not in outputs:
+                outputs[name] = sqlite3.connect(os.path.join(directory, f"{name}.db"))
+                values[name] = set()
+            rows.to_sql(
+                schema.SOURCE_TABLE,
+                outputs[name],
+                if_exists="append",
+                index=False,
+                dtype={column: kind for column, kind in DERIVED_COLUMNS.items() if column in rows},
+            )
+            if by == "year":
+                # Hospital shards are routed by hash; listing every name is not useful.
+                values[name].update(rows[PARTITIONS[by]].dropna().tolist())
+    source.close()
+
+    entries = []
+    for name, connection in sorted(outputs.items()):
+        schema.normalize(connection)
+        create_derived_indexes(connection)
+        schema.stamp_version(connection)
+        connection.close()
+        entries.append({
+            "name": name,
+            "path": os.path.join(directory, f"{name}.db"),
+            "values": sorted(values[name], key=str),
+        })
+
+    staging = f"{SHARD_MANIFEST}.{run}"
+    with open(staging, "w") as f:
+        json.dump(
+            {"version": run, "source_version": source_version, "by": by, "key": PARTITIONS[by],
+             "count": len(entries), "groups": count, "shards": entries},
+            f, indent=2, default=str,
+        )
+    os.replace(staging, SHARD_MANIFEST)
+    return entries
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Split the database into shards.")
+    parser.add_argument("--from", dest="database", help="consolidated database (default: live version)")
+    parser.add_argument("--by", choices=sorted(PARTITIONS), default="year")
+    parser.add_argument("--count", type=int, default=4, help="hospital groups for --by hospital")
+    args = parser.parse_args()
+    for entry in build(args.database, args.by, args.count):
+        print(f"{entry['name']}: {entry['path']}")
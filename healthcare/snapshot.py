@@ -0,0 +1,220 @@
+"""Read-only columnar snapshots shared by every Streamlit process.
+
+A snapshot is a directory of NumPy ``.npy`` files, one per column, written
+once per data version and opened with ``mmap_mode="r"``. Every server
+process maps the same files, so the operating system keeps one physical
+copy of the dataset in the page cache no matter how many workers run.
+
+Text columns are stored as integer codes plus a fixed-width array of
+categories and come back as pandas Categoricals; dates are stored as
+``datetime64[ns]``. Both are written in exactly the dtype pandas uses in
+memory (the codes in the width pandas picks for that many categories), so
+:meth:`Snapshot.frame` wraps the mapped files without converting, and
+therefore without copying, any column. Rollups (small aggregate tables) can be published next
+to the rows with :func:`publish_rollup`.
+
+Layout::
+
+    snapshots/<version>/manifest.json
+    snapshots/<version>/rows/<column>.npy
+    snapshots/<version>/rows/<column>.categories.npy
+    snapshots/<version>/rollups/<name>/...
+"""
+
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+
+import numpy as np
+import pandas as pd
+
+from healthcare import db, schema
+
+SNAPSHOT_ROOT = "snapshots"
+DATE_COLUMNS = ("Date_of_Admission", "Discharge_Date")
+
+
+_versions = {}
+
+
+def data_version(database_path=None):
+    """Identifier that changes whenever the database contents change.
+
+    The pipeline stamps a version into the database; databases built before
+    that fall back to the file's size and modification time.
+    """
+    if database_path is None:
+        database_path = db.current_database()
+    stat = os.stat(database_path)
+    key = (database_path, stat.st_mtime_ns, stat.st_size)
+    if key not in _versions:
+        with sqlite3.connect(database_path) as connection:
+            version = schema.read_version(connection)
+        connection.close()
+        _versions[key] = version or f"{stat.st_mtime_ns:x}-{stat.st_size:x}"
+    return _versions[key]
+
+
+def _write_columns(df, directory):
+    os.makedirs(directory)
+    columns = {}
+    for column in df.columns:
+        values = df[column]
+        path = os.path.join(directory, column)
+        if column in DATE_COLUMNS or pd.api.types.is_datetime64_any_dtype(values):
+            np.save(f"{path}.npy", pd.to_datetime(values).to_numpy("datetime64[ns]"))
+            columns[column] = "date"
+        elif pd.api.types.is_numeric_dtype(values):
+            np.save(f"{path}.npy", values.to_numpy())
+            columns[column] = "numeric"
+        else:
+            codes, categories = pd.factorize(values, sort=True)
+            np.save(f"{path}.npy", codes.astype(_code_dtype(categories)))
+            np.save(f"{path}.categories.npy", np.asarray(categories, dtype=str))
+            columns[column] = "category"
+    return columns
+
+
+def _code_dtype(categories):
+    # The codes dtype pandas itself uses for this many categories.
+    return pd.Categorical([], categories=categories).codes.dtype
+
+
+def _read_columns(directory, kinds, columns=None):
+    data = {}
+    for column in columns or kinds:
+        path = os.path.join(directory, column)
+        values = np.load(f"{path}.npy", mmap_mode="r")
+        if kinds[column] == "category":
+            categories = np.load(f"{path}.categories.npy", mmap_mode="r")
+            # Codes already in pandas' dtype are wrapped as they are, not copied.
+            dtype = pd.CategoricalDtype(np.asarray(categories))
+            values = pd.Categorical.from_codes(values, dtype=dtype, validate=False)
+        data[column] = values
+    return pd.DataFrame(data, copy=False)
+
+
+def publish(database_path=None, root=SNAPSHOT_ROOT):
+    """Write the snapshot for the current data version if it is missing.
+
+    The snapshot is assembled in a temporary directory and renamed into
+    place, so concurrent publishers never expose a partial snapshot; the
+    loser of a race simply discards its copy. Returns the version.
+    """
+    if database_path is None:
+        database_path = db.current_database()
+    version = data_version(database_path)
+    target = os.path.join(root, version)
+    if os.path.exists(target):
+        return version
+
+    os.makedirs(root, exist_ok=True)
+    staging = tempfile.mkdtemp(prefix=f".{version}-", dir=root)
+    try:
+        with sqlite3.connect(database_path) as connection:
+            flat = pd.read_sql_query(f"SELECT * FROM {schema.SOURCE_TABLE}", connection)
+        connection.close()
+        kinds = _write_columns(flat, os.path.join(staging, "rows"))
+        manifest = {"version": version, "rows": len(flat), "columns": kinds}
+        with open(os.path.join(staging, "manifest.json"), "w") as f:
+            json.dump(manifest, f)
+        try:
+            os.rename(staging, target)
+        except OSError:
+            if not os.path.exists(target):
+                raise
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+    return version
+
+
+class Snapshot:
+    """A published snapshot mapped read-only into this process."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, "manifest.json")) as f:
+            self.manifest = json.load(f)
+        self.version = self.manifest["version"]
+        self._rollups = {}
+
+    def __len__(self):
+        return self.manifest["rows"]
+
+    @property
+    def columns(self):
+        return list(self.manifest["columns"])
+
+    def frame(self, columns=None):
+        """Rows as a DataFrame backed by the memory-mapped column files."""
+        return _read_columns(
+            os.path.join(self.directory, "rows"), self.manifest["columns"], columns
+        )
+
+    def rollup_path(self, name):
+        return os.path.join(self.directory, "rollups", name)
+
+    def rollup(self, name, build=None):
+        """Load a published rollup, publishing ``build(self)`` first if missing."""
+        if name in self._rollups:
+            return self._rollups[name]
+        path = self.rollup_path(name)
+        if not os.path.exists(path):
+            if build is None:
+                raise KeyError(name)
+            publish_rollup(self, name, build(self))
+        with open(os.path.join(path, "kinds.json")) as f:
+            kinds = json.load(f)
+        self._rollups[name] = _read_columns(os.path.join(path, "columns"), kinds)
+        return self._rollups[name]
+
+
+def publish_rollup(snapshot, name, df):
+    """Store an aggregate DataFrame alongside the snapshot rows."""
+    target = snapshot.rollup_path(name)
+    if os.path.exists(target):
+        return
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    staging = tempfile.mkdtemp(prefix=f".{name}-", dir=os.path.dirname(target))
+    try:
+        kinds = _write_columns(df.reset_index(drop=True), os.path.join(staging, "columns"))
+        with open(os.path.join(staging, "kinds.json"), "w") as f:
+            json.dump(kinds, f)
+        try:
+            os.rename(staging, target)
+        except OSError:
+            if not os.path.exists(target):
+                raise
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+
+_attached = {}
+_attach_lock = threading.Lock()
+
+
+def current(database_path=None, root=SNAPSHOT_ROOT):
+    """The snapshot for the database's current version, publishing it if needed."""
+    if database_path is None:
+        database_path = db.current_database()
+    version = data_version(database_path)
+    with _attach_lock:
+        snapshot = _attached.get(version)
+        if snapshot is None:
+            publish(database_path, root)
+            # Drop older versions so their mappings can be released.
+            _attached.clear()
+            snapshot = _attached[version] = Snapshot(os.path.join(root, version))
+    return snapshot
+
+
+def load_columns(columns, database_path=None):
+    """Shortcut for ``current().frame(columns)``."""
+    return current(database_path).frame(columns)
+
+
+if __name__ == "__main__":
+    print(f"published snapshot {publish()}")
@@ -0,0 +1,149 @@
+"""Data-quality rules applied once, at load time, instead of in every query.
+
+:func:`validate` checks a whole batch in one vectorized pass: every rule
+returns a boolean mask of the rows it rejects, so the cost does not depend
+on how many rules there are. Rows failing any rule are moved to the
+``QUARANTINE_TABLE`` of the loaded database together with the names of
+the rules they failed; the rest are returned with clean types (integer
+ages and rooms, float billing amounts, ISO ``YYYY-MM-DD`` dates, trimmed
+text). Pages can therefore rely on, for example, non-negative billing
+amounts and the known ``ADMISSION_TYPES`` without filtering for them.
+
+Inspect the quarantine of a database with::
+
+    python -m healthcare.validation [healthcare_database.db]
+"""
+
+import argparse
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+from healthcare import schema
+from healthcare.db import DATABASE_PATH
+
+QUARANTINE_TABLE = "quarantine"
+
+# Allowed values of the enumerated columns, in display order.
+ADMISSION_TYPES = ("Emergency", "Elective", "Urgent")
+GENDERS = ("Female", "Male")
+BLOOD_TYPES = ("A+", "A-", "B+", "B-", "AB+", "AB-", "O+", "O-")
+TEST_RESULTS = ("Normal", "Abnormal", "Inconclusive")
+
+ENUMS = {
+    "Admission_Type": ADMISSION_TYPES,
+    "Gender": GENDERS,
+    "Blood_Type": BLOOD_TYPES,
+    "Test_Results": TEST_RESULTS,
+}
+
+# Inclusive range of plausible patient ages.
+AGE_RANGE = (0, 120)
+
+REQUIRED_COLUMNS = [
+    "Age", "Gender", "Medical_Condition", "Date_of_Admission", "Hospital",
+    "Billing_Amount", "Room_Number", "Admission_Type", "Discharge_Date",
+]
+
+NUMERIC_COLUMNS = ["Age", "Billing_Amount", "Room_Number"]
+DATE_COLUMNS = ["Date_of_Admission", "Discharge_Date"]
+
+
+def coerce(df):
+    """Typed copy of ``df``; values that do not parse become missing."""
+    df = df.copy()
+    for column in df.select_dtypes(include=["object", "string"]).columns:
+        stripped = df[column].str.strip()
+        df[column] = stripped.where(stripped.notna(), df[column]).replace("", np.nan)
+    for column in NUMERIC_COLUMNS:
+        df[column] = pd.to_numeric(df[column], errors="coerce")
+    for column in DATE_COLUMNS:
+        df[column] = pd.to_datetime(df[column], errors="coerce")
+    return df
+
+
+def rules(df):
+    """Rule name -> boolean mask of the rows of a coerced ``df`` it rejects."""
+    # Missing values are only reported by "missing_value", not by every rule.
+    age, room = df["Age"], df["Room_Number"]
+    checks = {
+        "missing_value": df[REQUIRED_COLUMNS].isna().any(axis=1),
+        "age_out_of_range": age.notna() & (~age.between(*AGE_RANGE) | (age % 1 != 0)),
+        "negative_billing": df["Billing_Amount"] < 0,
+        "invalid_room": room.notna() & ((room <= 0) | (room % 1 != 0)),
+        "discharge_before_admission": df["Discharge_Date"] < df["Date_of_Admission"],
+        "duplicate_row": df.duplicated(keep="first"),
+    }
+    for column, allowed in ENUMS.items():
+        checks[f"unknown_{column.lower()}"] = df[column].notna() & ~df[column].isin(allowed)
+    return checks
+
+
+def validate(df):
+    """Split ``df`` into ``(clean, quarantined)``.
+
+    ``quarantined`` holds the rejected rows as loaded, plus a ``Reasons``
+    column listing the failed rules separated by ``"; "``.
+    """
+    typed = coerce(df)
+    failures = pd.DataFrame(rules(typed), index=df.index)
+    rejected = failures.any(axis=1).to_numpy()
+
+    quarantined = df[rejected].astype(str)
+    # Boolean frame dot "name; " strings concatenates the names of the failed rules.
+    reasons = failures[rejected].dot(failures.columns + "; ")
+    quarantined["Reasons"] = reasons.astype(str).str.rstrip("; ")
+
+    clean = typed[~rejected].copy()
+    clean["Age"] = clean["Age"].astype(np.int64)
+    clean["Room_Number"] = clean["Room_Number"].astype(np.int64)
+    for column in DATE_COLUMNS:
+        clean[column] = clean[column].dt.strftime("%Y-%m-%d")
+    return clean, quarantined
+
+
+def write_quarantine(connection, quarantined, replace=True):
+    """Store rejected rows in ``QUARANTINE_TABLE``, replacing or adding to earlier ones."""
+    if not replace:
+        try:
+            earlier = pd.read_sql_query(f"SELECT * FROM {QUARANTINE_TABLE}", connection)
+        except pd.errors.DatabaseError:
+            earlier = None
+        # Concatenated rather than appended: the column sets may differ between loads.
+        if earlier is not None:
+            quarantined = pd.concat([earlier, quarantined], ignore_index=True)
+    quarantined.to_sql(QUARANTINE_TABLE, connection, if_exists="replace", index=False)
+
+
+def quarantine_existing(connection):
+    """Validate an already loaded database, moving failing rows out of the fact table."""
+    df = pd.read_sql_query(f"SELECT * FROM {schema.SOURCE_TABLE}", connection)
+    source = df.drop(columns=["id"])
+    _, quarantined = validate(source)
+    with connection:
+        connection.executemany(
+            f"DELETE FROM {schema.FACT_TABLE} WHERE id = ?",
+            ((int(row_id),) for row_id in df.loc[quarantined.index, "id"]),
+        )
+    write_quarantine(connection, quarantined, replace=False)
+    return quarantined
+
+
+def summary(connection):
+    """Rejected rows per rule in ``connection``'s quarantine."""
+    try:
+        reasons = pd.read_sql_query(f"SELECT Reasons FROM {QUARANTINE_TABLE}", connection)
+    except pd.errors.DatabaseError:
+        return pd.Series(dtype=int, name="rows")
+    return reasons["Reasons"].str.split("; ").explode().value_counts().rename("rows")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Show the quarantined rows of a database.")
+    parser.add_argument("database", nargs="?", default=DATABASE_PATH)
+    args = parser.parse_args()
+    with sqlite3.connect(args.database) as connection:
+        counts = summary(connection)
+    connection.close()
+    print(counts.to_string() if not counts.empty else "no quarantined rows")
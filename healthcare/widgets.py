@@ -0,0 +1,126 @@
+"""Streamlit widgets shared across pages."""
+
+import html
+import os
+
+import streamlit as st
+
+from healthcare import db, export, snapshot
+from healthcare.governor import current_session
+from healthcare.query import LIKE_ESCAPE, escape_like
+from healthcare.schema import dimension_table
+
+# Sorts after every character a hospital name can contain, so
+# ``prefix <= name < prefix + PREFIX_END`` selects exactly the prefix range.
+PREFIX_END = "\U0010ffff"
+
+
+def search_dimension(column, text, limit=20):
+    """Return up to ``limit`` names from a dimension matching ``text``.
+
+    Prefix matches come first and are answered from the NOCASE name index
+    as a range scan; if there are fewer than ``limit`` of them, names that
+    contain ``text`` elsewhere fill the remaining slots.
+    """
+    table = dimension_table(column)
+    text = text.strip()
+    matches = db.execute(
+        f"SELECT name FROM {table} "
+        "WHERE name >= ? COLLATE NOCASE AND name < ? COLLATE NOCASE "
+        "ORDER BY name COLLATE NOCASE LIMIT ?",
+        (text, text + PREFIX_END, limit),
+    )["name"].tolist()
+    if text and len(matches) < limit:
+        pattern = escape_like(text)
+        contains = db.execute(
+            f"SELECT name FROM {table} WHERE name LIKE ? {LIKE_ESCAPE} AND NOT name LIKE ? {LIKE_ESCAPE} "
+            "ORDER BY name COLLATE NOCASE LIMIT ?",
+            (f"%{pattern}%", f"{pattern}%", limit - len(matches)),
+        )["name"].tolist()
+        matches += contains
+    return matches
+
+
+# ``version`` is only part of the cache key, so a publish drops stale names.
+@st.cache_data(max_entries=1024)
+def search_hospitals(text, limit=20, version=None):
+    return search_dimension("Hospital", text, limit)
+
+
+@st.cache_data(max_entries=1024)
+def search_doctors(text, limit=20, version=None):
+    return search_dimension("Doctor", text, limit)
+
+
+def hospital_picker(label, key, allow_all=False, limit=20):
+    """Typeahead hospital selector.
+
+    Only the top ``limit`` matches for the typed text are sent to the
+    browser, so the widget costs the same however many hospitals exist.
+    Returns the chosen hospital name, ``"All"`` when ``allow_all`` is set and
+    nothing narrower was picked, or ``None`` when nothing matches.
+    """
+    typed = st.text_input(
+        label,
+        key=f"{key}_search",
+        placeholder="Start typing a hospital name (e.g., Smith LLC)",
+    )
+    options = (["All"] if allow_all else []) + search_hospitals(typed, limit, snapshot.data_version())
+    return st.selectbox(
+        f"Top {limit} matching hospitals:",
+        options=options,
+        key=key,
+        help="Type more of the name to narrow the list.",
+    )
+
+
+def doctor_picker(label, key, suggestions=(), limit=20):
+    """Typeahead doctor selector, like :func:`hospital_picker`.
+
+    Before anything is typed the list shows ``suggestions`` (e.g. the
+    busiest doctors) instead of the alphabetically first names.
+    """
+    typed = st.text_input(
+        label,
+        key=f"{key}_search",
+        placeholder="Start typing a doctor's name (e.g., Matthew Smith)",
+    )
+    suggestions = list(suggestions)[:limit]
+    options = search_doctors(typed, limit, snapshot.data_version()) if typed.strip() or not suggestions else suggestions
+    return st.selectbox(
+        f"Top {limit} matching doctors:",
+        options=options,
+        key=key,
+        help="Type more of the name to narrow the list.",
+    )
+
+
+def export_widget(query, key, file_name):
+    """Format picker plus a button that streams ``query`` to a download.
+
+    The rows are written to disk chunk by chunk; the page never holds the
+    extract as a DataFrame. The download link points at Streamlit's static
+    file server, which streams the file from disk.
+    """
+    col1, col2 = st.columns([1, 3])
+    fmt = col1.selectbox("Export format", list(export.FORMATS), key=f"{key}_format")
+    extension, mime = export.FORMATS[fmt]
+    if col2.button("Prepare full export", key=f"{key}_prepare"):
+        with st.spinner("Exporting all matching rows..."):
+            previous = st.session_state.pop(f"{key}_path", None)
+            if previous and os.path.exists(previous):
+                os.remove(previous)
+            st.session_state[f"{key}_path"] = export.export_to_file(query, fmt, current_session())
+    path = st.session_state.get(f"{key}_path")
+    if path and os.path.exists(path) and path.endswith(f".{extension}"):
+        if os.path.getsize(path) > export.STATIC_MAX_BYTES:
+            st.warning(
+                f"This export is too large to download in the browser. It was saved on the "
+                f"server as `{path}`; narrow the date range for a downloadable file."
+            )
+            return
+        st.markdown(
+            f'<a href="{export.url(path)}" download="{html.escape(file_name)}.{extension}" '
+            f'type="{mime}">Download {fmt}</a>',
+            unsafe_allow_html=True,
+        )
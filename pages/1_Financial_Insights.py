@@ -1,94 +1,104 @@
 import streamlit as st
-import pandas as pd
-import plotly.express as px
-import seaborn as sns
-import matplotlib.pyplot as plt
-import sqlite3
-import altair as alt
-
-
-database_path = 'healthcare_database.db'
-
-connect = sqlite3.connect('healthcare_database.db')
+from healthcare import Query, charts, compare, cube, filters, read_many
+from healthcare.governor import GovernorError
+from healthcare.schema import FACT_TABLE
 
 # Sidebar for adjusting rows
 st.sidebar.title("Financial Dashboard Settings")
 limit = st.sidebar.slider("Number of rows to display:", 10, 1000, 100, 10)
 st.sidebar.info("Adjust the settings to filter and optimize your view.")
 
+# Global admission-date range, shared with every page
+date_range = filters.date_range_filter()
+periods = filters.comparison_periods()
+
 # explanation for the row limit
 st.sidebar.markdown("""
 **Why Limit the Rows?**  
 To ensure the dashboard performs efficiently and provides a smooth user experience, we have set a limit on the number of rows displayed. This approach minimizes load times and enhances interactivity, especially when analyzing large datasets.
 """)
 
-cursor = connect.cursor()
-#total revenue by hospital
-hospital_revenue = pd.read_sql_query(f"""SELECT Hospital, SUM(Billing_Amount) AS Total_Revenue FROM Healthcare_Dataset GROUP BY Hospital ORDER BY Total_Revenue DESC LIMIT {limit}""", connect)
-
-#admission by hospital revenue
-admission_hospital_revenue = pd.read_sql_query(f"""SELECT 
-    Hospital,
-    Admission_Type,
-    SUM(Billing_Amount) AS Revenue
-FROM Healthcare_Dataset 
-GROUP BY Hospital, Admission_Type
-ORDER BY Revenue DESC
-LIMIT {limit};""", connect)
-
-#medical condition and insurance revenue
-medical_condition_insurance_revenue = pd.read_sql_query(f"""SELECT 
-    Medical_Condition,
-    Insurance_Provider,
-    SUM(Billing_Amount) AS Revenue
-FROM Healthcare_Dataset 
-GROUP BY Medical_Condition, Insurance_Provider
-ORDER BY Revenue DESC
-LIMIT {limit};""", connect)
-
-
-#avg billing by medical type and by hospital 
-avg_billing_by_type_hospital = pd.read_sql_query(f"""SELECT 
-    Admission_Type,
-    Hospital,                                            
-    AVG(Billing_Amount) AS Avg_Billing
-FROM Healthcare_Dataset 
-GROUP BY Admission_Type, Hospital ORDER BY Avg_Billing DESC LIMIT {limit};""", connect)
-
-
-
-#avg billing amount by admission type 
-query_5 = pd.read_sql_query(f"""
-SELECT 
-    Admission_Type,
-    AVG(Billing_Amount) AS Avg_Billing
-FROM Healthcare_Dataset 
-GROUP BY Admission_Type ORDER BY Avg_Billing DESC LIMIT {limit};
-""", connect)
-#cursor.execute(query_5)
-
-#top rev generating medical condition x insurance provider 
-query_6 = pd.read_sql_query("""
-SELECT 
-    Medical_Condition,
-    Insurance_Provider,
-    SUM(Billing_Amount) AS Total_Revenue
-FROM Healthcare_Dataset 
-GROUP BY Medical_Condition, Insurance_Provider
-ORDER BY Total_Revenue DESC
-LIMIT 1;
-""", connect)
-#cursor.execute(query_6)
-results = cursor.fetchall()
-results_df = pd.DataFrame(results, columns=['Medical_Condition', 'Insurance_Provider', 'Total_Revenue'])
-
-
-#get results from query
-results = cursor.fetchall()
-results = pd.DataFrame(results)
-print(results)
+# The page's aggregates are independent of each other, so run them as one concurrent batch
+page_queries = {
+    #total revenue by hospital
+    "hospital_revenue": Query(FACT_TABLE).group_by_dimension("Hospital").sum("Billing_Amount", "Total_Revenue")
+    .order_by("Total_Revenue DESC").limit(limit),
+
+    #admission by hospital revenue
+    "admission_hospital_revenue": Query(FACT_TABLE).group_by_dimension("Hospital").select("Admission_Type")
+    .sum("Billing_Amount", "Revenue").group_by("Admission_Type").order_by("Revenue DESC").limit(limit),
+
+    #medical condition and insurance revenue
+    "medical_condition_insurance_revenue": Query(FACT_TABLE)
+    .group_by_dimension("Medical_Condition", "Insurance_Provider").sum("Billing_Amount", "Revenue")
+    .order_by("Revenue DESC").limit(limit),
+
+    #avg billing by medical type and by hospital 
+    "avg_billing_by_type_hospital": Query(FACT_TABLE).select("Admission_Type").group_by("Admission_Type")
+    .group_by_dimension("Hospital").avg("Billing_Amount", "Avg_Billing").order_by("Avg_Billing DESC").limit(limit),
+
+    #avg billing amount by admission type 
+    "query_5": Query(FACT_TABLE).select("Admission_Type").avg("Billing_Amount", "Avg_Billing")
+    .group_by("Admission_Type").order_by("Avg_Billing DESC").limit(limit),
+
+    #top rev generating medical condition x insurance provider 
+    "query_6": Query(FACT_TABLE).group_by_dimension("Medical_Condition", "Insurance_Provider")
+    .sum("Billing_Amount", "Total_Revenue").order_by("Total_Revenue DESC").limit(1),
+}
+# every aggregate covers only the selected admission dates
+page_queries = {name: filters.apply(query) for name, query in page_queries.items()}
+if periods:
+    # both periods from one grouped scan, run in the same batch as the page's other aggregates
+    page_queries["hospital_revenue_comparison"] = compare.split(
+        Query(FACT_TABLE).group_by_dimension("Hospital").sum("Billing_Amount", "Total_Revenue"), *periods
+    )
+try:
+    results = read_many(page_queries, slot="financial", heavy=True)
+except GovernorError as error:
+    st.warning(str(error))
+    st.stop()
+hospital_revenue = results["hospital_revenue"]
+admission_hospital_revenue = results["admission_hospital_revenue"]
+medical_condition_insurance_revenue = results["medical_condition_insurance_revenue"]
+avg_billing_by_type_hospital = results["avg_billing_by_type_hospital"]
+query_5 = results["query_5"]
+query_6 = results["query_6"]
+hospital_revenue_comparison = results.get("hospital_revenue_comparison")
 
 st.header("Financial Insights and Revenue Analysis")
+
+# Comparison mode: revenue by hospital in this period vs the earlier one
+if periods:
+    st.subheader("Period Comparison: Revenue by Hospital")
+    st.caption(compare.describe(*periods))
+    revenue_changes = compare.deltas(hospital_revenue_comparison, ["Hospital"], ["Total_Revenue"])
+    current_total = revenue_changes["Total_Revenue_Current"].sum()
+    previous_total = revenue_changes["Total_Revenue_Previous"].sum()
+    change_pct = 100 * (current_total - previous_total) / previous_total if previous_total else float("nan")
+
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Revenue This Period", f"${current_total:,.0f}", f"{change_pct:+.1f}%")
+    col2.metric("Revenue Earlier Period", f"${previous_total:,.0f}")
+    col3.metric("Hospitals with Growth", int((revenue_changes["Total_Revenue_Change"] > 0).sum()))
+
+    movers = compare.top_movers(revenue_changes, "Total_Revenue", n=min(limit, 25))
+    fig_movers = charts.px.bar(
+        movers,
+        x="Hospital",
+        y="Total_Revenue_Change",
+        color=movers["Total_Revenue_Change"] > 0,
+        color_discrete_map={True: "seagreen", False: "indianred"},
+        hover_data=["Total_Revenue_Current", "Total_Revenue_Previous", "Total_Revenue_Change_Pct"],
+        title="Top Movers: Change in Revenue by Hospital",
+        labels={"Total_Revenue_Change": "Change in Revenue", "color": "Increase"}
+    )
+    st.plotly_chart(fig_movers, use_container_width=True)
+    with st.expander("View All Revenue Changes"):
+        st.dataframe(
+            compare.top_movers(revenue_changes, "Total_Revenue", n=limit).style.format(precision=2, na_rep="n/a"),
+            use_container_width=True,
+            hide_index=True,
+        )
 tab1, tab2, tab3 = st.tabs(["Revenue Analysis", "Trends by Hospital Admission Type", "Insurance & Medical Condition"])
 
 
@@ -152,9 +162,9 @@ with tab1:
     filtered_hospital_revenue = filtered_hospital_revenue.sort_values(by='Total_Revenue', ascending=False)
 
     # Create the Altair chart
-    chart = alt.Chart(filtered_hospital_revenue).mark_bar().encode(
-        x=alt.X('Hospital:N', sort='-y', title='Hospital'),  # Sort x-axis by descending revenue
-        y=alt.Y('Total_Revenue:Q', title='Total Revenue')
+    chart = charts.alt.Chart(filtered_hospital_revenue).mark_bar().encode(
+        x=charts.alt.X('Hospital:N', sort='-y', title='Hospital'),  # Sort x-axis by descending revenue
+        y=charts.alt.Y('Total_Revenue:Q', title='Total Revenue')
     ).properties(
         title="Hospitals Generating Highest Revenue",
         width=800,
@@ -175,8 +185,8 @@ with tab1:
             if hospital_data.empty:
                 st.write(f"No data available for {selected_hospital}")
             else:
-                fig, ax = plt.subplots(figsize=(10, 6))
-                sns.barplot(
+                fig, ax = charts.plt.subplots(figsize=(10, 6))
+                charts.sns.barplot(
                     data=hospital_data,
                     x="Admission_Type",
                     y="Revenue",
@@ -186,7 +196,6 @@ with tab1:
                 )
                 st.pyplot(fig)
 
-    connect.close()  
 
 # THIS IS THE START OF TAB 2 IN PAGE 1
 
@@ -226,8 +235,8 @@ with tab2:
 
 
 
-    fig, ax = plt.subplots(figsize=(10, 6))
-    sns.barplot(
+    fig, ax = charts.plt.subplots(figsize=(10, 6))
+    charts.sns.barplot(
         data=avg_billing_by_type_hospital,
         x="Admission_Type",
         y="Avg_Billing",
@@ -235,7 +244,6 @@ with tab2:
     )
     st.pyplot(fig)
 
-connect.close()  
 
 #THIS IS THE START OF TAB 3
 
@@ -243,11 +251,15 @@ connect.close()
 with tab3:
     st.subheader("Highest Revenue Insurance Provider")
 
+    # Every pivot on this tab is a reduction of the in-memory cube, no SQL
+    revenue_cube = cube.current(date_range=date_range)
+    condition_revenue = revenue_cube.pivot("Medical_Condition", "Insurance_Provider", "Billing_Amount", "sum")
+
     # Summary statistics
-    top_condition = medical_condition_insurance_revenue.groupby('Medical_Condition')['Revenue'].sum().idxmax()
-    top_condition_revenue = medical_condition_insurance_revenue.groupby('Medical_Condition')['Revenue'].sum().max()
-    top_insurance = medical_condition_insurance_revenue.groupby('Insurance_Provider')['Revenue'].sum().idxmax()
-    top_insurance_revenue = medical_condition_insurance_revenue.groupby('Insurance_Provider')['Revenue'].sum().max()
+    top_condition = condition_revenue.sum(axis=1).idxmax()
+    top_condition_revenue = condition_revenue.sum(axis=1).max()
+    top_insurance = condition_revenue.sum(axis=0).idxmax()
+    top_insurance_revenue = condition_revenue.sum(axis=0).max()
 
     # Display the summary
     st.markdown(f"""
@@ -257,36 +269,41 @@ with tab3:
     
     selected_conditions = st.multiselect(
         "Search to select one or more medical conditions: ",
-        medical_condition_insurance_revenue['Medical_Condition'].unique(),
+        revenue_cube.labels["Medical_Condition"],
         help="Search and select medical conditions from the dropdown.",
         key="condition_select_tab3"
     )
  
     selected_insurance_providers = st.multiselect(
         "Search to select one or more insurance providers:",
-        medical_condition_insurance_revenue['Insurance_Provider'].unique(),
+        revenue_cube.labels["Insurance_Provider"],
         help="Search and select insurance providers from the dropdown.",
         key="insurance_provider_select_tab3"
     )
-   
-    filtered_condition_insurance_revenue = medical_condition_insurance_revenue
-    if selected_conditions:
-        filtered_condition_insurance_revenue = filtered_condition_insurance_revenue[filtered_condition_insurance_revenue['Medical_Condition'].isin(selected_conditions)]
-    if selected_insurance_providers:
-        filtered_condition_insurance_revenue = filtered_condition_insurance_revenue[filtered_condition_insurance_revenue['Insurance_Provider'].isin(selected_insurance_providers)]
-    
-    # Show DF
-    #st.write(medical_condition_insurance_revenue)
-    st.write(filtered_condition_insurance_revenue.round(0))
-
 
-    fig, ax = plt.subplots(figsize=(12, 8))
-    pivot_table = filtered_condition_insurance_revenue.pivot(
-        index='Medical_Condition',
-        columns='Insurance_Provider',
-        values='Revenue'
+    # Pick any two dimensions and a measure for the heatmap
+    pivot_rows = st.selectbox("Rows:", cube.DIMENSIONS, index=cube.DIMENSIONS.index("Medical_Condition"), key="pivot_rows_tab3")
+    column_options = [dim for dim in cube.DIMENSIONS if dim != pivot_rows]
+    pivot_columns = st.selectbox("Columns:", column_options, key="pivot_columns_tab3",
+                                 index=column_options.index("Insurance_Provider") if "Insurance_Provider" in column_options else 0)
+    measures = {
+        "Revenue": ("Billing_Amount", "sum"),
+        "Average Billing": ("Billing_Amount", "avg"),
+        "Admissions": (None, "count"),
+        "Average Stay (days)": ("Total_Days_of_Stay", "avg"),
+    }
+    measure_label = st.selectbox("Measure:", list(measures), key="pivot_measure_tab3")
+    measure, agg = measures[measure_label]
+
+    filtered_cube = revenue_cube.slice(
+        Medical_Condition=selected_conditions, Insurance_Provider=selected_insurance_providers
     )
-    sns.heatmap(pivot_table, cmap="YlGnBu", annot=True, fmt=".0f", ax=ax)
+    pivot_table = filtered_cube.pivot(pivot_rows, pivot_columns, measure, agg)
+
+    # Show DF
+    st.write(pivot_table.round(0))
+
+    fig, ax = charts.plt.subplots(figsize=(12, 8))
+    charts.sns.heatmap(pivot_table, cmap="YlGnBu", annot=True, fmt=".0f", ax=ax)
     st.pyplot(fig)
 
-connect.close()  
@@ -1,24 +1,16 @@
-import sqlite3
 import pandas as pd
 import streamlit as st
-import numpy as np
-import matplotlib.pyplot as plt 
-import seaborn as sns
-import plotly.express as px
-import altair as alt
+from healthcare import Query, aggregates, charts, filters, read_query, snapshot, validation
+from healthcare.schema import FACT_TABLE
+from healthcare.widgets import hospital_picker
 
 st.set_page_config(layout='wide')
-# file path
-database_path = 'healthcare_database.db'
-
-# create a connection to the SQL db
-connection = sqlite3.connect(database_path)
-
-# create a cursor object instance, to execulte SQL queries
-curser = connection.cursor()
 
 st.header("Demographics and Billing Analysis")
 
+# Global admission-date range, shared with every page
+filters.date_range_filter()
+
 # Tabs for Different Charts
 tab1, tab2, tab3 = st.tabs(["Commonn Age Groups", "Billing Amount by Age", "Billing by Gender"])
 
@@ -26,80 +18,47 @@ with tab1:
     # Streamlit UI for dropdown filter
     st.subheader("Most Common Age Group by Admission Type for Each Hospital")
 
-    # Query to fetch unique hospital names
-    hospital_query = "SELECT DISTINCT Hospital FROM Healthcare_Dataset;"
-    curser.execute(hospital_query)
-    hospitals = [row[0] for row in curser.fetchall()]
-
-    # Single-select dropdown for hospitals
-    selected_hospital = st.selectbox("Select a Hospital:", options=hospitals)
-
-    # Query to fetch data based on the selected hospital
-    query = f"""
-    SELECT 
-    Admission_Type,
-    Age_Group,
-    COUNT(*) AS admission_count
-    FROM Healthcare_Dataset
-    WHERE Hospital = '{selected_hospital}'
-    GROUP BY Admission_Type, Age_Group
-    ORDER BY Admission_Type, admission_count DESC;
-    """
-
-    # Execute the query and fetch results
-    curser.execute(query)
-    results = curser.fetchall()
-    df = pd.DataFrame(results, columns=['Admission_Type', 'Age_Group', 'admission_count'])
-
-    # Check if there is data for the selected hospital
-    if df.empty:
-        st.warning(f"No data available for the selected hospital: {selected_hospital}")
+    # Typeahead search over hospital names
+    selected_hospital = hospital_picker("Search for a Hospital:", key="demographics_hospital")
+
+    if selected_hospital is None:
+        st.warning("No hospital matches the search.")
     else:
-        # Create a subplot with 3 pie charts (one for each admission type)
-        admission_types = ['Emergency', 'Elective', 'Urgent']  # Ensure all expected admission types are included
-        fig, axes = plt.subplots(1, 3, figsize=(18, 6))
-
-        for i, admission_type in enumerate(admission_types):
-            # Filter data for the current admission type
-            admission_df = df[df['Admission_Type'] == admission_type]
-            
-            if admission_df.empty:
-                # Display "Not Applicable" for missing data
-                axes[i].pie([1], labels=["Not Applicable"], colors=["lightgrey"], startangle=90)
-                axes[i].set_title(f"{admission_type}")
-            else:
-                # Plot pie chart for available data
-                axes[i].pie(
-                    admission_df['admission_count'], 
-                    labels=admission_df['Age_Group'], 
-                    autopct='%1.1f%%', 
-                    startangle=90, 
-                    colors=plt.cm.Paired.colors
-                )
-                axes[i].set_title(f"{admission_type}")
-
-        # Display the pie charts in Streamlit
-        st.pyplot(fig)
-
-        # Summary statistics
-        st.subheader(f"Prominent Age Groups Overview for {selected_hospital}")
-        summary = (
-            df.groupby('Admission_Type')
-            .apply(lambda x: x.loc[x['admission_count'].idxmax(), ['Age_Group', 'admission_count']]
-                if not x.empty else pd.Series({'Age_Group': 'Not Applicable', 'admission_count': 0}))
-            .reset_index()
-            .rename(columns={'Age_Group': 'Most Common Age Group', 'admission_count': 'Admission Count'})
-        )
-
-        # Ensure all data types are JSON serializable
-        summary['Admission Count'] = summary['Admission Count'].astype(int)  # Convert to Python int
-        summary['Most Common Age Group'] = summary['Most Common Age Group'].astype(str)  # Convert to Python str
-
-        # Convert entire DataFrame to a dictionary for compatibility
-        summary_dict = summary.to_dict(orient='records')
-
-        # Display the summary using Streamlit's `st.table` for better handling
-        st.table(summary_dict)
+        # Query to fetch data based on the selected hospital
+        query = filters.apply(aggregates.age_groups_by_admission_type(selected_hospital))
+
+        # Execute the query and fetch results
+        df = read_query(query)
+
+        # Check if there is data for the selected hospital
+        if df.empty:
+            st.warning(f"No data available for the selected hospital: {selected_hospital}")
+        else:
+            # One pie per admission type the loader accepts (shared with the batch reports)
+            fig = charts.age_group_pies(df, validation.ADMISSION_TYPES)
+
+            # Display the pie charts in Streamlit
+            st.pyplot(fig)
+
+            # Summary statistics
+            st.subheader(f"Prominent Age Groups Overview for {selected_hospital}")
+            summary = (
+                df.groupby('Admission_Type')
+                .apply(lambda x: x.loc[x['admission_count'].idxmax(), ['Age_Group', 'admission_count']]
+                    if not x.empty else pd.Series({'Age_Group': 'Not Applicable', 'admission_count': 0}))
+                .reset_index()
+                .rename(columns={'Age_Group': 'Most Common Age Group', 'admission_count': 'Admission Count'})
+            )
+
+            # Ensure all data types are JSON serializable
+            summary['Admission Count'] = summary['Admission Count'].astype(int)  # Convert to Python int
+            summary['Most Common Age Group'] = summary['Most Common Age Group'].astype(str)  # Convert to Python str
+
+            # Convert entire DataFrame to a dictionary for compatibility
+            summary_dict = summary.to_dict(orient='records')
+
+            # Display the summary using Streamlit's `st.table` for better handling
+            st.table(summary_dict)
   #Description in container
     container = st.container(border=True)
     container.write("""This dashboard provides a detailed analysis of the most common admission types across different age groups for a selected hospital. Users can filter the data by selecting a hospital from the dropdown menu, which dynamically updates the visualizations and summary statistics. The tab includes three pie charts, each representing the distribution of age groups for the admission types: Emergency, Elective, and Urgent. If a particular admission type is not applicable to the selected hospital, it is indicated in the chart. Below the visualizations, summary statistics highlight the most prominent age group for each admission type, offering valuable insights into patient demographics and their relationship with hospital admission trends. This tool aids healthcare professionals and administrators in understanding patient distributions, improving resource allocation, and identifying key demographic trends for specific hospitals.""") 
@@ -110,21 +69,14 @@ with tab1:
 with tab2:
   # How does average billing amount differ by age group?
   st.subheader ("Average Billing Amount By Age Group")
-  quiery11= """ SELECT 
-  Age_Group, AVG(billing_amount) AS avg_billing_amount
-  FROM Healthcare_Dataset 
-  GROUP BY Age_Group"""
-  # execute the query 
-  curser.execute(quiery11)
-
-  # fetch all of the results from the executed query
-  results = curser.fetchall()
-
-  columns = ["Age_Group","avg_billing_amount"]
-  results_df = pd.DataFrame(results, columns=columns)
+  quiery11 = filters.apply(
+    Query(FACT_TABLE).select("Age_Group").avg("Billing_Amount", "avg_billing_amount").group_by("Age_Group")
+  )
+  # execute the query into a df
+  results_df = read_query(quiery11)
 
   # fetch all of the results from the executed query
-  fig = px.bar(results_df, x="Age_Group" , y="avg_billing_amount", labels={"Age_Group": "Age Group", "avg_billing_amount":"Average Billing Amount"},)
+  fig = charts.px.bar(results_df, x="Age_Group" , y="avg_billing_amount", labels={"Age_Group": "Age Group", "avg_billing_amount":"Average Billing Amount"},)
 
   st.plotly_chart(fig, use_container_width=True)
 
@@ -134,15 +86,10 @@ with tab2:
 
 with tab3: 
   # Billing amount by admission type and gender
-  query_billing = """
-      SELECT 
-          Billing_Amount, 
-          Medical_Condition, 
-          Gender
-      FROM Healthcare_Dataset
-      WHERE Billing_Amount >= 0;
-      """
-  billing_data = pd.read_sql_query(query_billing, connection)
+  # Rows come from the shared memory-mapped snapshot rather than a per-process copy
+  billing_data = filters.filter_frame(
+    snapshot.load_columns(["Billing_Amount", "Medical_Condition", "Gender", "Date_of_Admission"])
+  )
 
   # Title
   st.subheader("Billing Amount by Admission Type and Gender")
@@ -155,7 +102,7 @@ with tab3:
   filtered_data = billing_data[billing_data["Medical_Condition"] == selected_admission_types]
 
       # Plot Boxplot with Admission_Type on X-Axis
-  fig_billing = px.box(
+  fig_billing = charts.px.box(
           filtered_data, 
           x="Medical_Condition", 
           y="Billing_Amount", 
@@ -1,9 +1,7 @@
 #load packages
-import sqlite3
-import pandas as pd
 import streamlit as st
 import numpy as np
-import matplotlib.pyplot as plt
+from healthcare import cube, filters, pipeline
 
 #set configuration to wide
 st.set_page_config(layout='wide')
@@ -11,15 +9,11 @@ st.set_page_config(layout='wide')
 #create header
 st.header("Test Results and Medical Conditions")
 
+# Global admission-date range, shared with every page
+date_range = filters.date_range_filter()
 
-# set db file path
-database_path = 'healthcare_database.db'
-
-# create a connection to the SQL db
-connection = sqlite3.connect(database_path)
-
-# create a cursor object instance, to execulte SQL queries
-cursor = connection.cursor()
+# precomputed test result counts, cached per data version (and date range)
+test_results = cube.current("test_results", date_range=date_range)
 
 #create tabs for visualizations
 tab1, tab2, tab3 = st.tabs(["Abnormal Test Results and Conditions", "Test Results and Admissions", "Medications and Conditions"])
@@ -28,40 +22,26 @@ with tab1:
 ##Q1
 #What are the most common medical conditions with test results marked as "Abnormal" by Age?
     st.subheader("Most Common Medical Conditions with Abnormal Test Results by Age")
-    queryA1 = """SELECT  count(Name) as Number, Medical_Condition, Age
-    from Healthcare_Dataset 
-    where Test_Results = "Abnormal"
-    group by Medical_Condition, Age """
-# execute the query 
-    cursor.execute(queryA1)
-
-# Fetch the results
-    results = cursor.fetchall()
-
-# Convert the results into a pandas DataFrame
-    results_df = pd.DataFrame(results, columns=["Number", "Medical_Condition", "Age"])
+# abnormal results from the precomputed age x condition x test result x admission type matrix
+    abnormal = test_results.slice(Test_Results=["Abnormal"])
 
-#list of unique ages
-    age_options = results_df['Age'].unique()
+# view single ages or age bands
+    age_view = st.radio('View ages as:', ['Age', 'Age Band'], horizontal=True)
+    if age_view == 'Age Band':
+        abnormal = abnormal.regroup('Age', pipeline.age_band(abnormal.labels['Age']))
 
-#make age an integer if it is a string
-    age_options = [int(age) if isinstance(age, str) else age for age in age_options]
-
-# default all ages
-    default_age = [age for age in age_options] 
+#list of ages (or bands), default all
+    age_options = abnormal.labels['Age']
 
 # Create a multiselect widget by age
-    age_selection = st.multiselect('Select Age(s):', options=age_options, default=default_age)
+    age_selection = st.multiselect(f'Select {age_view}(s):', options=age_options, default=age_options)
 
     if not age_selection:
         st.warning("No age selected, showing all data.")
         age_selection = age_options  # Show data for all ages if no age is selected
 
-# Filter the DataFrame based on the selected ages
-    filtered_df = results_df[results_df['Age'].isin(age_selection)]
-
-# Aggregate the data by Medical_Condition and sum the counts for selected age
-    aggregated_data = filtered_df.groupby('Medical_Condition')['Number'].sum().reset_index()
+# Sum the counts for the selected ages with a boolean mask over the age axis
+    aggregated_data = abnormal.where('Age', np.isin(age_options, age_selection)).frame(['Medical_Condition'], name='Number')
 
 # Sort the data in descending order of count
     aggregated_data = aggregated_data.sort_values('Number', ascending=False)
@@ -78,26 +58,8 @@ with tab2:
 #What test results are the different types of admissions receiving?"?
 #subheader
     st.subheader("Test Results of Different Types of Admissions")
-    queryA2 = """SELECT 
-        Admission_Type, 
-        Test_Results, 
-        COUNT(*) AS Admission_Count
-    FROM 
-        Healthcare_Dataset
-    GROUP BY 
-        Admission_Type, Test_Results"""
-
-# execute the query 
-    cursor.execute(queryA2)
-
-#get results
-    results = cursor.fetchall()
-
-#results in df
-    results = pd.DataFrame(results, columns=["Admission_Type", "Test_Results", "Admission_Count"])
-
-# Create a pivot table for the bar chart
-    pivot_data = results.pivot_table(index='Admission_Type', columns='Test_Results', values='Admission_Count', aggfunc='sum').fillna(0)
+# admission type x test result pivot, from the same matrix
+    pivot_data = test_results.pivot('Admission_Type', 'Test_Results')
 
 # Display the regular bar chart (horizontal)
     st.bar_chart(pivot_data.T)  #test results in columns
@@ -110,22 +72,9 @@ with tab3:
 ##Q3
 #What is the most common medication for each medical condition?
     st.subheader("Most Common Medications by Condition")
-    queryA3 = """SELECT 
-        Medical_Condition, 
-        Medication, 
-        COUNT(*) AS MedicationCount
-    FROM Healthcare_Dataset
-    GROUP BY Medical_Condition, Medication;
-    """
-
-# execute the query 
-    cursor.execute(queryA3)
-
-#results from the executed query
-    results = cursor.fetchall()
-
-# Convert the results into a df
-    results_df = pd.DataFrame(results, columns=["Medical_Condition", "Medication", "MedicationCount"])
+# condition x medication counts from the in-memory cube
+    results_df = cube.current(date_range=date_range).frame(["Medical_Condition", "Medication"], name="MedicationCount")
+    results_df = results_df[results_df['MedicationCount'] > 0]
 
 # Create a list of unique medical conditions 
     medical_condition_options = results_df['Medical_Condition'].unique()
@@ -146,6 +95,3 @@ with tab3:
     container_three = st.container(border= True)
     container_three.write("The above bar chart illustrates the most common medications prescribed for the most common medical conditions in this data. An interesting insight of the data is that cancer and diabetes both share lipitor as the category's most common medications. Lipitor is considered a statin and is utilized to reduce the levels of bad cholesterol in the body. In turn, Lipitor can reduce the risk of heart attack or stroke, which may explain why it is prescribed for both conditions. Another key finding in the data is that the most common medication prescribed for obesity is Penicillin. Penicillin is an antibiotic used to treat bacterial infections. This suggests that obesity is possibly correlated with a higher rate of infections than the general population.")
 
-# close the database connection
-connection.close()
-
@@ -1,25 +1,43 @@
-import sqlite3
 import pandas as pd
 import streamlit as st
-import plotly.express as px
+from healthcare import Query, aggregates, charts, compare, db, filters, occupancy, shards
+from healthcare.governor import GovernorError
+from healthcare.widgets import export_widget, hospital_picker
 
 st.set_page_config(layout="wide", page_title="Admissions Dashboard")
 
 # Caching query results to avoid constant reloading and help execute SQL queries
-@st.cache_data
-def execute_query(query, params=None):
-    with sqlite3.connect('healthcare_database.db') as conn:
-        cursor = conn.cursor()
-        cursor.execute(query, params or ())
-        results = cursor.fetchall()
-        columns = [desc[0] for desc in cursor.description]
-        return pd.DataFrame(results, columns=columns)
+@st.cache_data(hash_funcs={Query: Query.build})
+def cached_query(query, params, slot, database):
+    # Slotted queries are the heavy scans: a newer one from this session cancels the old one
+    if isinstance(query, Query):
+        # Query objects go through read_query, which scatters them over shards when configured
+        return db.read_query(query, slot=slot, heavy=slot is not None)
+    with db.get_pool(database[0]).connection() as connection:
+        return db.execute(query, params, connection, slot=slot, heavy=slot is not None)
+
+
+def execute_query(query, params=None, slot=None):
+    # The live database path and shard set are part of the cache key, so newly published data is picked up
+    return cached_query(query, tuple(params or ()), slot, (db.current_database(), shards.version()))
+
+
+def governed_query(query, slot):
+    try:
+        return execute_query(query, slot=slot)
+    except GovernorError as error:
+        st.warning(str(error))
+        return pd.DataFrame()
 
 # Sidebar for adjusting rows because the data was taking forever to run with all the data I had
 st.sidebar.title("Admissions Dashboard Settings")
 limit = st.sidebar.slider("Number of rows to display:", 10, 1000, 100, 10)
 st.sidebar.info("Adjust the settings to filter and optimize your view.")
 
+# Global admission-date range, shared with every page
+date_range = filters.date_range_filter()
+periods = filters.comparison_periods()
+
 # explanation for the row limit
 st.sidebar.markdown("""
 **Why Limit the Rows?**  
@@ -29,6 +47,56 @@ To ensure the dashboard performs efficiently and provides a smooth user experien
 # Dashboard Title
 st.header(" Admissions and Admission Logistics")
 
+# Comparison mode: both periods come from one grouped query per aggregate
+if periods:
+    st.subheader("Period Comparison")
+    st.caption(compare.describe(*periods))
+    # a query the governor rejected comes back empty, without a Period column
+    condition_rows = governed_query(compare.split(aggregates.admissions_by_condition(), *periods), slot="admissions.compare")
+    condition_changes = compare.deltas(
+        condition_rows,
+        ["Medical_Condition"],
+        ["Admissions"],
+    )
+    stay_changes = compare.deltas(
+        governed_query(compare.split(aggregates.average_stay_by_admission_type(), *periods), slot="admissions.compare_stay"),
+        ["Admission_Type"],
+        ["Avg_Stay", "Admissions"],
+        averages=["Avg_Stay"],
+    )
+
+    if not condition_changes.empty:
+        col1, col2 = st.columns(2)
+        current_admissions = condition_changes["Admissions_Current"].sum()
+        previous_admissions = condition_changes["Admissions_Previous"].sum()
+        col1.metric(
+            "Admissions",
+            f"{current_admissions:,.0f}",
+            f"{current_admissions - previous_admissions:+,.0f}",
+        )
+        # Overall average stay, weighted by the admissions of each type (types absent from a period are skipped)
+        current_stay = (stay_changes["Avg_Stay_Current"] * stay_changes["Admissions_Current"]).sum(skipna=True) / max(stay_changes["Admissions_Current"].sum(), 1)
+        previous_stay = (stay_changes["Avg_Stay_Previous"] * stay_changes["Admissions_Previous"]).sum(skipna=True) / max(stay_changes["Admissions_Previous"].sum(), 1)
+        col2.metric("Average Length of Stay", f"{current_stay:.2f} days", f"{current_stay - previous_stay:+.2f} days")
+
+        movers = compare.top_movers(condition_changes, "Admissions")
+        fig_movers = charts.px.bar(
+            movers,
+            x="Medical_Condition",
+            y="Admissions_Change",
+            color=movers["Admissions_Change"] > 0,
+            color_discrete_map={True: "seagreen", False: "indianred"},
+            hover_data=["Admissions_Current", "Admissions_Previous", "Admissions_Change_Pct"],
+            title="Change in Admissions by Medical Condition",
+            labels={"Admissions_Change": "Change in Admissions", "Medical_Condition": "Medical Condition", "color": "Increase"}
+        )
+        st.plotly_chart(fig_movers)
+
+        with st.expander("View Average Stay by Admission Type"):
+            st.dataframe(stay_changes.style.format(precision=2, na_rep="n/a"), use_container_width=True, hide_index=True)
+    elif compare.PERIOD in condition_rows.columns:
+        st.warning("No admissions in either period.")
+
 # Tabs
 tab1, tab2, tab3 = st.tabs([
     "Admissions Overview",
@@ -58,46 +126,21 @@ with tab1:
         placeholder="Type a medical condition (e.g.,  Cancer)"
     )
 
-    # Build WHERE clause based on user input
-    where_clauses = []
-    params = []
-
-    if typed_hospital:
-        where_clauses.append("Hospital LIKE ?")
-        params.append(f"%{typed_hospital}%")  
-
-    if typed_condition:
-        where_clauses.append("Medical_Condition LIKE ?")
-        params.append(f"%{typed_condition}%")  
-
-    where_clause = " AND ".join(where_clauses)
-    if where_clause:
-        where_clause = f"WHERE {where_clause}"
-
-    # SQL Query1
-    query1 = f"""
-    SELECT 
-        Hospital, 
-        Medical_Condition, 
-        COUNT(*) AS Admissions
-    FROM 
-        Healthcare_Dataset
-    {where_clause}
-    GROUP BY 
-        Hospital, Medical_Condition
-    ORDER BY 
-        Admissions DESC
-    LIMIT 100;
-    """
+    # Filter on whatever the user typed
+    query1 = filters.apply(aggregates.admissions_by_hospital_condition(typed_hospital, typed_condition, limit=100))
 
     # Execute the query
-    data = execute_query(query1, params)
+    data = execute_query(query1)
 
     # Display results and visuals
     if not data.empty:
         st.dataframe(data, use_container_width=True)
-        fig = px.bar(data, x="Hospital", y="Admissions", color="Medical_Condition",
-                     title="Admissions by Hospital and Medical Condition")
+        export_widget(query1.copy().limit(None), key="admissions_export", file_name="admissions_by_hospital")
+        # Smaller hospitals are grouped as "Other" so the chart stays readable
+        chart_data = charts.cap_categories(data, "Hospital", "Admissions", keep=["Medical_Condition"])
+        fig = charts.cached("admissions_by_hospital", charts.px.bar, chart_data,
+                            x="Hospital", y="Admissions", color="Medical_Condition",
+                            title="Admissions by Hospital and Medical Condition")
         st.plotly_chart(fig)
     else:
         st.warning("No data available for the entered criteria.")
@@ -121,10 +164,6 @@ with tab2:
     admission_types = execute_query(admission_types_query)
     admission_type_options = admission_types["Admission_Type"].tolist() if not admission_types.empty else []
 
-    hospital_list_query = "SELECT DISTINCT Hospital FROM Healthcare_Dataset;"
-    hospitals = execute_query(hospital_list_query)
-    hospital_options = hospitals["Hospital"].tolist() if not hospitals.empty else []
-
     # Filter Widgets
     with col1:
         selected_admission_types = st.multiselect(
@@ -134,60 +173,29 @@ with tab2:
             help="Filter results by admission types (e.g., Emergency, Elective)."
         )
     with col2:
-        selected_hospital = st.selectbox(
-            "Select a Hospital:",
-            options=["All"] + hospital_options,
-            help="Filter results by a specific hospital or view all."
+        selected_hospital = hospital_picker(
+            "Search for a Hospital:",
+            key="stay_hospital",
+            allow_all=True,
         )
 
     # build query based on inputs
-    where_clauses = []
-    params = []
-
-    if selected_admission_types:
-        placeholders = ', '.join(['?'] * len(selected_admission_types))
-        where_clauses.append(f"Admission_Type IN ({placeholders})")
-        params.extend(selected_admission_types)
-
-    if selected_hospital != "All":
-        where_clauses.append("Hospital = ?")
-        params.append(selected_hospital)
-
-    where_clause = ' AND '.join(where_clauses)
-    if where_clause:
-        where_clause = f"WHERE {where_clause}"
-
-    query2 = f"""
-    SELECT 
-        Admission_Type, 
-        Hospital, 
-        AVG(Total_Days_of_Stay) AS Avg_Stay
-    FROM 
-        Healthcare_Dataset
-    {where_clause}
-    GROUP BY 
-        Hospital, Admission_Type
-    ORDER BY 
-        Avg_Stay DESC
-    LIMIT ?;
-    """
-    params.append(limit)
-    data = execute_query(query2, params)
+    query2 = filters.apply(
+        aggregates.average_stay_by_hospital()
+        .where_in("Admission_Type", selected_admission_types)
+        .order_by("Avg_Stay DESC")
+        .limit(limit)
+    )
+    if selected_hospital not in (None, "All"):
+        query2.where_dimension_eq("Hospital", selected_hospital)
+    data = governed_query(query2, slot="admissions.stay")
 
     # Longest Overall Stay
-    longest_stay_query = """
-    SELECT 
-        Hospital, 
-        Admission_Type, 
-        AVG(Total_Days_of_Stay) AS Avg_Stay
-    FROM 
-        Healthcare_Dataset
-    GROUP BY 
-        Hospital, Admission_Type
-    ORDER BY 
-        Avg_Stay DESC
-    LIMIT 1;
-    """
+    longest_stay_query = filters.apply(
+        aggregates.average_stay_by_hospital()
+        .order_by("Avg_Stay DESC")
+        .limit(1)
+    )
     longest_stay_data = execute_query(longest_stay_query)
 
     # Show Metrics and Insights
@@ -202,7 +210,7 @@ with tab2:
         st.markdown(f"**Overall Insight:** The longest average stay is at **{overall_longest_hospital}** for **{overall_longest_type}** admissions.")
 
         # Show filtered stay based on user selection
-        if selected_hospital != "All":
+        if selected_hospital not in (None, "All"):
             if not data[data["Hospital"] == selected_hospital].empty:
                 filtered_longest_stay = data[data["Hospital"] == selected_hospital]["Avg_Stay"].max()
                 st.markdown(f"**Filtered Insight:** The longest average stay at **{selected_hospital}** is **{round(filtered_longest_stay, 2)} days**.")
@@ -212,9 +220,10 @@ with tab2:
         # Collapsible Data Table
         with st.expander("View Average Stay Data Table"):
             st.dataframe(data, use_container_width=True)
+            export_widget(query2.copy().limit(None), key="stay_export", file_name="average_stay")
 
         # Bar Chart
-        fig = px.bar(
+        fig = charts.px.bar(
             data,
             x="Hospital",
             y="Avg_Stay",
@@ -256,43 +265,18 @@ with tab3:
             default=None
         )
 
-    # Build WHERE clause based on filters
-    where_clauses = []
-    params = []
-
-    if admission_type_filter:
-        placeholders = ', '.join(['?'] * len(admission_type_filter))
-        where_clauses.append(f"Admission_Type IN ({placeholders})")
-        params.extend(admission_type_filter)
-
-    if room_number_filter:
-        placeholders = ', '.join(['?'] * len(room_number_filter))
-        where_clauses.append(f"Room_Number IN ({placeholders})")
-        params.extend(room_number_filter)
-
-    where_clause = " AND ".join(where_clauses)
-    if where_clause:
-        where_clause = f"WHERE {where_clause}"
-
     # SQL Query3
-    query3 = f"""
-    SELECT 
-        Room_Number, 
-        Admission_Type, 
-        COUNT(*) AS Room_Usage
-    FROM 
-        Healthcare_Dataset
-    {where_clause}
-    GROUP BY 
-        Room_Number, Admission_Type
-    ORDER BY 
-        Room_Usage DESC
-    LIMIT ?;
-    """
-    params.append(limit)
+    query3 = filters.apply(
+        Query().select("Room_Number", "Admission_Type").count("Room_Usage")
+        .where_in("Admission_Type", admission_type_filter)
+        .where_in("Room_Number", room_number_filter)
+        .group_by("Room_Number", "Admission_Type")
+        .order_by("Room_Usage DESC")
+        .limit(limit)
+    )
 
     # Execute query
-    data = execute_query(query3, params)
+    data = governed_query(query3, slot="admissions.rooms")
 
     if not data.empty:
         # Summary
@@ -307,10 +291,14 @@ with tab3:
         # Data table
         with st.expander("View Detailed Room Usage Table"):
             st.dataframe(data, use_container_width=True)
-
-        # Pie chart for room usage
-        fig_pie = px.pie(
-            data,
+            export_widget(query3.copy().limit(None), key="room_export", file_name="room_usage")
+
+        # Pie chart for room usage; rooms beyond the largest ones are grouped as "Other"
+        room_data = charts.cap_categories(data, "Room_Number", "Room_Usage", keep=["Admission_Type"])
+        fig_pie = charts.cached(
+            "room_usage_pie",
+            charts.px.pie,
+            room_data,
             values="Room_Usage",
             names="Room_Number",
             title="Room Usage Distribution",
@@ -320,8 +308,10 @@ with tab3:
         st.plotly_chart(fig_pie)
 
         # Stacked bar chart for room usage by admission type
-        fig_bar = px.bar(
-            data,
+        fig_bar = charts.cached(
+            "room_usage_bar",
+            charts.px.bar,
+            room_data,
             x="Room_Number",
             y="Room_Usage",
             color="Admission_Type",
@@ -331,4 +321,68 @@ with tab3:
         )
         st.plotly_chart(fig_bar)
     else:
-        st.warning("No data available for the selected filters.")
\ No newline at end of file
+        st.warning("No data available for the selected filters.")
+
+    # Daily census from the occupancy engine: patients in house per day, and rooms holding two patients at once
+    st.markdown("### Daily Census")
+    census_hospital = hospital_picker("Census for Hospital:", key="census_hospital", allow_all=True)
+
+    room_points = occupancy.series("room")
+    if census_hospital in (None, "All"):
+        census_points = occupancy.series("total")
+    else:
+        hospital_points = occupancy.series("hospital")
+        census_points = hospital_points[hospital_points["Hospital"] == census_hospital]
+        room_points = room_points[room_points["Hospital"] == census_hospital]
+
+    if census_points.empty:
+        st.warning("No stays recorded for the selected hospital.")
+    else:
+        census = occupancy.daily_census(census_points)
+        first_day, last_day = census["Date"].min().date(), census["Date"].max().date()
+
+        def clamp(day):
+            # Clamping both ends into the stays keeps start <= end, even for a range outside them
+            return min(max(day, first_day), last_day)
+
+        default_range = tuple(clamp(day) for day in date_range) if date_range else (first_day, last_day)
+        census_range = st.date_input(
+            "Census Date Range:",
+            value=default_range,
+            min_value=first_day,
+            max_value=last_day,
+            key="census_range",
+        )
+        if len(census_range) == 2:
+            census_range = tuple(sorted(clamp(day) for day in census_range))
+        else:
+            census_range = (first_day, last_day)
+        census = occupancy.daily_census(census_points, *census_range)
+
+        if census.empty:
+            st.info("No stays in this range")
+        else:
+            peak = census.loc[census["Occupied"].idxmax()]
+            double_booked = occupancy.double_bookings(room_points, *census_range)
+
+            col1, col2 = st.columns(2)
+            col1.metric("Peak Patients In House", int(peak["Occupied"]), help=f"on {peak['Date']:%Y-%m-%d}")
+            col2.metric("Double-Booked Room Periods", len(double_booked))
+
+            fig_census = charts.cached(
+                "daily_census",
+                charts.line,
+                census,
+                x="Date",
+                y="Occupied",
+                title="Patients In House per Day",
+                labels={"Occupied": "Patients In House"}
+            )
+            st.plotly_chart(fig_census)
+
+            if not double_booked.empty:
+                with st.expander("View Double-Booked Rooms"):
+                    st.dataframe(
+                        double_booked.rename(columns={"Date": "From", "Occupied": "Patients"}),
+                        use_container_width=True
+                    )
@@ -0,0 +1,138 @@
+#load packages
+import streamlit as st
+from healthcare import adjacency, charts, filters
+from healthcare.widgets import doctor_picker
+
+#set configuration to wide
+st.set_page_config(layout="wide", page_title="Doctor Workload")
+
+# Sidebar settings
+st.sidebar.title("Doctor Workload Settings")
+top_k = st.sidebar.slider("Number of doctors to display:", 5, 100, 20, 5)
+
+# Global admission-date range, shared with every page
+date_range = filters.date_range_filter()
+
+#create header
+st.header("Doctor Workload and Co-occurrence")
+
+# precomputed sparse adjacency graphs, built once per data version (and date range)
+doctor_hospital = adjacency.current("doctor_hospital", date_range=date_range)
+doctor_condition = adjacency.current("doctor_condition", date_range=date_range)
+condition_medication = adjacency.current("condition_medication", date_range=date_range)
+# the shared-patient network needs SciPy; the page works without it
+shared_patients = (
+    adjacency.current(adjacency.SHARED_PATIENTS, date_range=date_range)
+    if adjacency.available(adjacency.SHARED_PATIENTS) else None
+)
+
+# measure the workload is ranked by
+LOAD_MEASURES = {
+    "Admissions": None,
+    "Days of Stay": "Total_Days_of_Stay",
+    "Billing Amount": "Billing_Amount",
+}
+
+#create tabs for visualizations
+tab1, tab2, tab3 = st.tabs(["Doctor Workload", "Shared-Patient Network", "Medication Mix by Condition"])
+
+with tab1:
+##Q1
+#Which doctors carry the most load, and where?
+    st.subheader(f"Top {top_k} Doctors by Workload")
+    load_label = st.radio("Rank doctors by:", list(LOAD_MEASURES), horizontal=True)
+    measure = LOAD_MEASURES[load_label]
+
+# top-K from the row totals of the doctor x hospital matrix
+    top_doctors = doctor_hospital.top(top_k, measure)
+    column = measure or "Admissions"
+
+    col1, col2, col3 = st.columns(3)
+    active = int((doctor_hospital.degree() > 0).sum())
+    col1.metric("Doctors with Admissions", f"{active:,}")
+    col2.metric("Admissions per Doctor", f"{doctor_hospital.counts.sum() / max(active, 1):.2f}")
+    col3.metric("Doctors at Several Hospitals", f"{int((doctor_hospital.degree() > 1).sum()):,}")
+
+    fig_top = charts.px.bar(
+        top_doctors,
+        x="Doctor",
+        y=column,
+        hover_data=["Admissions", "Distinct_Hospital"],
+        title=f"Top {top_k} Doctors by {load_label}",
+        labels={column: load_label, "Distinct_Hospital": "Hospitals"}
+    )
+    st.plotly_chart(fig_top, use_container_width=True)
+
+# one doctor's hospitals and conditions are row lookups in the two matrices
+    st.subheader("Workload Breakdown for One Doctor")
+    doctor = doctor_picker("Search for a doctor:", key="workload_doctor", suggestions=top_doctors["Doctor"])
+    if doctor:
+        col1, col2 = st.columns(2)
+        with col1:
+            hospitals = doctor_hospital.row(doctor)
+            st.write(f"**Hospitals** ({len(hospitals)})")
+            st.dataframe(hospitals.round(2), use_container_width=True, hide_index=True)
+        with col2:
+            conditions = doctor_condition.row(doctor)
+            fig_conditions = charts.px.pie(
+                conditions,
+                names="Medical_Condition",
+                values="Admissions",
+                title=f"Medical Conditions Treated by {doctor}"
+            )
+            st.plotly_chart(fig_conditions, use_container_width=True)
+    else:
+        st.warning("No doctor matches the search.")
+
+with tab2:
+##Q2
+#Which doctors share patients?
+    st.subheader("Doctors Sharing the Most Patients")
+    if shared_patients is None:
+        st.info("The shared-patient network needs SciPy, which is not installed on this server.")
+    else:
+        st.caption("Patients are matched on name, gender and blood type across admissions.")
+        st.dataframe(shared_patients.strongest(top_k), use_container_width=True, hide_index=True)
+
+# the doctors one doctor shares patients with: one row of the doctor x doctor matrix
+        colleague_suggestions = shared_patients.top(top_k)["Doctor"]
+        doctor = doctor_picker("Search for a doctor:", key="network_doctor", suggestions=colleague_suggestions)
+        colleagues = shared_patients.row(doctor)
+        if colleagues.empty:
+            st.info("This doctor shares no patients with other doctors in the selected dates.")
+        else:
+            colleagues = colleagues.head(top_k)
+            fig_network = charts.px.bar(
+                colleagues,
+                x="Doctor_2",
+                y="Shared_Patients",
+                title=f"Doctors Sharing Patients with {doctor}",
+                labels={"Doctor_2": "Doctor", "Shared_Patients": "Shared Patients"}
+            )
+            st.plotly_chart(fig_network, use_container_width=True)
+
+with tab3:
+##Q3
+#Which medications are prescribed for each condition, and what do they cost?
+    st.subheader("Medication Mix by Medical Condition")
+    counts = condition_medication.dense()
+    mix = counts.div(counts.sum(axis=1).where(counts.sum(axis=1) > 0), axis=0).mul(100)
+    fig_mix = charts.px.imshow(
+        mix.round(1),
+        text_auto=True,
+        aspect="auto",
+        color_continuous_scale="Blues",
+        title="Share of Admissions per Medication (%)",
+        labels={"color": "Share (%)"}
+    )
+    st.plotly_chart(fig_mix, use_container_width=True)
+
+    condition = st.selectbox("Select Medical Condition:", options=condition_medication.labels["Medical_Condition"])
+    medications = condition_medication.row(condition)
+    medications["Avg_Billing"] = medications["Billing_Amount"] / medications["Admissions"]
+    medications["Avg_Stay"] = medications["Total_Days_of_Stay"] / medications["Admissions"]
+    st.dataframe(
+        medications[["Medication", "Admissions", "Avg_Billing", "Avg_Stay"]].round(2),
+        use_container_width=True,
+        hide_index=True,
+    )
@@ -0,0 +1,36 @@
+import numpy as np
+import pandas as pd
+
+from healthcare import snapshot
+
+
+def test_frame_columns_share_the_mapped_files(tmp_path, monkeypatch):
+    rows = pd.DataFrame({
+        "Hospital": ["Smith LLC", "Jones Inc", "Smith LLC"],
+        "Date_of_Admission": ["2024-01-01", "2024-01-05", "2024-02-01"],
+        "Billing_Amount": [100.0, 250.5, 80.25],
+    })
+    directory = tmp_path / "rows"
+    kinds = snapshot._write_columns(rows, str(directory))
+
+    mapped = {}
+    load = np.load
+
+    def remember(path, *args, **kwargs):
+        array = load(path, *args, **kwargs)
+        mapped[str(path)] = array
+        return array
+
+    monkeypatch.setattr(snapshot.np, "load", remember)
+    frame = snapshot._read_columns(str(directory), kinds)
+
+    def file(column):
+        return mapped[str(directory / f"{column}.npy")]
+
+    codes = frame["Hospital"].array.codes
+    assert np.shares_memory(codes, file("Hospital"))
+    assert np.shares_memory(frame["Date_of_Admission"].to_numpy(), file("Date_of_Admission"))
+    assert np.shares_memory(frame["Billing_Amount"].to_numpy(), file("Billing_Amount"))
+
+    assert frame["Hospital"].tolist() == rows["Hospital"].tolist()
+    assert frame["Date_of_Admission"].tolist() == pd.to_datetime(rows["Date_of_Admission"]).tolist()